@@ -8,22 +8,11 @@ if [[ ! -f .env ]]; then
     exit 1
 fi
 
-set -a
-# shellcheck disable=SC1091
-source .env
-set +a
+# Backup do banco: incremental, comprimido e com checksum por parte, em
+# ./backups (montado em /app/backups no container). Um completo por semana
+# (BACKUP_COMPLETO_DIAS) e as cadeias antigas podadas (BACKUP_MANTER_COMPLETOS).
+# Os backups não vão para o Git: copie ./backups para fora do servidor.
+docker exec ultramed-web python manage.py backup
 
-: "${SQL_USER:?SQL_USER não definido no .env}"
-: "${SQL_PASSWORD:?SQL_PASSWORD não definido no .env}"
-: "${SQL_DATABASE:?SQL_DATABASE não definido no .env}"
-
-# 1. Backup do Banco de Dados (credenciais apenas via .env — nunca hardcode)
-docker exec ultramed-db mysqldump \
-    -u"${SQL_USER}" \
-    -p"${SQL_PASSWORD}" \
-    "${SQL_DATABASE}" > "db_backup_$(date +%Y%m%d_%H%M).sql"
-
-# 2. Sincronização com o Git (Ponto de Recuperação)
-git add .
-git commit -m "Ponto de Recuperação Automático: $(date +'%Y-%m-%d %H:%M:%S')" || true
-git push origin main
+# Confere checksums e migrações da cadeia recém-gravada (não altera o banco)
+docker exec ultramed-web python manage.py restaurar_backup --verificar
@@ -6,11 +6,17 @@ from .models import (
     Fatura,
     FaturaLicencaSistema,
     LeadSite,
+    NotificacaoMP,
+    PagamentoMPProcessado,
     Paciente,
     Plano,
     Prontuario,
+    RateLimitBalde,
+    RateLimitJanela,
     Receita,
+    ReceitaMensal,
 )
+from .receita_mensal import reconstruir_receita
 
 
 @admin.register(Plano)
@@ -30,6 +36,31 @@ class FaturaAdmin(admin.ModelAdmin):
     list_display = ("id", "paciente", "plano", "valor", "status", "data_pagamento")
     list_filter = ("status", "plano")
 
+    # Correções manuais refazem a ReceitaMensal dos meses afetados
+    @staticmethod
+    def _meses(faturas):
+        return {(f.data_pagamento.year, f.data_pagamento.month) for f in faturas if f.data_pagamento}
+
+    @staticmethod
+    def _reconstruir(meses):
+        for ano, mes in meses:
+            reconstruir_receita(ano, mes)
+
+    def save_model(self, request, obj, form, change):
+        meses = self._meses(Fatura.objects.filter(pk=obj.pk)) if change else set()
+        super().save_model(request, obj, form, change)
+        self._reconstruir(meses | self._meses([obj]))
+
+    def delete_model(self, request, obj):
+        meses = self._meses([obj])
+        super().delete_model(request, obj)
+        self._reconstruir(meses)
+
+    def delete_queryset(self, request, queryset):
+        meses = self._meses(queryset)
+        super().delete_queryset(request, queryset)
+        self._reconstruir(meses)
+
 
 @admin.register(Agenda)
 class AgendaAdmin(admin.ModelAdmin):
@@ -70,3 +101,37 @@ class FaturaLicencaSistemaAdmin(admin.ModelAdmin):
     list_filter = ("status",)
     search_fields = ("referencia", "mercadopago_id", "preferencia_id")
     readonly_fields = ("criado_em", "atualizado_em")
+
+
+@admin.register(NotificacaoMP)
+class NotificacaoMPAdmin(admin.ModelAdmin):
+    list_display = ("id", "conta", "payment_id", "status", "tentativas", "recebido_em", "processado_em")
+    list_filter = ("conta", "status")
+    search_fields = ("payment_id",)
+
+
+@admin.register(PagamentoMPProcessado)
+class PagamentoMPProcessadoAdmin(admin.ModelAdmin):
+    list_display = ("conta", "payment_id", "status", "repeticoes", "processado_em", "expira_em")
+    list_filter = ("conta", "status")
+    search_fields = ("payment_id",)
+
+
+@admin.register(RateLimitJanela)
+class RateLimitJanelaAdmin(admin.ModelAdmin):
+    list_display = ("chave", "regra", "inicio", "permitidos", "bloqueados", "expira_em")
+    list_filter = ("regra",)
+    search_fields = ("chave",)
+
+
+@admin.register(RateLimitBalde)
+class RateLimitBaldeAdmin(admin.ModelAdmin):
+    list_display = ("chave", "regra", "tokens", "permitidos", "bloqueados", "expira_em")
+    list_filter = ("regra",)
+    search_fields = ("chave",)
+
+
+@admin.register(ReceitaMensal)
+class ReceitaMensalAdmin(admin.ModelAdmin):
+    list_display = ("ano", "mes", "metodo_pagamento", "soma", "quantidade", "atualizado_em")
+    list_filter = ("ano", "metodo_pagamento")
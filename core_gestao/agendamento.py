@@ -0,0 +1,342 @@
+"""
+Motor de horários da agenda: duração de cada procedimento vem do catálogo,
+cada sala tem capacidade e o dia de cada sala vira um índice de intervalos.
+
+O dia é dividido em células de ``AGENDA_PASSO_MIN`` minutos e cada sala tem
+uma árvore de segmentos com a ocupação por célula (soma em intervalo e
+máximo). Marcar um agendamento, perguntar "cabe de HH:MM por N minutos?" e
+achar a próxima célula lotada a partir de um horário custam O(log n); a
+lista de horários livres usa essa última para pular de uma vez os trechos
+cheios em vez de testar horário por horário.
+
+``agendar`` grava segurando a linha do paciente e a linha de trava (sala,
+dia) com ``select_for_update``: duas recepcionistas marcando a mesma sala no
+mesmo dia (ou o mesmo paciente em salas diferentes) se enfileiram, e a
+segunda remonta o índice já com o agendamento da primeira e recebe
+``HorarioIndisponivel`` se não couber mais. A linha de trava é criada com
+``INSERT IGNORE`` antes do ``SELECT ... FOR UPDATE``: o ``get_or_create``
+travado deixaria duas transações com gap lock no mesmo intervalo do índice
+único e o MariaDB abortaria uma delas com deadlock.
+
+Registros sem sala/duração gravadas (anteriores a este módulo ou o check-in
+espontâneo) são resolvidos pelo ``[id]`` do procedimento na observação ou,
+sem ele, pelo tipo: consulta ocupa o consultório; exame sem procedimento de
+catálogo não entra no índice.
+"""
+import re
+from datetime import date, time as dtime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core_gestao.models import Agenda, AgendaRecursoDia, Paciente
+from core_gestao.procedimentos_catalogo import RECURSOS, procedimento_por_id
+
+MINUTOS_DIA = 24 * 60
+# Sala e duração de registros sem procedimento do catálogo, por tipo
+_PADRAO_POR_TIPO = {"CONSULTA": ("consultorio", 20)}
+_RE_PROCEDIMENTO = re.compile(r"^Procedimento: .*?\[([\w-]+)\]")
+
+
+class HorarioIndisponivel(Exception):
+    """Horário fora do expediente, sala lotada ou paciente já agendado no período (nada foi gravado)."""
+
+
+# -----------------------------------------------------------------
+# Configuração
+# -----------------------------------------------------------------
+
+def _minutos(valor: dtime | str) -> int:
+    if isinstance(valor, str):
+        valor = dtime.fromisoformat(valor)
+    return valor.hour * 60 + valor.minute
+
+
+def formatar_minutos(minutos: int) -> str:
+    return f"{minutos // 60:02d}:{minutos % 60:02d}"
+
+
+def expediente() -> tuple[int, int, int]:
+    """(abertura, fechamento, passo) em minutos do dia."""
+    return (
+        _minutos(settings.AGENDA_ABERTURA),
+        _minutos(settings.AGENDA_FECHAMENTO),
+        max(1, settings.AGENDA_PASSO_MIN),
+    )
+
+
+def capacidade(recurso: str) -> int:
+    """Capacidade da sala: ``AGENDA_CAPACIDADES`` ("consultorio=3,...") ou a do catálogo."""
+    for par in settings.AGENDA_CAPACIDADES.split(","):
+        chave, _, valor = par.partition("=")
+        if chave.strip() == recurso and valor.strip().isdigit():
+            return int(valor)
+    return RECURSOS.get(recurso, {}).get("capacidade", 1)
+
+
+def procedimento_da_observacao(observacoes: str | None) -> str:
+    """Id do catálogo gravado como ``Procedimento: Nome [id]`` pela agenda."""
+    achado = _RE_PROCEDIMENTO.match(observacoes or "")
+    return achado.group(1) if achado else ""
+
+
+def recurso_e_duracao(
+    procedimento_id: str = "", tipo: str = "CONSULTA", observacoes: str | None = None
+) -> tuple[str, int]:
+    """Sala e duração do procedimento; ``("", 0)`` se não der para saber (não ocupa sala)."""
+    proc = procedimento_por_id(procedimento_id or procedimento_da_observacao(observacoes))
+    if proc:
+        return proc["recurso"], proc["duracao_min"]
+    return _PADRAO_POR_TIPO.get(tipo, ("", 0))
+
+
+# -----------------------------------------------------------------
+# Índice de intervalos
+# -----------------------------------------------------------------
+
+class OcupacaoDia:
+    """
+    Ocupação de uma sala por célula do dia: árvore de segmentos com soma em
+    intervalo e máximo. O acréscimo de um nó fica nele (``_soma``) e vale para
+    toda a subárvore, então nenhuma operação precisa empurrá-lo para baixo.
+    """
+
+    __slots__ = ("passo", "n", "_max", "_soma")
+
+    def __init__(self, passo: int):
+        self.passo = passo
+        self.n = -(-MINUTOS_DIA // passo)
+        self._max = [0] * (4 * self.n)
+        self._soma = [0] * (4 * self.n)
+
+    def celulas(self, inicio_min: int, duracao_min: int) -> tuple[int, int]:
+        """Células ``[ini, fim)`` tocadas por ``duracao_min`` a partir de ``inicio_min``."""
+        ini = max(0, inicio_min // self.passo)
+        fim = min(self.n, -(-(inicio_min + max(1, duracao_min)) // self.passo))
+        return ini, fim
+
+    def ocupar(self, inicio_min: int, duracao_min: int, quantidade: int = 1) -> None:
+        ini, fim = self.celulas(inicio_min, duracao_min)
+        if ini < fim:
+            self._somar(1, 0, self.n, ini, fim, quantidade)
+
+    def maximo(self, inicio_min: int, duracao_min: int) -> int:
+        """Maior ocupação no período."""
+        ini, fim = self.celulas(inicio_min, duracao_min)
+        return self._maximo(1, 0, self.n, ini, fim) if ini < fim else 0
+
+    def primeira_lotada(self, inicio_min: int, capacidade: int) -> int | None:
+        """Minuto de início da primeira célula a partir de ``inicio_min`` com ocupação >= capacidade."""
+        celula = self._primeira(1, 0, self.n, max(0, inicio_min // self.passo), capacidade)
+        return None if celula is None else celula * self.passo
+
+    def cabe(self, inicio_min: int, duracao_min: int, capacidade: int) -> bool:
+        ini, fim = self.celulas(inicio_min, duracao_min)
+        lotada = self._primeira(1, 0, self.n, ini, capacidade)
+        return lotada is None or lotada >= fim
+
+    def livres(self, duracao_min: int, capacidade: int, abertura: int, fechamento: int, passo: int,
+               a_partir: int = 0) -> list[int]:
+        """Inícios da grade (abertura + k·passo) em que ``duracao_min`` cabe antes do fechamento."""
+        livres = []
+        inicio = abertura
+        if a_partir > abertura:
+            inicio += -(-(a_partir - abertura) // passo) * passo
+        while inicio + duracao_min <= fechamento:
+            ini, fim = self.celulas(inicio, duracao_min)
+            lotada = self._primeira(1, 0, self.n, ini, capacidade)
+            if lotada is None or lotada >= fim:
+                livres.append(inicio)
+                inicio += passo
+            else:
+                # Nenhum início antes do fim da célula lotada serve: salta para o próximo da grade
+                depois = (lotada + 1) * self.passo
+                inicio += max(1, -(-(depois - inicio) // passo)) * passo
+        return livres
+
+    def _somar(self, no: int, esquerda: int, direita: int, ini: int, fim: int, valor: int) -> None:
+        if ini <= esquerda and direita <= fim:
+            self._max[no] += valor
+            self._soma[no] += valor
+            return
+        meio = (esquerda + direita) // 2
+        if ini < meio:
+            self._somar(2 * no, esquerda, meio, ini, fim, valor)
+        if fim > meio:
+            self._somar(2 * no + 1, meio, direita, ini, fim, valor)
+        self._max[no] = self._soma[no] + max(self._max[2 * no], self._max[2 * no + 1])
+
+    def _maximo(self, no: int, esquerda: int, direita: int, ini: int, fim: int) -> int:
+        if ini <= esquerda and direita <= fim:
+            return self._max[no]
+        meio = (esquerda + direita) // 2
+        maior = 0
+        if ini < meio:
+            maior = self._maximo(2 * no, esquerda, meio, ini, fim)
+        if fim > meio:
+            maior = max(maior, self._maximo(2 * no + 1, meio, direita, ini, fim))
+        return maior + self._soma[no]
+
+    def _primeira(self, no: int, esquerda: int, direita: int, ini: int, limite: int) -> int | None:
+        # ``limite`` já desconta os acréscimos dos ancestrais
+        if direita <= ini or self._max[no] < limite:
+            return None
+        if direita - esquerda == 1:
+            return esquerda
+        limite -= self._soma[no]
+        meio = (esquerda + direita) // 2
+        achada = self._primeira(2 * no, esquerda, meio, ini, limite)
+        if achada is None:
+            achada = self._primeira(2 * no + 1, meio, direita, ini, limite)
+        return achada
+
+
+def ocupacao_do_dia(data: date, recursos=None) -> dict[str, OcupacaoDia]:
+    """Índice de cada sala no dia a partir dos agendamentos não cancelados (uma consulta)."""
+    passo = expediente()[2]
+    indices: dict[str, OcupacaoDia] = {}
+    linhas = (
+        Agenda.objects.filter(data=data)
+        .exclude(status="CANCELADO")
+        .values_list("hora", "tipo", "procedimento_id", "recurso", "duracao_min", "observacoes")
+    )
+    for hora, tipo, procedimento_id, recurso, duracao, observacoes in linhas:
+        if not recurso or not duracao:
+            recurso, duracao = recurso_e_duracao(procedimento_id, tipo, observacoes)
+        if not recurso or (recursos is not None and recurso not in recursos):
+            continue
+        if recurso not in indices:
+            indices[recurso] = OcupacaoDia(passo)
+        indices[recurso].ocupar(_minutos(hora), duracao)
+    return indices
+
+
+# -----------------------------------------------------------------
+# Consulta e gravação
+# -----------------------------------------------------------------
+
+def anotar_periodos(agendamentos) -> None:
+    """``hora_fim`` ("HH:MM") e ``sala`` (nome) em cada agendamento, para a lista do dia."""
+    for ag in agendamentos:
+        recurso, duracao = ag.recurso, ag.duracao_min
+        if not recurso or not duracao:
+            recurso, duracao = recurso_e_duracao(ag.procedimento_id, ag.tipo, ag.observacoes)
+        ag.hora_fim = formatar_minutos(_minutos(ag.hora) + duracao) if duracao else ""
+        ag.sala = RECURSOS.get(recurso, {}).get("nome", "")
+
+
+def horarios_livres(procedimento_id: str, data: date) -> dict:
+    """Horários da grade em que o procedimento cabe na sala dele (vazio para dias passados)."""
+    proc = procedimento_por_id(procedimento_id)
+    if not proc:
+        raise HorarioIndisponivel("Procedimento fora do catálogo.")
+    recurso, duracao = proc["recurso"], proc["duracao_min"]
+    cap = capacidade(recurso)
+    abertura, fechamento, passo = expediente()
+
+    agora = timezone.localtime()
+    a_partir = 0
+    if data < agora.date():
+        a_partir = MINUTOS_DIA
+    elif data == agora.date():
+        a_partir = agora.hour * 60 + agora.minute + 1
+
+    indice = ocupacao_do_dia(data, recursos={recurso}).get(recurso) or OcupacaoDia(passo)
+    return {
+        "data": data.isoformat(),
+        "procedimento_id": proc["id"],
+        "recurso": recurso,
+        "recurso_nome": RECURSOS[recurso]["nome"],
+        "capacidade": cap,
+        "duracao_min": duracao,
+        "passo_min": passo,
+        "horarios": [
+            formatar_minutos(m) for m in indice.livres(duracao, cap, abertura, fechamento, passo, a_partir)
+        ],
+    }
+
+
+def _conflito_paciente(paciente, data: date, inicio: int, fim: int) -> str | None:
+    """
+    Hora de outro agendamento do paciente que se sobrepõe a ``[inicio, fim)``.
+    Só é confiável com a linha do paciente travada (ver ``agendar``): a trava
+    da sala não segura agendamentos do mesmo paciente em outra sala.
+    """
+    linhas = (
+        Agenda.objects.filter(paciente=paciente, data=data)
+        .exclude(status="CANCELADO")
+        .values_list("hora", "tipo", "procedimento_id", "duracao_min", "observacoes")
+    )
+    for hora, tipo, procedimento_id, duracao, observacoes in linhas:
+        if not duracao:
+            duracao = recurso_e_duracao(procedimento_id, tipo, observacoes)[1] or 1
+        outro = _minutos(hora)
+        if outro < fim and inicio < outro + duracao:
+            return formatar_minutos(outro)
+    return None
+
+
+def agendar(paciente, data: date, hora: dtime, procedimento_id: str, observacoes: str = "",
+            status: str = "AGENDADO") -> Agenda:
+    """
+    Grava o agendamento se a sala tiver vaga em todo o período e o paciente
+    estiver livre; senão ``HorarioIndisponivel`` com o próximo horário livre.
+    Chamado dentro de outra transação, a trava vale até o commit dela.
+    """
+    proc = procedimento_por_id(procedimento_id)
+    if not proc:
+        raise HorarioIndisponivel("Procedimento fora do catálogo.")
+    recurso, duracao = proc["recurso"], proc["duracao_min"]
+    abertura, fechamento, passo = expediente()
+    inicio = _minutos(hora)
+    if inicio < abertura or inicio + duracao > fechamento:
+        raise HorarioIndisponivel(
+            f"{proc['nome']} ({duracao} min) às {formatar_minutos(inicio)} fica fora do expediente "
+            f"({formatar_minutos(abertura)}–{formatar_minutos(fechamento)})."
+        )
+    cap = capacidade(recurso)
+
+    with transaction.atomic():
+        # Paciente antes da sala, sempre na mesma ordem
+        Paciente.objects.select_for_update().only("id").get(pk=paciente.pk)
+        AgendaRecursoDia.objects.bulk_create([AgendaRecursoDia(recurso=recurso, data=data)], ignore_conflicts=True)
+        trava = AgendaRecursoDia.objects.select_for_update().get(recurso=recurso, data=data)
+        indice = ocupacao_do_dia(data, recursos={recurso}).get(recurso) or OcupacaoDia(passo)
+        if not indice.cabe(inicio, duracao, cap):
+            proximos = indice.livres(duracao, cap, abertura, fechamento, passo, a_partir=inicio)
+            sugestao = f" Próximo horário livre: {formatar_minutos(proximos[0])}." if proximos else ""
+            raise HorarioIndisponivel(
+                f"{RECURSOS[recurso]['nome']} lotada às {formatar_minutos(inicio)} "
+                f"para {proc['nome']} ({duracao} min, capacidade {cap}).{sugestao}"
+            )
+        outro = _conflito_paciente(paciente, data, inicio, inicio + duracao)
+        if outro:
+            raise HorarioIndisponivel(
+                f"{paciente.nome_completo} já tem agendamento às {outro} que se sobrepõe a este horário."
+            )
+        agendamento = Agenda.objects.create(
+            paciente=paciente,
+            data=data,
+            hora=hora,
+            tipo=proc["tipo"],
+            status=status,
+            observacoes=observacoes,
+            procedimento_id=proc["id"],
+            recurso=recurso,
+            duracao_min=duracao,
+        )
+        trava.agendamentos = F("agendamentos") + 1
+        trava.save(update_fields=["agendamentos"])
+    return agendamento
+
+
+def ler_data_hora(data_str: str | None, hora_str: str | None) -> tuple[date, dtime]:
+    """``data`` (AAAA-MM-DD) e ``hora`` (HH:MM) do formulário; ``HorarioIndisponivel`` se inválidas."""
+    try:
+        data = date.fromisoformat((data_str or "").strip())
+        hora = dtime.fromisoformat((hora_str or "").strip()).replace(second=0, microsecond=0)
+    except ValueError:
+        raise HorarioIndisponivel("Informe data e horário válidos.") from None
+    return data, hora
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 class CoreGestaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core_gestao'
+
+    def ready(self):
+        from .conexoes_db import conectar_sinais
+
+        conectar_sinais()
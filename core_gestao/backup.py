@@ -0,0 +1,444 @@
+"""
+Backup incremental do banco: exportação por tabela, comprimida, em partes com checksum.
+
+Cada execução grava ``<BACKUP_DIR>/<id>_<tipo>/`` com ``manifesto.json`` e,
+por tabela, partes ``NNNNN.jsonl.gz`` de até ``LINHAS_POR_PARTE`` linhas (uma
+lista de valores por linha, na ordem de ``colunas``), cada uma com seu SHA-256.
+A pasta é montada como ``.tmp-<id>`` e só ganha o nome final quando completa.
+
+O primeiro backup da cadeia é completo; os seguintes trazem só:
+
+* tabelas com ``atualizado_em``: linhas alteradas desde a marca do backup
+  anterior e ids ainda não vistos;
+* tabelas só de inserção (log do admin, tokens de busca): ids novos;
+* demais tabelas (planos, usuários, leads, inbox do MP...): cópia inteira.
+
+Os ids existentes de cada tabela incremental vão em faixas (``ids.json.gz``)
+para a restauração apagar o que foi removido depois. ``restaurar`` só mexe no
+banco depois de conferir checksums, encadeamento e migrações de toda a cadeia,
+e aplica tudo numa única transação.
+"""
+import gzip
+import hashlib
+import json
+import shutil
+import time as relogio
+import uuid
+from bisect import bisect_right
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.utils import timezone
+
+from .cache_utils import CACHE_PACIENTES
+
+VERSAO = 1
+MANIFESTO = "manifesto.json"
+LINHAS_POR_PARTE = 5000
+LOTE_IDS = 500  # ids por IN (...) na leitura e no DELETE
+# Transações abertas antes da marca podem gravar (com atualizado_em antigo) depois dela
+MARGEM_MARCA = timedelta(minutes=10)
+ORFAS_SEGUNDOS = 24 * 3600  # pastas .tmp-* de execuções que morreram no meio
+
+EXCLUIDAS = {
+    "sessions.session",
+    "core_gestao.ratelimitjanela",
+    "core_gestao.ratelimitbalde",
+    "core_gestao.agendarecursodia",  # travas da agenda, recriadas sob demanda
+    "core_gestao.contadorestatistica",  # métricas de diagnóstico
+}
+SO_INSERCAO = {
+    "admin.logentry",
+    "core_gestao.pacientebuscatoken",
+}
+
+
+class BackupInvalido(Exception):
+    """Backup ausente, corrompido ou de outro esquema (nada foi restaurado)."""
+
+
+# -----------------------------------------------------------------
+# Tabelas
+# -----------------------------------------------------------------
+
+def _modelos() -> list:
+    """Modelos copiados, na ordem do registro de apps (inclui as tabelas M2M automáticas)."""
+    return [
+        m
+        for m in apps.get_models(include_auto_created=True)
+        if m._meta.managed and not m._meta.proxy and m._meta.label_lower not in EXCLUIDAS
+    ]
+
+
+def _estrategia(modelo) -> str:
+    if modelo._meta.label_lower in SO_INSERCAO:
+        return "id"
+    try:
+        campo = modelo._meta.get_field("atualizado_em")
+    except FieldDoesNotExist:
+        return "completa"
+    return "atualizado_em" if isinstance(campo, models.DateTimeField) else "completa"
+
+
+def _colunas(modelo) -> list[str]:
+    return [f.attname for f in modelo._meta.local_concrete_fields]
+
+
+def _migracoes() -> list[str]:
+    return sorted(f"{app}.{nome}" for app, nome in MigrationRecorder(connection).applied_migrations())
+
+
+def _json(valor):
+    if isinstance(valor, (datetime, date, time)):
+        return valor.isoformat()
+    if isinstance(valor, (Decimal, uuid.UUID)):
+        return str(valor)
+    raise TypeError(f"Tipo não serializável no backup: {type(valor).__name__}")
+
+
+def _sha256(caminho: Path) -> str:
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+class _Faixas:
+    """Ids em faixas contíguas ``[[início, fim], ...]`` com teste de pertinência por bisect."""
+
+    def __init__(self, faixas):
+        self.faixas = faixas
+        self._inicios = [a for a, _ in faixas]
+
+    def __contains__(self, pk) -> bool:
+        i = bisect_right(self._inicios, pk) - 1
+        return i >= 0 and pk <= self.faixas[i][1]
+
+
+def _pks(modelo, filtro=None):
+    """Pks em ordem, lidos em lotes pelo índice (keyset; sem OFFSET nem cursor aberto)."""
+    qs = modelo._base_manager.order_by("pk").values_list("pk", flat=True)
+    if filtro is not None:
+        qs = qs.filter(filtro)
+    ultimo = None
+    while True:
+        lote = list((qs if ultimo is None else qs.filter(pk__gt=ultimo))[:LINHAS_POR_PARTE])
+        if not lote:
+            return
+        yield from lote
+        ultimo = lote[-1]
+
+
+def _todas(modelo, colunas):
+    qs = modelo._base_manager.order_by("pk").values_list(*colunas)
+    i_pk = colunas.index(modelo._meta.pk.attname)
+    ultimo = None
+    while True:
+        lote = list((qs if ultimo is None else qs.filter(pk__gt=ultimo))[:LINHAS_POR_PARTE])
+        if not lote:
+            return
+        yield from lote
+        ultimo = lote[-1][i_pk]
+
+
+def _por_ids(modelo, colunas, ids):
+    qs = modelo._base_manager.order_by("pk").values_list(*colunas)
+    for i in range(0, len(ids), LOTE_IDS):
+        yield from qs.filter(pk__in=ids[i : i + LOTE_IDS])
+
+
+# -----------------------------------------------------------------
+# Gravação
+# -----------------------------------------------------------------
+
+def _gravar_partes(pasta: Path, rotulo: str, linhas) -> list[dict]:
+    (pasta / rotulo).mkdir()
+    partes = []
+    linhas = iter(linhas)
+    while bloco := list(islice(linhas, LINHAS_POR_PARTE)):
+        relativo = f"{rotulo}/{len(partes):05d}.jsonl.gz"
+        with gzip.open(pasta / relativo, "wt", encoding="utf-8") as f:
+            for valores in bloco:
+                f.write(json.dumps(list(valores), default=_json, ensure_ascii=False))
+                f.write("\n")
+        partes.append({"arquivo": relativo, "linhas": len(bloco), "sha256": _sha256(pasta / relativo)})
+    return partes
+
+
+def _gravar_faixas(pasta: Path, rotulo: str, faixas) -> dict:
+    relativo = f"{rotulo}/ids.json.gz"
+    with gzip.open(pasta / relativo, "wt", encoding="utf-8") as f:
+        json.dump(faixas, f)
+    return {"arquivo": relativo, "faixas": len(faixas), "sha256": _sha256(pasta / relativo)}
+
+
+def _ler_faixas(pasta: Path, info: dict) -> _Faixas:
+    with gzip.open(pasta / info["ids"]["arquivo"], "rt", encoding="utf-8") as f:
+        return _Faixas(json.load(f))
+
+
+def _faixas_e_novos(modelo, anteriores: _Faixas | None):
+    """Faixas dos ids atuais e os ids que não estavam em ``anteriores``."""
+    faixas, novos = [], []
+    for pk in _pks(modelo):
+        if faixas and pk == faixas[-1][1] + 1:
+            faixas[-1][1] = pk
+        else:
+            faixas.append([pk, pk])
+        if anteriores is not None and pk not in anteriores:
+            novos.append(pk)
+    return faixas, novos
+
+
+def _copiar_tabela(pasta: Path, modelo, anterior: dict | None, marca) -> dict:
+    rotulo = modelo._meta.label_lower
+    estrategia = _estrategia(modelo)
+    colunas = _colunas(modelo)
+    info = {
+        "tabela": modelo._meta.db_table,
+        "estrategia": estrategia,
+        "colunas": colunas,
+        "copia": "completa",
+        "ids": None,
+    }
+    if estrategia == "completa":
+        info["partes"] = _gravar_partes(pasta, rotulo, _todas(modelo, colunas))
+    elif anterior is None:
+        info["partes"] = _gravar_partes(pasta, rotulo, _todas(modelo, colunas))
+        faixas, _ = _faixas_e_novos(modelo, None)
+        info["ids"] = _gravar_faixas(pasta, rotulo, faixas)
+    else:
+        faixas, ids = _faixas_e_novos(modelo, _ler_faixas(anterior["pasta"], anterior["tabelas"][rotulo]))
+        if estrategia == "atualizado_em":
+            alterados = _pks(modelo, models.Q(atualizado_em__gte=marca))
+            ids = sorted(set(ids).union(alterados))
+        info["copia"] = "parcial"
+        info["partes"] = _gravar_partes(pasta, rotulo, _por_ids(modelo, colunas, ids))
+        info["ids"] = _gravar_faixas(pasta, rotulo, faixas)
+    info["linhas"] = sum(p["linhas"] for p in info["partes"])
+    return info
+
+
+def _raiz(destino=None) -> Path:
+    return Path(destino or settings.BACKUP_DIR)
+
+
+def listar_backups(destino=None) -> list[dict]:
+    """Manifestos dos backups concluídos, do mais antigo ao mais novo (com ``pasta``)."""
+    raiz = _raiz(destino)
+    if not raiz.is_dir():
+        return []
+    backups = []
+    for pasta in raiz.iterdir():
+        arquivo = pasta / MANIFESTO
+        if pasta.name.startswith(".") or not arquivo.is_file():
+            continue
+        manifesto = json.loads(arquivo.read_text(encoding="utf-8"))
+        manifesto["pasta"] = pasta
+        backups.append(manifesto)
+    return sorted(backups, key=lambda m: m["id"])
+
+
+def _anterior_para_incremento(backups: list[dict], migracoes: list[str], inicio) -> dict | None:
+    """Último backup, se ainda dá para encadear nele (mesmo esquema e completo recente)."""
+    if not backups or backups[-1]["migracoes"] != migracoes:
+        return None
+    ultimo = backups[-1]
+    base = next((m for m in backups if m["id"] == ultimo["base"]), None)
+    limite = inicio - timedelta(days=settings.BACKUP_COMPLETO_DIAS)
+    if base is None or datetime.fromisoformat(base["inicio"]) < limite:
+        return None
+    return ultimo
+
+
+def fazer_backup(destino=None, completo: bool = False, agora=None) -> dict:
+    """Grava um backup (incremental quando possível) e devolve o manifesto."""
+    raiz = _raiz(destino)
+    raiz.mkdir(parents=True, exist_ok=True)
+    inicio = agora or timezone.now()
+    migracoes = _migracoes()
+    anterior = None if completo else _anterior_para_incremento(listar_backups(raiz), migracoes, inicio)
+    ident = inicio.strftime("%Y%m%dT%H%M%S%f")
+    tipo = "incremental" if anterior else "completo"
+    manifesto = {
+        "versao": VERSAO,
+        "id": ident,
+        "tipo": tipo,
+        "base": anterior["base"] if anterior else ident,
+        "anterior": anterior["id"] if anterior else None,
+        "inicio": inicio.isoformat(),
+        "migracoes": migracoes,
+        "tabelas": {},
+    }
+    marca = datetime.fromisoformat(anterior["inicio"]) - MARGEM_MARCA if anterior else None
+    tmp = raiz / f".tmp-{ident}"
+    tmp.mkdir()
+    try:
+        # Uma transação só: no InnoDB (REPEATABLE READ) todas as tabelas saem do mesmo snapshot
+        with transaction.atomic():
+            for modelo in _modelos():
+                manifesto["tabelas"][modelo._meta.label_lower] = _copiar_tabela(tmp, modelo, anterior, marca)
+        manifesto["concluido_em"] = timezone.now().isoformat()
+        (tmp / MANIFESTO).write_text(json.dumps(manifesto, indent=1, ensure_ascii=False), encoding="utf-8")
+        pasta = raiz / f"{ident}_{tipo}"
+        tmp.rename(pasta)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    manifesto["pasta"] = pasta
+    return manifesto
+
+
+def tamanho(manifesto: dict) -> int:
+    """Bytes em disco do backup."""
+    return sum(f.stat().st_size for f in manifesto["pasta"].rglob("*") if f.is_file())
+
+
+def podar(destino=None, manter: int | None = None) -> list[str]:
+    """Apaga as cadeias além das ``manter`` mais recentes e pastas temporárias órfãs."""
+    raiz = _raiz(destino)
+    manter = max(1, settings.BACKUP_MANTER_COMPLETOS if manter is None else manter)
+    backups = listar_backups(raiz)
+    bases = {m["id"] for m in backups if m["tipo"] == "completo"}
+    mantidas = set(sorted(bases)[-manter:])
+    removidos = []
+    for m in backups:
+        if m["base"] not in mantidas:
+            shutil.rmtree(m["pasta"])
+            removidos.append(m["pasta"].name)
+    if raiz.is_dir():
+        for pasta in raiz.glob(".tmp-*"):
+            if relogio.time() - pasta.stat().st_mtime > ORFAS_SEGUNDOS:
+                shutil.rmtree(pasta, ignore_errors=True)
+                removidos.append(pasta.name)
+    return removidos
+
+
+# -----------------------------------------------------------------
+# Restauração
+# -----------------------------------------------------------------
+
+def cadeia(backup_id: str | None = None, destino=None) -> list[dict]:
+    """Backups a aplicar para chegar em ``backup_id`` (padrão: o último): o completo e os incrementais."""
+    backups = listar_backups(destino)
+    if not backups:
+        raise BackupInvalido(f"Nenhum backup concluído em {_raiz(destino)}.")
+    por_id = {m["id"]: m for m in backups}
+    if backup_id in (None, "ultimo"):
+        alvo = backups[-1]
+    else:
+        alvo = por_id.get(backup_id.split("_")[0])
+        if alvo is None:
+            raise BackupInvalido(f"Backup {backup_id} não encontrado.")
+    elos = [alvo]
+    while elos[0]["tipo"] != "completo":
+        anterior = por_id.get(elos[0]["anterior"])
+        if anterior is None:
+            raise BackupInvalido(
+                f"Cadeia quebrada: {elos[0]['anterior']} (anterior de {elos[0]['id']}) não existe."
+            )
+        elos.insert(0, anterior)
+    return elos
+
+
+def verificar(elos: list[dict]) -> None:
+    """Confere versão, esquema e SHA-256 de todos os arquivos da cadeia."""
+    migracoes = _migracoes()
+    for m in elos:
+        if m.get("versao") != VERSAO:
+            raise BackupInvalido(f"{m['id']}: versão de manifesto {m.get('versao')} não suportada.")
+        if m["migracoes"] != migracoes:
+            raise BackupInvalido(
+                f"{m['id']}: migrações do backup diferem das aplicadas neste banco "
+                "(restaure com o código da mesma versão)."
+            )
+        for rotulo, info in m["tabelas"].items():
+            try:
+                modelo = apps.get_model(rotulo)
+            except LookupError:
+                raise BackupInvalido(f"{m['id']}: modelo {rotulo} não existe neste código.") from None
+            if info["colunas"] != _colunas(modelo):
+                raise BackupInvalido(f"{m['id']}: colunas de {rotulo} diferem do modelo atual.")
+            for arquivo in info["partes"] + ([info["ids"]] if info["ids"] else []):
+                caminho = m["pasta"] / arquivo["arquivo"]
+                if not caminho.is_file() or _sha256(caminho) != arquivo["sha256"]:
+                    raise BackupInvalido(f"{m['id']}: {arquivo['arquivo']} ausente ou corrompido.")
+
+
+def _apagar(cursor, modelo, pks=None) -> None:
+    qn = connection.ops.quote_name
+    tabela = qn(modelo._meta.db_table)
+    if pks is None:
+        cursor.execute(f"DELETE FROM {tabela}")
+        return
+    coluna = qn(modelo._meta.pk.column)
+    for i in range(0, len(pks), LOTE_IDS):
+        lote = pks[i : i + LOTE_IDS]
+        cursor.execute(f"DELETE FROM {tabela} WHERE {coluna} IN ({', '.join(['%s'] * len(lote))})", lote)
+
+
+def _aplicar_parte(cursor, modelo, colunas, caminho: Path, substituir: bool) -> None:
+    # SQL direto em vez de bulk_create: auto_now/auto_now_add regravariam as datas
+    qn = connection.ops.quote_name
+    campos = {f.attname: f for f in modelo._meta.local_concrete_fields}
+    campos = [campos[c] for c in colunas]
+    with gzip.open(caminho, "rt", encoding="utf-8") as f:
+        linhas = [json.loads(linha) for linha in f]
+    if substituir:
+        i_pk = colunas.index(modelo._meta.pk.attname)
+        _apagar(cursor, modelo, [linha[i_pk] for linha in linhas])
+    sql = "INSERT INTO {} ({}) VALUES ({})".format(
+        qn(modelo._meta.db_table),
+        ", ".join(qn(c.column) for c in campos),
+        ", ".join(["%s"] * len(campos)),
+    )
+    cursor.executemany(
+        sql,
+        [
+            [campo.get_db_prep_save(campo.to_python(valor), connection) for campo, valor in zip(campos, linha)]
+            for linha in linhas
+        ],
+    )
+
+
+def _remover_fora(cursor, modelo, faixas: _Faixas) -> None:
+    _apagar(cursor, modelo, [pk for pk in _pks(modelo) if pk not in faixas])
+
+
+def restaurar(elos: list[dict]) -> dict:
+    """
+    Aplica a cadeia (conferida com ``verificar``) numa transação: as tabelas do
+    backup ficam iguais ao último elo. Devolve as linhas por tabela.
+    """
+    modelos = [apps.get_model(rotulo) for rotulo in elos[0]["tabelas"]]
+    with transaction.atomic():
+        with connection.constraint_checks_disabled(), connection.cursor() as cursor:
+            for modelo in modelos:
+                _apagar(cursor, modelo)
+            for i, m in enumerate(elos):
+                for rotulo, info in m["tabelas"].items():
+                    modelo = apps.get_model(rotulo)
+                    parcial = info["copia"] == "parcial"
+                    if i and not parcial:
+                        _apagar(cursor, modelo)
+                    for parte in info["partes"]:
+                        _aplicar_parte(cursor, modelo, info["colunas"], m["pasta"] / parte["arquivo"], parcial)
+                    if parcial:
+                        _remover_fora(cursor, modelo, _ler_faixas(m["pasta"], info))
+        connection.check_constraints(table_names=[m._meta.db_table for m in modelos])
+        sequencias = connection.ops.sequence_reset_sql(no_style(), modelos)
+        if sequencias:
+            with connection.cursor() as cursor:
+                for sql in sequencias:
+                    cursor.execute(sql)
+    CACHE_PACIENTES.invalidar()
+    return {m._meta.label_lower: m._base_manager.count() for m in modelos}
@@ -0,0 +1 @@
+"""Micro-benchmarks, massa sintética e cenários de carga (rodar fora da suíte de testes)."""
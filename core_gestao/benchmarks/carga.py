@@ -0,0 +1,276 @@
+"""
+Cenário de carga: N recepcionistas simultâneos contra um servidor rodando.
+
+Cada usuário virtual faz login (com CSRF, como o navegador) e repete uma
+mistura ponderada de telas e APIs até acabar o tempo. No fim sai a latência
+p50/p95/p99 por view, erros e vazão. O cenário ``dia_de_pagamento`` junta
+webhooks do Mercado Pago assinados; com ``--mp-porta`` o MP falso
+(``mp_falso``) sobe aqui e os pagamentos notificados existem nele (o servidor
+deve apontar ``MERCADO_PAGO_API_BASE_URL`` para ele). Popule antes com
+``manage.py seed_benchmark --pacientes 100000 --senha-equipe ...``.
+
+    python -m core_gestao.benchmarks.carga --url http://127.0.0.1:8000 --senha ... \\
+        --usuarios 20 --duracao 120 --cenario dia_de_pagamento --webhook-secret ... --mp-porta 8765
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from datetime import date
+from math import ceil
+
+import requests
+
+from core_gestao.benchmarks.mp_falso import ServidorMPFalso, assinar_webhook
+
+PREFIXO = "/sistema"
+BUSCAS = ("ana", "jo", "mar", "silva", "conceicao", "fra", "luiz", "souza", "ped", "991000")
+
+
+class _Usuario:
+    """Sessão HTTP de um usuário virtual (cookies, CSRF e ETag da TV próprios)."""
+
+    def __init__(self, base_url: str, contexto: dict, semente: int):
+        self.base_url = base_url.rstrip("/")
+        self.sessao = requests.Session()
+        self.contexto = contexto
+        self.rnd = random.Random(semente)
+        self.etag_tv = ""
+
+    def url(self, caminho: str) -> str:
+        return f"{self.base_url}{PREFIXO}{caminho}"
+
+    def get(self, caminho: str, **kwargs):
+        return self.sessao.get(self.url(caminho), timeout=30, allow_redirects=False, **kwargs)
+
+    def login(self, usuario: str, senha: str) -> None:
+        self.sessao.get(self.url("/login/"), timeout=30)
+        resposta = self.sessao.post(
+            self.url("/login/"),
+            data={
+                "username": usuario,
+                "password": senha,
+                "csrfmiddlewaretoken": self.sessao.cookies.get("csrftoken", ""),
+            },
+            headers={"Referer": self.url("/login/")},
+            timeout=30,
+            allow_redirects=False,
+        )
+        if resposta.status_code != 302 or "/login/" in resposta.headers.get("Location", ""):
+            raise SystemExit(f"Login de {usuario!r} falhou (HTTP {resposta.status_code}).")
+
+    def paciente(self) -> int:
+        return self.rnd.choice(self.contexto["pacientes"])
+
+
+# -----------------------------------------------------------------
+# Ações (nome da view -> request)
+# -----------------------------------------------------------------
+
+def _painel_colaborador(u: _Usuario):
+    return u.get("/colaborador/painel/")
+
+
+def _agenda_view(u: _Usuario):
+    return u.get("/agenda/", params={"data": date.today().isoformat()})
+
+
+def _cliente_list(u: _Usuario):
+    return u.get("/paciente/lista/")
+
+
+def _cliente_list_busca(u: _Usuario):
+    return u.get("/paciente/lista/", params={"q": u.rnd.choice(BUSCAS)})
+
+
+def _api_buscar_paciente(u: _Usuario):
+    return u.get("/api/v1/buscar-paciente/", params={"q": u.rnd.choice(BUSCAS)})
+
+
+def _api_detalhes_paciente(u: _Usuario):
+    return u.get(f"/api/v1/detalhes-paciente/{u.paciente()}/", params={"procedimento_id": "consulta_clinica"})
+
+
+def _prontuario_view(u: _Usuario):
+    return u.get(f"/paciente/prontuario/{u.paciente()}/")
+
+
+def _master_dashboard(u: _Usuario):
+    return u.get("/master/dashboard/")
+
+
+def _planos_a_vencer(u: _Usuario):
+    return u.get("/planos/a-vencer/")
+
+
+def _api_tv_chamada(u: _Usuario):
+    # Como a TV: repete o ETag e recebe 304 enquanto não houver chamada nova
+    resposta = u.get("/api/v1/tv-chamada/", headers={"If-None-Match": u.etag_tv} if u.etag_tv else {})
+    u.etag_tv = resposta.headers.get("ETag", u.etag_tv)
+    return resposta
+
+
+def _mp_webhook(u: _Usuario):
+    mp = u.contexto.get("mp")
+    if mp is not None:
+        payment_id = mp.criar_pagamento(
+            {"transaction_amount": 59.90, "payment_method_id": "visa", "external_reference": ""}
+        )["id"]
+    else:
+        payment_id = u.rnd.randint(10**10, 10**11)
+    cabecalhos = {"Content-Type": "application/json"}
+    if u.contexto.get("webhook_secret"):
+        cabecalhos.update(assinar_webhook(payment_id, u.contexto["webhook_secret"]))
+    corpo = {"type": "payment", "action": "payment.updated", "data": {"id": str(payment_id)}}
+    return u.sessao.post(u.url("/api/v1/mp/webhook/"), data=json.dumps(corpo), headers=cabecalhos, timeout=30)
+
+
+CENARIOS = {
+    # Recepção num dia comum: agenda, busca de paciente, detalhes com desconto, TV ligada
+    "recepcao": {
+        "painel_colaborador": (_painel_colaborador, 15),
+        "agenda_view": (_agenda_view, 15),
+        "cliente_list": (_cliente_list, 5),
+        "cliente_list?q": (_cliente_list_busca, 10),
+        "api_buscar_paciente": (_api_buscar_paciente, 20),
+        "api_detalhes_paciente": (_api_detalhes_paciente, 15),
+        "prontuario_view": (_prontuario_view, 5),
+        "master_dashboard": (_master_dashboard, 3),
+        "planos_a_vencer": (_planos_a_vencer, 2),
+        "api_tv_chamada": (_api_tv_chamada, 10),
+    },
+    # Dias 10/20: a recepção continua e os webhooks do MP chegam em rajada
+    "dia_de_pagamento": {
+        "painel_colaborador": (_painel_colaborador, 10),
+        "agenda_view": (_agenda_view, 10),
+        "api_buscar_paciente": (_api_buscar_paciente, 10),
+        "api_detalhes_paciente": (_api_detalhes_paciente, 10),
+        "master_dashboard": (_master_dashboard, 5),
+        "api_tv_chamada": (_api_tv_chamada, 5),
+        "mp_webhook": (_mp_webhook, 50),
+    },
+}
+
+
+def percentil(valores: list, p: float) -> float:
+    """Nearest-rank sobre a lista já ordenada."""
+    return valores[max(0, ceil(p * len(valores)) - 1)]
+
+
+def _pacientes(u: _Usuario) -> list[int]:
+    ids = set()
+    for termo in BUSCAS:
+        resposta = u.get("/api/v1/buscar-paciente/", params={"q": termo})
+        if resposta.status_code == 200:
+            ids.update(r["id"] for r in resposta.json().get("results", []))
+    if not ids:
+        raise SystemExit("Nenhum paciente encontrado: rode manage.py seed_benchmark antes.")
+    return sorted(ids)
+
+
+def _trabalhar(u: _Usuario, acoes: list, pesos: list, fim: float, amostras: dict, lock) -> None:
+    locais = {}
+    while time.monotonic() < fim:
+        nome, acao = u.rnd.choices(acoes, pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            erro = acao(u).status_code >= 400
+        except requests.RequestException:
+            erro = True
+        ms = (time.perf_counter() - inicio) * 1000
+        locais.setdefault(nome, []).append((ms, erro))
+    with lock:
+        for nome, lista in locais.items():
+            amostras.setdefault(nome, []).extend(lista)
+
+
+def executar(url: str, usuario: str, senha: str, cenario: str = "recepcao", usuarios: int = 10,
+             duracao: float = 60, webhook_secret: str = "", mp_porta: int | None = None,
+             semente: int = 1) -> dict:
+    """Roda o cenário por ``duracao`` segundos com ``usuarios`` sessões em paralelo."""
+    mistura = CENARIOS[cenario]
+    acoes = [(nome, acao) for nome, (acao, _) in mistura.items()]
+    pesos = [peso for _, peso in mistura.values()]
+    mp = ServidorMPFalso(mp_porta).iniciar() if mp_porta is not None else None
+    contexto = {"webhook_secret": webhook_secret, "mp": mp}
+    try:
+        vus = [_Usuario(url, contexto, semente + i) for i in range(usuarios)]
+        for u in vus:
+            u.login(usuario, senha)
+        contexto["pacientes"] = _pacientes(vus[0])
+
+        amostras, lock = {}, threading.Lock()
+        inicio = time.monotonic()
+        fim = inicio + duracao
+        threads = [
+            threading.Thread(target=_trabalhar, args=(u, acoes, pesos, fim, amostras, lock)) for u in vus
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        decorrido = time.monotonic() - inicio
+    finally:
+        if mp is not None:
+            mp.parar()
+
+    views = {}
+    for nome, lista in sorted(amostras.items()):
+        ms = sorted(m for m, _ in lista)
+        views[nome] = {
+            "requests": len(lista),
+            "erros": sum(1 for _, erro in lista if erro),
+            "p50": round(percentil(ms, 0.50), 1),
+            "p95": round(percentil(ms, 0.95), 1),
+            "p99": round(percentil(ms, 0.99), 1),
+            "max": round(ms[-1], 1),
+        }
+    total = sum(v["requests"] for v in views.values())
+    return {
+        "cenario": cenario,
+        "usuarios": usuarios,
+        "segundos": round(decorrido, 1),
+        "requests": total,
+        "rps": round(total / decorrido, 1) if decorrido else 0.0,
+        "pacientes_amostrados": len(contexto["pacientes"]),
+        "mp_falso": mp.estatisticas() if mp is not None else None,
+        "views": views,
+    }
+
+
+def imprimir(resultado: dict, saida=print) -> None:
+    saida(
+        f"Cenário {resultado['cenario']}: {resultado['usuarios']} usuários, {resultado['segundos']} s, "
+        f"{resultado['requests']} requests ({resultado['rps']} req/s)"
+    )
+    saida(f"  {'view':<24} {'req':>7} {'erros':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for nome, v in resultado["views"].items():
+        saida(
+            f"  {nome:<24} {v['requests']:>7} {v['erros']:>6} {v['p50']:>8} {v['p95']:>8} "
+            f"{v['p99']:>8} {v['max']:>8}"
+        )
+    if resultado["mp_falso"]:
+        saida(f"  MP falso: {resultado['mp_falso']['rotas']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--usuario", default="master")
+    parser.add_argument("--senha", required=True)
+    parser.add_argument("--cenario", choices=sorted(CENARIOS), default="recepcao")
+    parser.add_argument("--usuarios", type=int, default=10)
+    parser.add_argument("--duracao", type=float, default=60)
+    parser.add_argument("--webhook-secret", default="")
+    parser.add_argument("--mp-porta", type=int, help="Sobe o MP falso nesta porta durante a carga.")
+    parser.add_argument("--json", action="store_true", help="Resultado em JSON (para comparar execuções).")
+    args = parser.parse_args()
+    resultado = executar(
+        args.url, args.usuario, args.senha, args.cenario, args.usuarios, args.duracao,
+        args.webhook_secret, args.mp_porta,
+    )
+    if args.json:
+        print(json.dumps(resultado, indent=2))
+    else:
+        imprimir(resultado)
@@ -0,0 +1,107 @@
+"""
+Cobertura de procedimentos por plano: matcher compilado vs varredura linear.
+
+    DJANGO_SETTINGS_MODULE=ultramed_app.settings python -m core_gestao.benchmarks.cobertura
+"""
+import os
+import time
+import unicodedata
+import re
+
+
+def _normalizar_linear(nome):
+    if not nome:
+        return ""
+    texto = unicodedata.normalize("NFKD", str(nome))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r"\s+", " ", texto).strip()
+
+
+def cobertura_linear(plano_nome, nome_procedimento, tipo_agenda=None):
+    """Implementação anterior (referência de equivalência e de tempo)."""
+    from core_gestao.plano_utils import (
+        PROCEDIMENTOS_ESSENCIAL,
+        PROCEDIMENTOS_LAB_ROTINA,
+        PROCEDIMENTOS_MASTER_EXTRA,
+    )
+
+    def contem(nome, termos):
+        return any(termo in nome for termo in termos)
+
+    if nome_procedimento:
+        nome = _normalizar_linear(nome_procedimento)
+    elif (tipo_agenda or "").upper() == "CONSULTA":
+        nome = "consulta"
+    else:
+        nome = ""
+    plano = (plano_nome or "").upper()
+    if not nome and (tipo_agenda or "").upper() != "CONSULTA":
+        return False, ""
+    if "ESSENCIAL" in plano:
+        return (True, "essencial") if contem(nome, PROCEDIMENTOS_ESSENCIAL) else (False, "")
+    base = PROCEDIMENTOS_ESSENCIAL + PROCEDIMENTOS_MASTER_EXTRA
+    if "MASTER" in plano:
+        if (tipo_agenda or "").upper() == "CONSULTA" or contem(nome, base):
+            return True, "master"
+        return False, ""
+    if "EMPRESARIAL" in plano:
+        if contem(nome, PROCEDIMENTOS_LAB_ROTINA):
+            return True, "lab_rotina"
+        if (tipo_agenda or "").upper() == "CONSULTA" or contem(nome, base):
+            return True, "empresarial_clinico"
+        return False, ""
+    return False, ""
+
+
+def casos():
+    """Nomes do catálogo + variações de digitação da recepção, nos três planos."""
+    from core_gestao.procedimentos_catalogo import CATALOGO_PROCEDIMENTOS
+
+    nomes = [p["nome"] for p in CATALOGO_PROCEDIMENTOS]
+    nomes += [n.upper() for n in nomes] + [f"  {n}  (retorno) " for n in nomes]
+    nomes += ["Ultrassom de Próstata", "HEMOGRAMA COMPLETO", "Raio-X tórax", "", None]
+    tipos = (None, "CONSULTA", "EXAME")
+    return [
+        (plano, nome, tipo)
+        for plano in ("ESSENCIAL", "MASTER", "EMPRESARIAL", "")
+        for nome in nomes
+        for tipo in tipos
+    ]
+
+
+def executar(repeticoes: int = 200) -> dict:
+    from core_gestao import plano_utils
+
+    lista = casos()
+    divergentes = [
+        c for c in lista if plano_utils.procedimento_coberto_pelo_plano(*c) != cobertura_linear(*c)
+    ]
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for c in lista:
+            cobertura_linear(*c)
+    linear = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    for _ in range(repeticoes):
+        for c in lista:
+            plano_utils.procedimento_coberto_pelo_plano(*c)
+    compilado = time.perf_counter() - inicio
+
+    avaliacoes = repeticoes * len(lista)
+    return {
+        "avaliacoes": avaliacoes,
+        "linear_us": round(linear / avaliacoes * 1e6, 3),
+        "compilado_us": round(compilado / avaliacoes * 1e6, 3),
+        "ganho": round(linear / compilado, 1) if compilado else None,
+        "divergentes": len(divergentes),
+    }
+
+
+if __name__ == "__main__":
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ultramed_app.settings")
+    import django
+
+    django.setup()
+    print(executar())
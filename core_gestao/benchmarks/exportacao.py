@@ -0,0 +1,101 @@
+"""
+Exportação em streaming: tempo, tamanho e pico de memória por tabela/formato.
+
+Popula um banco de teste descartável com ``--pacientes`` pacientes pela massa
+de ``massa.popular`` (faturas do mês, agenda de 30 dias para trás e para
+frente) e consome cada exportação inteira como o cliente faria. O pico de
+memória (tracemalloc) deve ficar estável ao aumentar ``--pacientes``; só o
+tempo cresce.
+
+    DJANGO_SETTINGS_MODULE=ultramed_app.settings python -m core_gestao.benchmarks.exportacao --pacientes 1000000
+"""
+import argparse
+import os
+import time
+import tracemalloc
+from datetime import timedelta
+
+from core_gestao.benchmarks.massa import DIAS_AGENDA, popular
+
+
+def exportacoes() -> dict:
+    """Os mesmos querysets que as views usam: mês corrente e a agenda do período inteiro da massa."""
+    from django.utils import timezone
+
+    from core_gestao import exportacao
+    from core_gestao.models import Agenda, Paciente
+    from core_gestao.periodos import intervalo_mes
+
+    hoje = timezone.now().date()
+    inicio, fim = intervalo_mes(hoje.year, hoje.month)
+    return {
+        "pacientes": lambda: exportacao.linhas_pacientes(Paciente.objects.filter(is_titular=True)),
+        "faturas": lambda: exportacao.linhas_faturas(exportacao.faturas_do_periodo(inicio, fim)),
+        "agenda": lambda: exportacao.linhas_agenda(
+            Agenda.objects.filter(
+                data__gte=hoje - timedelta(days=DIAS_AGENDA), data__lte=hoje + timedelta(days=DIAS_AGENDA)
+            )
+        ),
+    }
+
+
+def _medir(linhas, formato: str, nome: str) -> dict:
+    from core_gestao.exportacao import resposta_exportacao
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    total = 0
+    for pedaco in resposta_exportacao(linhas, formato, nome).streaming_content:
+        total += len(pedaco)
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "segundos": round(segundos, 2),
+        "mb_gerados": round(total / 2**20, 1),
+        "pico_memoria_mb": round(pico / 2**20, 2),
+    }
+
+
+def executar(pacientes: int = 1_000_000, formatos=("csv", "xlsx")) -> dict:
+    """Cria o banco de teste, mede cada exportação em cada formato e o destrói."""
+    from django.db import connection
+
+    from core_gestao.exportacao import LOTE_EXPORTACAO
+
+    nome_original = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        massa = popular(pacientes)
+        medidas = {
+            f"{nome}.{formato}": _medir(fabricar(), formato, nome)
+            for nome, fabricar in exportacoes().items()
+            for formato in formatos
+        }
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=0)
+    return {"banco": connection.vendor, "massa": massa, "lote": LOTE_EXPORTACAO, "exportacoes": medidas}
+
+
+def imprimir(resultado: dict, saida=print) -> None:
+    saida(
+        f"Banco: {resultado['banco']} — massa: {resultado['massa']}, "
+        f"lotes de {resultado['lote']}"
+    )
+    for nome, m in resultado["exportacoes"].items():
+        saida(
+            f"  {nome:<16} {m['segundos']:>8} s  {m['mb_gerados']:>8} MB  "
+            f"pico {m['pico_memoria_mb']} MB"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pacientes", type=int, default=1_000_000)
+    parser.add_argument("--formatos", nargs="+", default=["csv", "xlsx"], choices=["csv", "xlsx"])
+    args = parser.parse_args()
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ultramed_app.settings")
+    import django
+
+    django.setup()
+    imprimir(executar(args.pacientes, tuple(args.formatos)))
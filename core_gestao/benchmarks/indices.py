@@ -0,0 +1,174 @@
+"""
+Índices compostos dos filtros quentes: EXPLAIN e tempos antes/depois.
+
+Roda num banco de teste descartável (``test_<NAME>`` no mesmo servidor, ou
+SQLite em memória) com o esquema atual e a massa de ``massa.popular`` (dois
+anos de histórico): os índices da migração 0024 são removidos por DDL antes
+da carga e recriados para a segunda medição (voltar a migração deixaria o
+banco sem as colunas que os modelos atuais gravam). O banco de produção não
+é tocado.
+
+    DJANGO_SETTINGS_MODULE=ultramed_app.settings python -m core_gestao.benchmarks.indices --pacientes 100000
+"""
+import argparse
+import importlib
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from core_gestao.benchmarks.massa import popular
+
+MIGRACAO_INDICES = "core_gestao.migrations.0024_indices_filtros"
+MESES_HISTORICO = 24
+LOTE = 5000
+
+
+def _popular(pacientes: int, semente: int = 7) -> dict:
+    """Massa de ``massa.popular`` com ~2 anos de faturas e agenda (a seletividade que os índices exploram)."""
+    from django.utils import timezone
+
+    from core_gestao.models import Fatura, Prontuario
+
+    contagem = popular(pacientes, semente, meses_faturas=MESES_HISTORICO, dias_agenda=MESES_HISTORICO * 30)
+    # auto_now_add grava "agora": espalha os atendimentos pelo mesmo período
+    rnd = random.Random(semente)
+    pks = list(Prontuario.objects.order_by("id").values_list("id", flat=True))
+    for inicio in range(0, len(pks), LOTE):
+        Prontuario.objects.filter(id__in=pks[inicio : inicio + LOTE]).update(
+            data_atendimento=timezone.now() - timedelta(days=rnd.randint(0, MESES_HISTORICO * 30))
+        )
+    paciente_exemplo, plano_exemplo = (
+        Fatura.objects.order_by("id").values_list("paciente_id", "plano_id").first()
+    )
+    return {**contagem, "paciente_exemplo": paciente_exemplo, "plano_exemplo": plano_exemplo}
+
+
+def consultas(dados: dict) -> dict:
+    """Os filtros de views.py/plano_utils.py cobertos pelos índices (querysets)."""
+    from django.db.models import Count, Sum
+    from django.utils import timezone
+
+    from core_gestao.models import Agenda, Fatura, Paciente, Prontuario
+    from core_gestao.periodos import intervalo_mes, intervalo_mes_local
+
+    hoje = timezone.now().date()
+    inicio, fim = intervalo_mes(hoje.year, hoje.month)
+    inicio_dt, fim_dt = intervalo_mes_local(hoje.year, hoje.month)
+    pago_mes = Fatura.objects.filter(status="PAGO", data_pagamento__gte=inicio, data_pagamento__lt=fim)
+    return {
+        "agenda_fila_do_dia": Agenda.objects.filter(data=hoje, status="CHEGOU").order_by("hora"),
+        "dashboard_recebimentos_mes": pago_mes.values("metodo_pagamento").annotate(
+            subtotal=Sum("valor"), quantidade=Count("id")
+        ),
+        "checkout_fatura_pendente": Fatura.objects.filter(
+            paciente_id=dados["paciente_exemplo"],
+            plano_id=dados["plano_exemplo"],
+            status="PENDENTE",
+            data_vencimento__gte=hoje - timedelta(days=7),
+        ).order_by("-id"),
+        "planos_a_vencer": Paciente.objects.filter(
+            is_titular=True, vencimento_plano__range=[hoje, hoje + timedelta(days=30)]
+        ).order_by("vencimento_plano"),
+        "prontuario_uso_no_mes": Prontuario.objects.filter(
+            paciente_id=dados["paciente_exemplo"],
+            data_atendimento__gte=inicio_dt,
+            data_atendimento__lt=fim_dt,
+        ),
+    }
+
+
+def _medir(queryset, repeticoes: int) -> dict:
+    plano = queryset.explain()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        list(queryset.all())
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {"ms_mediana": round(statistics.median(tempos), 3), "explain": plano}
+
+
+def _indices_medidos() -> list[tuple]:
+    """(modelo, índice) de cada AddIndex da migração dos filtros quentes."""
+    from django.apps import apps
+    from django.db.migrations.operations import AddIndex
+
+    migracao = importlib.import_module(MIGRACAO_INDICES).Migration
+    return [
+        (apps.get_model("core_gestao", op.model_name), op.index)
+        for op in migracao.operations
+        if isinstance(op, AddIndex)
+    ]
+
+
+def _alternar_indices(criar: bool) -> None:
+    from django.db import connection
+
+    with connection.schema_editor() as editor:
+        for modelo, indice in _indices_medidos():
+            if criar:
+                editor.add_index(modelo, indice)
+            else:
+                editor.remove_index(modelo, indice)
+
+
+def _atualizar_estatisticas() -> None:
+    """Estatísticas do otimizador após a carga (senão o plano ignora seletividade)."""
+    from django.apps import apps
+    from django.db import connection
+
+    tabelas = [m._meta.db_table for m in apps.get_app_config("core_gestao").get_models()]
+    with connection.cursor() as cursor:
+        if connection.vendor == "mysql":
+            cursor.execute("ANALYZE TABLE " + ", ".join(tabelas))
+            cursor.fetchall()
+        else:
+            cursor.execute("ANALYZE")
+
+
+def executar(pacientes: int = 100_000, repeticoes: int = 20) -> dict:
+    """Cria o banco de teste, mede antes e depois dos índices e o destrói."""
+    from django.db import connection
+
+    nome_original = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        _alternar_indices(criar=False)
+        dados = _popular(pacientes)
+        _atualizar_estatisticas()
+        antes = {nome: _medir(qs, repeticoes) for nome, qs in consultas(dados).items()}
+        _alternar_indices(criar=True)
+        _atualizar_estatisticas()
+        depois = {nome: _medir(qs, repeticoes) for nome, qs in consultas(dados).items()}
+    finally:
+        connection.creation.destroy_test_db(nome_original, verbosity=0)
+    return {
+        "banco": connection.vendor,
+        "linhas": {k: v for k, v in dados.items() if not k.endswith("_exemplo")},
+        "consultas": {
+            nome: {"antes": antes[nome], "depois": depois[nome]} for nome in antes
+        },
+    }
+
+
+def imprimir(resultado: dict, saida=print) -> None:
+    saida(f"Banco: {resultado['banco']} — linhas: {resultado['linhas']}")
+    for nome, medidas in resultado["consultas"].items():
+        antes, depois = medidas["antes"], medidas["depois"]
+        ganho = antes["ms_mediana"] / depois["ms_mediana"] if depois["ms_mediana"] else 0
+        saida(f"\n== {nome}: {antes['ms_mediana']} ms -> {depois['ms_mediana']} ms ({ganho:.1f}x)")
+        saida(f"   antes:  {antes['explain']}")
+        saida(f"   depois: {depois['explain']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pacientes", type=int, default=100_000)
+    parser.add_argument("--repeticoes", type=int, default=20)
+    args = parser.parse_args()
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ultramed_app.settings")
+    import django
+
+    django.setup()
+    imprimir(executar(args.pacientes, args.repeticoes))
@@ -0,0 +1,347 @@
+"""
+Massa sintética para medir o sistema em escala (``manage.py seed_benchmark``).
+
+Gera famílias (titular + 0 a 3 dependentes) com nomes acentuados, planos e
+vencimentos espalhados, faturas mensais com pico nos dias de pagamento (10 e
+20), agenda de 30 dias para trás e para frente com procedimentos do catálogo,
+prontuários das consultas finalizadas e exames das agendas de exame. Tudo via
+``bulk_create`` em lotes; campos e tokens de busca e a receita mensal são
+gravados aqui, já que ``Paciente.save`` e ``marcar_fatura_paga`` não rodam.
+CPFs sintéticos começam com ``PREFIXO_CPF`` e continuam do último gerado, então
+rodar de novo acrescenta pacientes em vez de colidir.
+"""
+import random
+from datetime import date, time as dtime, timedelta
+from decimal import Decimal
+
+LOTE = 2000
+PREFIXO_CPF = "99"
+DIAS_PAGAMENTO = (10, 20)
+MESES_FATURAS = 3
+DIAS_AGENDA = 30
+PROPORCAO_CONSULTAS = 0.55  # o catálogo tem poucas consultas e muitos exames
+
+PLANOS = (("ESSENCIAL", Decimal("44.90")), ("MASTER", Decimal("59.90")), ("EMPRESARIAL", Decimal("69.90")))
+PESOS_PLANOS = (5, 4, 1)
+PESOS_DEPENDENTES = (45, 25, 20, 10)  # 0, 1, 2 ou 3 dependentes por titular
+
+NOMES_F = (
+    "Ana", "Maria", "Francisca", "Antônia", "Adriana", "Juliana", "Márcia", "Fernanda", "Patrícia",
+    "Aline", "Luíza", "Sebastiana", "Conceição", "Raimunda", "Letícia", "Débora", "Cláudia", "Thaís",
+)
+NOMES_M = (
+    "José", "João", "Antônio", "Francisco", "Carlos", "Paulo", "Pedro", "Lucas", "Luiz", "Marcos",
+    "Raimundo", "Sebastião", "Márcio", "Fábio", "Cícero", "Josué", "Otávio", "Ângelo",
+)
+SOBRENOMES = (
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima",
+    "Gomes", "Conceição", "Araújo", "Ribeiro", "Carvalho", "Nascimento", "Sousa", "Brandão",
+    "Guimarães", "Lopes", "Damasceno", "D'Ávila", "Assunção", "Magalhães", "Gonçalves",
+)
+BAIRROS = ("Centro", "Vila Nova", "Bairro Alto", "Xingu", "Jardim Tropical", "Setor Aeroporto")
+DOENCAS = ("HIPERTENSAO", "DIABETES", "HIPERTENSAO,DIABETES", "ASMA")
+EVOLUCOES = (
+    "Paciente refere melhora dos sintomas. PA controlada.",
+    "Queixa de cefaleia há 3 dias, sem sinais de alarme.",
+    "Retorno com exames: glicemia dentro da meta.",
+    "Dor lombar mecânica, orientado repouso relativo.",
+)
+
+
+def _lotes(itens, tamanho):
+    for i in range(0, len(itens), tamanho):
+        yield itens[i:i + tamanho]
+
+
+class _Gerador:
+    def __init__(self, semente: int, hoje: date):
+        self.rnd = random.Random(semente)
+        self.hoje = hoje
+
+    def nome(self, sexo: str, sobrenome: str | None = None) -> str:
+        primeiro = self.rnd.choice(NOMES_F if sexo == "F" else NOMES_M)
+        meio = self.rnd.choice(SOBRENOMES)
+        return f"{primeiro} {meio} {sobrenome or self.rnd.choice(SOBRENOMES)}"
+
+    def nascimento(self, idade_min: int, idade_max: int) -> date:
+        return self.hoje - timedelta(days=self.rnd.randint(idade_min * 365, idade_max * 365))
+
+    def hora(self) -> dtime:
+        return dtime(self.rnd.randint(7, 17), self.rnd.choice((0, 15, 30, 45)))
+
+    def dia_pagamento(self, ano: int, mes: int) -> date:
+        # Maioria paga no vencimento (10 ou 20); o resto se espalha pelo mês (nunca depois de hoje)
+        dia = self.rnd.choice(DIAS_PAGAMENTO) if self.rnd.random() < 0.7 else self.rnd.randint(1, 28)
+        if (ano, mes) == (self.hoje.year, self.hoje.month) and dia > self.hoje.day:
+            dia = self.rnd.randint(1, self.hoje.day)
+        return date(ano, mes, dia)
+
+
+def _proximo_cpf() -> int:
+    from django.db.models import Max
+
+    from core_gestao.models import Paciente
+
+    ultimo = Paciente.objects.filter(cpf__startswith=PREFIXO_CPF).aggregate(m=Max("cpf"))["m"]
+    digitos = 11 - len(PREFIXO_CPF)
+    if ultimo and len(ultimo) == 11 and ultimo.isdigit():
+        return int(ultimo[len(PREFIXO_CPF):]) + 1
+    return 10 ** (digitos - 1)
+
+
+def _planos() -> list:
+    from core_gestao.models import Plano
+
+    planos = []
+    for nome, valor in PLANOS:
+        plano = Plano.objects.filter(nome=nome).order_by("id").first()
+        planos.append(plano or Plano.objects.create(nome=nome, descricao="", valor_anual=valor))
+    return planos
+
+
+def _meses_anteriores(hoje: date, quantidade: int) -> list[tuple[int, int]]:
+    meses = []
+    ano, mes = hoje.year, hoje.month
+    for _ in range(quantidade):
+        meses.append((ano, mes))
+        ano, mes = (ano, mes - 1) if mes > 1 else (ano - 1, 12)
+    return meses[::-1]
+
+
+def _gravar_pacientes(pacientes: list) -> dict:
+    """bulk_create + campos/tokens de busca; devolve {cpf: id} (funciona sem RETURNING no MySQL)."""
+    from core_gestao.busca_pacientes import campos_busca, tokens_nome
+    from core_gestao.models import Paciente, PacienteBuscaToken
+
+    for p in pacientes:
+        for campo, valor in campos_busca(p).items():
+            setattr(p, campo, valor)
+    Paciente.objects.bulk_create(pacientes)
+    ids = dict(Paciente.objects.filter(cpf__in=[p.cpf for p in pacientes]).values_list("cpf", "id"))
+    PacienteBuscaToken.objects.bulk_create(
+        [PacienteBuscaToken(paciente_id=ids[p.cpf], token=t) for p in pacientes for t in tokens_nome(p.nome_completo)]
+    )
+    return ids
+
+
+def _familias(g: _Gerador, n: int, proximo: int, planos: list) -> tuple[list, list, int]:
+    """Titulares e dependentes (dependentes com responsavel_id ainda pendente, via cpf do titular)."""
+    from core_gestao.models import Paciente
+
+    titulares, dependentes = [], []
+    total = 0
+    while total < n:
+        sexo = g.rnd.choice("MF")
+        sobrenome = g.rnd.choice(SOBRENOMES)
+        qtd_dep = min(n - total - 1, g.rnd.choices(range(4), PESOS_DEPENDENTES)[0])
+        plano = g.rnd.choices(planos, PESOS_PLANOS)[0] if g.rnd.random() < 0.9 else None
+        vencimento = g.hoje + timedelta(days=g.rnd.randint(-60, 365)) if plano else None
+        titular = Paciente(
+            nome_completo=g.nome(sexo, sobrenome),
+            cpf=f"{PREFIXO_CPF}{proximo:0{11 - len(PREFIXO_CPF)}d}",
+            telefone=f"949{g.rnd.randint(0, 99_999_999):08d}",
+            data_nascimento=g.nascimento(18, 85),
+            sexo=sexo,
+            endereco=f"Rua {g.rnd.choice(SOBRENOMES)}, {g.rnd.randint(1, 2000)}",
+            bairro=g.rnd.choice(BAIRROS),
+            plano=plano,
+            vencimento_plano=vencimento,
+            possui_dependentes=qtd_dep > 0,
+            is_titular=True,
+            is_cronico=g.rnd.random() < 0.15,
+        )
+        if titular.is_cronico:
+            titular.doencas_cronicas = g.rnd.choice(DOENCAS)
+        titulares.append(titular)
+        proximo += 1
+        for _ in range(qtd_dep):
+            sexo_dep = g.rnd.choice("MF")
+            dep = Paciente(
+                nome_completo=g.nome(sexo_dep, sobrenome),
+                cpf=f"{PREFIXO_CPF}{proximo:0{11 - len(PREFIXO_CPF)}d}",
+                telefone=titular.telefone,
+                data_nascimento=g.nascimento(0, 60),
+                sexo=sexo_dep,
+                bairro=titular.bairro,
+                plano=plano,
+                vencimento_plano=vencimento,
+                is_titular=False,
+            )
+            dep._cpf_responsavel = titular.cpf
+            dependentes.append(dep)
+            proximo += 1
+        total += 1 + qtd_dep
+    return titulares, dependentes, proximo
+
+
+def _faturas(g: _Gerador, titulares: list, ids: dict, meses_faturas: int) -> list:
+    from core_gestao.models import Fatura
+
+    faturas = []
+    meses = _meses_anteriores(g.hoje, meses_faturas)
+    for t in titulares:
+        if t.plano is None:
+            continue
+        dia = g.rnd.choice(DIAS_PAGAMENTO)
+        for ano, mes in meses:
+            vencimento = date(ano, mes, dia)
+            atual = (ano, mes) == (g.hoje.year, g.hoje.month)
+            sorteio = g.rnd.random()
+            if atual and vencimento > g.hoje:
+                status, pagamento = "PENDENTE", None
+            elif sorteio < 0.85:
+                status, pagamento = "PAGO", g.dia_pagamento(ano, mes)
+            else:
+                status, pagamento = "ATRASADO", None
+            faturas.append(
+                Fatura(
+                    paciente_id=ids[t.cpf],
+                    plano=t.plano,
+                    valor=t.plano.valor_anual,
+                    data_vencimento=vencimento,
+                    status=status,
+                    data_pagamento=pagamento,
+                    metodo_pagamento=g.rnd.choices(("PIX", "CARTAO", "PIX/CARTAO"), (6, 3, 1))[0] if pagamento else None,
+                    mercadopago_id=str(g.rnd.randint(10**10, 10**11)) if pagamento else None,
+                )
+            )
+    return faturas
+
+
+def _agenda(g: _Gerador, pacientes: list[int], dias_agenda: int) -> list:
+    from core_gestao.models import Agenda
+    from core_gestao.procedimentos_catalogo import CATALOGO_PROCEDIMENTOS
+
+    consultas = [p for p in CATALOGO_PROCEDIMENTOS if p["tipo"] == "CONSULTA"]
+    exames = [p for p in CATALOGO_PROCEDIMENTOS if p["tipo"] != "CONSULTA"]
+    agenda = []
+    for paciente_id in pacientes:
+        for _ in range(g.rnd.choices((0, 1, 2), (3, 5, 2))[0]):
+            proc = g.rnd.choice(consultas if g.rnd.random() < PROPORCAO_CONSULTAS else exames)
+            dia = g.hoje + timedelta(days=g.rnd.randint(-dias_agenda, dias_agenda))
+            if dia < g.hoje:
+                status = g.rnd.choices(("FINALIZADO", "CANCELADO"), (9, 1))[0]
+            elif dia == g.hoje:
+                status = g.rnd.choice(("AGENDADO", "CHEGOU", "FINALIZADO"))
+            else:
+                status = "AGENDADO"
+            valor = Decimal(g.rnd.randrange(8000, 35000, 500)) / 100
+            agenda.append(
+                Agenda(
+                    paciente_id=paciente_id,
+                    data=dia,
+                    hora=g.hora(),
+                    tipo=proc["tipo"],
+                    status=status,
+                    procedimento_id=proc["id"],
+                    recurso=proc["recurso"],
+                    duracao_min=proc["duracao_min"],
+                    observacoes=(
+                        f"Procedimento: {proc['nome']} [{proc['id']}] | Cobertura: sem cobertura (particular) | "
+                        f"Ref: N/A | V.Tabela: {valor} | V.Final: {valor}"
+                    ),
+                )
+            )
+            agenda[-1]._procedimento = proc
+            agenda[-1]._valor = valor
+    return agenda
+
+
+def _atendimentos(g: _Gerador, agenda: list, medico_id: int | None) -> tuple[list, list]:
+    from core_gestao.models import Exame, Prontuario
+
+    prontuarios, exames = [], []
+    for ag in agenda:
+        if ag.status != "FINALIZADO":
+            continue
+        if ag.tipo == "CONSULTA":
+            prontuarios.append(
+                Prontuario(
+                    paciente_id=ag.paciente_id,
+                    medico_id=medico_id,
+                    evolucao=g.rnd.choice(EVOLUCOES),
+                    prescricao="Dipirona 500 mg de 6/6 h se dor." if g.rnd.random() < 0.4 else None,
+                )
+            )
+        else:
+            exames.append(
+                Exame(
+                    paciente_id=ag.paciente_id,
+                    nome_exame=ag._procedimento["nome"],
+                    realizado=g.rnd.random() < 0.8,
+                    laudo="Exame dentro dos limites da normalidade." if g.rnd.random() < 0.7 else None,
+                    valor_tabela=ag._valor,
+                    valor_pago=ag._valor,
+                )
+            )
+    return prontuarios, exames
+
+
+def criar_equipe(senha: str) -> list[str]:
+    """Usuários master/recepcao/medico que faltarem (o cenário de carga faz login com eles)."""
+    from django.contrib.auth.models import Group, User
+
+    criados = []
+    for username in ("master", "recepcao", "medico"):
+        if User.objects.filter(username=username).exists():
+            continue
+        user = User.objects.create_user(username=username, password=senha)
+        if username == "medico":
+            user.groups.add(Group.objects.get_or_create(name="Medicos")[0])
+        criados.append(username)
+    return criados
+
+
+def popular(
+    pacientes: int,
+    semente: int = 7,
+    lote: int = LOTE,
+    hoje: date | None = None,
+    meses_faturas: int = MESES_FATURAS,
+    dias_agenda: int = DIAS_AGENDA,
+) -> dict:
+    """
+    Cria ``pacientes`` pacientes e o movimento ligado a eles; devolve as
+    contagens. Os benchmarks de índices e de exportação também populam por
+    aqui (com mais histórico, via ``meses_faturas``/``dias_agenda``).
+    """
+    from django.contrib.auth.models import User
+    from django.db import transaction
+    from django.utils import timezone
+
+    from core_gestao.cache_utils import CACHE_PACIENTES
+    from core_gestao.models import Agenda, Exame, Fatura, Prontuario
+    from core_gestao.receita_mensal import reconstruir_receita
+
+    g = _Gerador(semente, hoje or timezone.now().date())
+    planos = _planos()
+    medico_id = User.objects.filter(username="medico").values_list("id", flat=True).first()
+    proximo = _proximo_cpf()
+    contagem = dict.fromkeys(("pacientes", "titulares", "dependentes", "faturas", "agenda", "prontuarios", "exames"), 0)
+
+    restantes = pacientes
+    while restantes > 0:
+        titulares, dependentes, proximo = _familias(g, min(lote, restantes), proximo, planos)
+        with transaction.atomic():
+            ids = _gravar_pacientes(titulares)
+            for dep in dependentes:
+                dep.responsavel_id = ids[dep._cpf_responsavel]
+            ids.update(_gravar_pacientes(dependentes))
+            faturas = _faturas(g, titulares, ids, meses_faturas)
+            agenda = _agenda(g, list(ids.values()), dias_agenda)
+            prontuarios, exames = _atendimentos(g, agenda, medico_id)
+            for modelo, objs in ((Fatura, faturas), (Agenda, agenda), (Prontuario, prontuarios), (Exame, exames)):
+                for parte in _lotes(objs, lote):
+                    modelo.objects.bulk_create(parte)
+        restantes -= len(titulares) + len(dependentes)
+        contagem["titulares"] += len(titulares)
+        contagem["dependentes"] += len(dependentes)
+        contagem["faturas"] += len(faturas)
+        contagem["agenda"] += len(agenda)
+        contagem["prontuarios"] += len(prontuarios)
+        contagem["exames"] += len(exames)
+
+    contagem["pacientes"] = contagem["titulares"] + contagem["dependentes"]
+    reconstruir_receita()
+    CACHE_PACIENTES.invalidar()
+    return contagem
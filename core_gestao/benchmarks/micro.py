@@ -0,0 +1,239 @@
+"""
+Micro-benchmarks das funções chamadas a cada atendimento da recepção.
+
+Cada caso roda uma lista fixa de entradas (planos, procedimentos, tokens) sobre
+objetos em memória, sem banco nem rede. Como no pytest-benchmark, o número de
+iterações por rodada é calibrado para durar ao menos ``tempo_minimo`` e o
+tempo por operação de cada rodada vira uma amostra; o mínimo das rodadas é o
+valor comparado com a baseline (menos sensível a ruído que a média).
+
+As baselines ficam em JSON por máquina (``--maquina``, padrão o hostname), já
+que tempos de máquinas diferentes não se comparam. ``manage.py bench --salvar``
+grava; sem ``--salvar`` compara e falha se algum caso passar de ``--limite``
+mesmo depois de medido outra vez.
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+BASELINE_PADRAO = Path(__file__).with_name("baseline_micro.json")
+LIMITE_PADRAO = 0.25  # +25% no mínimo por operação conta como regressão
+RODADAS = 15
+TEMPO_MINIMO = 0.02  # segundos por rodada
+
+
+class Caso:
+    __slots__ = ("nome", "funcao", "entradas")
+
+    def __init__(self, nome: str, funcao, entradas: list[tuple]):
+        self.nome = nome
+        self.funcao = funcao
+        self.entradas = entradas
+
+    def rodar(self, iteracoes: int) -> float:
+        funcao, entradas = self.funcao, self.entradas
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            for args in entradas:
+                funcao(*args)
+        return time.perf_counter() - inicio
+
+
+def _pacientes() -> dict:
+    """Pacientes e planos não gravados: as funções só leem atributos."""
+    from django.utils import timezone
+
+    from core_gestao.models import Paciente, Plano
+
+    hoje = timezone.now().date()
+    planos = {nome: Plano(nome=nome, valor_anual=Decimal("59.90")) for nome in ("ESSENCIAL", "MASTER", "EMPRESARIAL")}
+
+    def paciente(pk, plano, dias):
+        return Paciente(
+            id=pk,
+            nome_completo=f"Paciente Bench {pk}",
+            cpf=f"{pk:011d}",
+            plano=planos.get(plano),
+            vencimento_plano=hoje + timedelta(days=dias) if dias is not None else None,
+            is_titular=pk % 2 == 0,
+        )
+
+    return {
+        "essencial": paciente(1, "ESSENCIAL", 120),
+        "master": paciente(2, "MASTER", 30),
+        "empresarial": paciente(3, "EMPRESARIAL", 300),
+        "vencido": paciente(4, "MASTER", -10),
+        "sem_validade": paciente(5, "ESSENCIAL", None),
+        "particular": paciente(6, None, None),
+    }
+
+
+def casos() -> list[Caso]:
+    from core_gestao import plano_utils
+    from core_gestao.benchmarks.cobertura import casos as casos_cobertura
+    from core_gestao.procedimentos_catalogo import CATALOGO_PROCEDIMENTOS, catalogo_por_grupos
+
+    pacientes = _pacientes()
+    com_plano = [pacientes[p] for p in ("essencial", "master", "empresarial")]
+    nomes = [p["nome"] for p in CATALOGO_PROCEDIMENTOS]
+    digitados = nomes + [n.upper() for n in nomes] + [f"  {n}  (retorno) " for n in nomes] + ["", None]
+    ids = [p["id"] for p in CATALOGO_PROCEDIMENTOS]
+    tokens = [plano_utils.gerar_carteirinha_token(p.id) for p in pacientes.values()]
+    valores = [
+        (Decimal("59.90"), 59.9),
+        (Decimal("718.80"), "718.80"),
+        ("44.90", 44.91),
+        (Decimal("69.90"), 70.5),
+        (None, 10),
+        ("abc", 1),
+    ]
+
+    return [
+        Caso("_normalizar_procedimento", plano_utils._normalizar_procedimento, [(n,) for n in digitados]),
+        Caso(
+            "_normalizar_procedimento.sem_cache",
+            plano_utils._normalizar_procedimento.__wrapped__,
+            [(n,) for n in digitados],
+        ),
+        Caso("procedimento_coberto_pelo_plano", plano_utils.procedimento_coberto_pelo_plano, casos_cobertura()),
+        Caso(
+            "avaliar_desconto_procedimento.catalogo",
+            lambda p, i: plano_utils.avaliar_desconto_procedimento(p, procedimento_id=i, ja_usou_mes=False),
+            [(p, i) for p in com_plano for i in ids],
+        ),
+        Caso(
+            "avaliar_desconto_procedimento.nome_livre",
+            lambda p, n: plano_utils.avaliar_desconto_procedimento(p, nome_procedimento=n, ja_usou_mes=True),
+            [(p, n) for p in com_plano for n in nomes],
+        ),
+        Caso(
+            "avaliar_desconto_procedimento.sem_plano",
+            lambda p, i: plano_utils.avaliar_desconto_procedimento(p, procedimento_id=i),
+            [(pacientes[p], i) for p in ("vencido", "particular") for i in ids],
+        ),
+        Caso("status_plano_carteirinha", plano_utils.status_plano_carteirinha, [(p,) for p in pacientes.values()]),
+        Caso("catalogo_por_grupos", catalogo_por_grupos, [()]),
+        Caso("gerar_carteirinha_token", plano_utils.gerar_carteirinha_token, [(p.id,) for p in pacientes.values()]),
+        Caso(
+            "ler_carteirinha_token",
+            plano_utils.ler_carteirinha_token,
+            [(t,) for t in tokens] + [(tokens[0][:-2] + "xx",), ("",)],
+        ),
+        Caso("valores_mp_coincidem", plano_utils.valores_mp_coincidem, valores),
+    ]
+
+
+def _calibrar(caso: Caso, tempo_minimo: float) -> int:
+    iteracoes = 1
+    while True:
+        if caso.rodar(iteracoes) >= tempo_minimo or iteracoes >= 1 << 24:
+            return iteracoes
+        iteracoes *= 2
+
+
+def medir(caso: Caso, rodadas: int = RODADAS, tempo_minimo: float = TEMPO_MINIMO) -> dict:
+    """ns por operação (uma chamada com uma entrada) em cada rodada, com o GC desligado."""
+    caso.rodar(1)  # aquece caches (lru_cache, regex compilada, imports)
+    iteracoes = _calibrar(caso, tempo_minimo)
+    operacoes = iteracoes * len(caso.entradas)
+    gc_ligado = gc.isenabled()
+    gc.disable()
+    try:
+        amostras = [caso.rodar(iteracoes) / operacoes * 1e9 for _ in range(rodadas)]
+    finally:
+        if gc_ligado:
+            gc.enable()
+    return {
+        "min_ns": round(min(amostras), 1),
+        "mediana_ns": round(statistics.median(amostras), 1),
+        "media_ns": round(statistics.fmean(amostras), 1),
+        "desvio_ns": round(statistics.stdev(amostras), 1) if len(amostras) > 1 else 0.0,
+        "rodadas": rodadas,
+        "operacoes_por_rodada": operacoes,
+    }
+
+
+def maquina_atual() -> str:
+    return platform.node() or "desconhecida"
+
+
+def executar(
+    filtro: str | None = None, rodadas: int = RODADAS, tempo_minimo: float = TEMPO_MINIMO, nomes=None
+) -> dict:
+    selecionados = [
+        c for c in casos() if (not filtro or filtro in c.nome) and (nomes is None or c.nome in nomes)
+    ]
+    return {
+        "python": platform.python_version(),
+        "processador": platform.processor() or platform.machine(),
+        "casos": {c.nome: medir(c, rodadas, tempo_minimo) for c in selecionados},
+    }
+
+
+def carregar_baseline(caminho: Path, maquina: str) -> dict | None:
+    try:
+        dados = json.loads(Path(caminho).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+    return dados.get("maquinas", {}).get(maquina)
+
+
+def salvar_baseline(resultado: dict, caminho: Path, maquina: str) -> None:
+    """Grava/atualiza a baseline desta máquina (as outras máquinas do arquivo ficam)."""
+    caminho = Path(caminho)
+    try:
+        dados = json.loads(caminho.read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        dados = {"maquinas": {}}
+    anterior = dados["maquinas"].get(maquina, {}).get("casos", {})
+    dados["maquinas"][maquina] = {
+        "salvo_em": datetime.now().isoformat(timespec="seconds"),
+        "python": resultado["python"],
+        "processador": resultado["processador"],
+        "casos": {**anterior, **{nome: {"min_ns": m["min_ns"]} for nome, m in resultado["casos"].items()}},
+    }
+    tmp = caminho.with_suffix(".tmp")
+    tmp.write_text(json.dumps(dados, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    os.replace(tmp, caminho)
+
+
+def comparar(resultado: dict, baseline: dict | None, limite: float = LIMITE_PADRAO) -> dict:
+    """Variação do mínimo de cada caso contra a baseline; ``regressoes`` acima de ``limite``."""
+    base = (baseline or {}).get("casos", {})
+    variacoes = {}
+    for nome, m in resultado["casos"].items():
+        if nome in base and base[nome]["min_ns"]:
+            variacoes[nome] = round(m["min_ns"] / base[nome]["min_ns"] - 1, 3)
+    return {
+        "variacoes": variacoes,
+        "sem_baseline": sorted(set(resultado["casos"]) - set(variacoes)),
+        "regressoes": sorted(nome for nome, v in variacoes.items() if v > limite),
+    }
+
+
+def reconfirmar(resultado: dict, nomes, rodadas: int = RODADAS, tempo_minimo: float = TEMPO_MINIMO) -> dict:
+    """Mede de novo os casos suspeitos e fica com a melhor medição (ruído não vira regressão)."""
+    novo = executar(rodadas=rodadas, tempo_minimo=tempo_minimo, nomes=set(nomes))
+    for nome, m in novo["casos"].items():
+        if m["min_ns"] < resultado["casos"][nome]["min_ns"]:
+            resultado["casos"][nome] = m
+    return resultado
+
+
+def imprimir(resultado: dict, comparacao: dict | None = None, saida=print) -> None:
+    saida(f"Python {resultado['python']} — {resultado['processador']}")
+    saida(f"  {'caso':<42} {'min':>10} {'mediana':>10} {'desvio':>9}  (ns/op)  vs baseline")
+    variacoes = (comparacao or {}).get("variacoes", {})
+    regressoes = set((comparacao or {}).get("regressoes", ()))
+    for nome, m in resultado["casos"].items():
+        if nome in variacoes:
+            delta = f"{variacoes[nome]:+.1%}" + ("  REGRESSÃO" if nome in regressoes else "")
+        else:
+            delta = "-"
+        saida(f"  {nome:<42} {m['min_ns']:>10} {m['mediana_ns']:>10} {m['desvio_ns']:>9}  {delta}")
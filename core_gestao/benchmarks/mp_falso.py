@@ -0,0 +1,288 @@
+"""
+Mercado Pago local para testes de carga (nada sai para a API real).
+
+Atende o que o sistema chama pelo SDK: preferências, pagamentos (criar,
+consultar, buscar por ``external_reference``) e ``/users/me``. Pagamentos com
+cartão saem aprovados (``first_name`` do pagador ``OTHE`` recusa e ``CONT``
+deixa pendente, como no sandbox); PIX fica pendente até ``aprovar``. Com
+``webhook_url`` cada mudança de status é notificada ao sistema com
+``x-signature`` válida para ``webhook_secret``. Aponte o sistema para cá com
+``MERCADO_PAGO_API_BASE_URL``.
+
+    python -m core_gestao.benchmarks.mp_falso --porta 8765 --latencia-ms 150 \\
+        --webhook-url http://127.0.0.1:8000/sistema/api/v1/mp/webhook/ --webhook-secret segredo
+"""
+import argparse
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+
+COLETOR_ID = 123456789
+COLETOR_EMAIL = "coletor@testuser.com"
+_RE_PAGAMENTO = re.compile(r"^/v1/payments/(\d+)$")
+
+
+def assinar_webhook(payment_id, secret: str, request_id: str | None = None, ts: int | None = None) -> dict:
+    """Cabeçalhos ``x-signature``/``x-request-id`` como o MP envia (manifesto id;request-id;ts)."""
+    request_id = request_id or str(uuid.uuid4())
+    ts = str(ts if ts is not None else int(time.time() * 1000))
+    manifesto = f"id:{payment_id};request-id:{request_id};ts:{ts};"
+    v1 = hmac.new(secret.encode("utf-8"), manifesto.encode("utf-8"), hashlib.sha256).hexdigest()
+    return {"x-signature": f"ts={ts},v1={v1}", "x-request-id": request_id}
+
+
+def _agora() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ServidorMPFalso"
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status: int, corpo: dict) -> None:
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _corpo(self) -> dict:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        if not tamanho:
+            return {}
+        try:
+            return json.loads(self.rfile.read(tamanho) or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _rota(self, metodo: str):
+        url = urlsplit(self.path)
+        self.server.contar(f"{metodo} {_RE_PAGAMENTO.sub('/v1/payments/{id}', url.path)}")
+        self.server.esperar()
+        return url.path, parse_qs(url.query)
+
+    def do_GET(self):
+        caminho, query = self._rota("GET")
+        if caminho == "/users/me":
+            return self._responder(200, {"id": COLETOR_ID, "email": COLETOR_EMAIL, "site_id": "MLB"})
+        if caminho == "/v1/payments/search":
+            referencia = (query.get("external_reference") or [""])[0]
+            resultados = self.server.buscar_pagamentos(referencia)
+            return self._responder(200, {"paging": {"total": len(resultados)}, "results": resultados})
+        casou = _RE_PAGAMENTO.match(caminho)
+        if casou:
+            pagamento = self.server.pagamento(int(casou.group(1)))
+            if pagamento is None:
+                return self._responder(404, {"message": "Payment not found", "status": 404})
+            return self._responder(200, pagamento)
+        return self._responder(404, {"message": "not_found", "status": 404})
+
+    def do_POST(self):
+        caminho, _ = self._rota("POST")
+        corpo = self._corpo()
+        if caminho == "/checkout/preferences":
+            return self._responder(201, self.server.criar_preferencia(corpo))
+        if caminho == "/v1/payments":
+            if not corpo.get("transaction_amount"):
+                return self._responder(400, {"message": "transaction_amount is required", "status": 400})
+            return self._responder(201, self.server.criar_pagamento(corpo))
+        return self._responder(404, {"message": "not_found", "status": 404})
+
+
+class ServidorMPFalso(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, porta: int = 0, latencia_ms: float = 0, webhook_url: str = "",
+                 webhook_secret: str = "", host: str = "127.0.0.1"):
+        super().__init__((host, porta), _Handler)
+        self.latencia_ms = latencia_ms
+        self.webhook_url = webhook_url
+        self.webhook_secret = webhook_secret
+        self._lock = threading.Lock()
+        self._ids = itertools.count(int(time.time()) * 1000)
+        self._pagamentos = {}
+        self._preferencias = {}
+        self._contagem = {}
+        self._webhooks = {"enviados": 0, "falhas": 0}
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def iniciar(self) -> "ServidorMPFalso":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def esperar(self) -> None:
+        if self.latencia_ms:
+            # Latência com cauda: ~10% das chamadas levam 3x mais
+            fator = 3 if random.random() < 0.1 else 1
+            time.sleep(self.latencia_ms * fator / 1000)
+
+    def contar(self, rota: str) -> None:
+        with self._lock:
+            self._contagem[rota] = self._contagem.get(rota, 0) + 1
+
+    def estatisticas(self) -> dict:
+        with self._lock:
+            return {
+                "rotas": dict(self._contagem),
+                "pagamentos": len(self._pagamentos),
+                "preferencias": len(self._preferencias),
+                "webhooks": dict(self._webhooks),
+            }
+
+    # -----------------------------------------------------------------
+    # Estado
+    # -----------------------------------------------------------------
+
+    def criar_preferencia(self, dados: dict) -> dict:
+        pref_id = f"{COLETOR_ID}-{uuid.uuid4()}"
+        preferencia = {
+            "id": pref_id,
+            "collector_id": COLETOR_ID,
+            "items": dados.get("items") or [],
+            "external_reference": dados.get("external_reference") or "",
+            "date_created": _agora(),
+            "init_point": f"{self.url}/checkout/v1/redirect?pref_id={pref_id}",
+            "sandbox_init_point": f"{self.url}/checkout/v1/redirect?pref_id={pref_id}",
+        }
+        with self._lock:
+            self._preferencias[pref_id] = preferencia
+        return preferencia
+
+    def criar_pagamento(self, dados: dict) -> dict:
+        metodo = dados.get("payment_method_id") or "visa"
+        payer = dados.get("payer") or {}
+        if metodo == "pix":
+            status, detalhe = "pending", "pending_waiting_transfer"
+        elif payer.get("first_name") == "OTHE":
+            status, detalhe = "rejected", "cc_rejected_other_reason"
+        elif payer.get("first_name") == "CONT":
+            status, detalhe = "in_process", "pending_contingency"
+        else:
+            status, detalhe = "approved", "accredited"
+        payment_id = next(self._ids)
+        pagamento = {
+            "id": payment_id,
+            "status": status,
+            "status_detail": detalhe,
+            "transaction_amount": float(dados.get("transaction_amount") or 0),
+            "external_reference": str(dados.get("external_reference") or ""),
+            "description": dados.get("description") or "",
+            "payment_method_id": metodo,
+            "installments": dados.get("installments") or 1,
+            "payer": {"email": payer.get("email") or "", "identification": payer.get("identification") or {}},
+            "collector_id": COLETOR_ID,
+            "date_created": _agora(),
+            "date_approved": _agora() if status == "approved" else None,
+        }
+        if metodo == "pix":
+            pagamento["point_of_interaction"] = {
+                "transaction_data": {
+                    "qr_code": f"00020126BR.GOV.BCB.PIX{payment_id}",
+                    "qr_code_base64": "iVBORw0KGgo=",
+                    "ticket_url": f"{self.url}/pix/{payment_id}",
+                }
+            }
+        with self._lock:
+            self._pagamentos[payment_id] = pagamento
+        self.notificar(payment_id)
+        return pagamento
+
+    def pagamento(self, payment_id: int) -> dict | None:
+        with self._lock:
+            return self._pagamentos.get(payment_id)
+
+    def buscar_pagamentos(self, external_reference: str) -> list:
+        with self._lock:
+            return [
+                p for p in self._pagamentos.values()
+                if not external_reference or p["external_reference"] == external_reference
+            ]
+
+    def aprovar(self, payment_id: int) -> dict:
+        """Simula o PIX pago: aprova e notifica o webhook."""
+        with self._lock:
+            pagamento = self._pagamentos[payment_id]
+            pagamento.update(status="approved", status_detail="accredited", date_approved=_agora())
+        self.notificar(payment_id)
+        return pagamento
+
+    # -----------------------------------------------------------------
+    # Webhooks
+    # -----------------------------------------------------------------
+
+    def notificar(self, payment_id, assincrono: bool = True) -> None:
+        """POST assinado no ``webhook_url`` (em thread, como o MP: não segura a resposta da API)."""
+        if not self.webhook_url:
+            return
+        if assincrono:
+            threading.Thread(target=self.notificar, args=(payment_id, False), daemon=True).start()
+            return
+        corpo = {
+            "id": int(time.time() * 1000),
+            "type": "payment",
+            "action": "payment.updated",
+            "live_mode": False,
+            "date_created": _agora(),
+            "user_id": str(COLETOR_ID),
+            "data": {"id": str(payment_id)},
+        }
+        cabecalhos = {"Content-Type": "application/json"}
+        if self.webhook_secret:
+            cabecalhos.update(assinar_webhook(payment_id, self.webhook_secret))
+        try:
+            resposta = requests.post(self.webhook_url, data=json.dumps(corpo), headers=cabecalhos, timeout=10)
+            ok = resposta.status_code < 400
+        except requests.RequestException:
+            ok = False
+        with self._lock:
+            self._webhooks["enviados" if ok else "falhas"] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--latencia-ms", type=float, default=0)
+    parser.add_argument("--webhook-url", default="")
+    parser.add_argument("--webhook-secret", default="")
+    args = parser.parse_args()
+    servidor = ServidorMPFalso(args.porta, args.latencia_ms, args.webhook_url, args.webhook_secret, args.host)
+    print(f"Mercado Pago falso em {servidor.url} (MERCADO_PAGO_API_BASE_URL={servidor.url})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        print(json.dumps(servidor.estatisticas(), indent=2))
@@ -0,0 +1,178 @@
+"""
+Busca de pacientes por nome ou CPF sem varrer a tabela.
+
+Cada paciente guarda ``nome_busca`` (nome sem acento, minúsculo, pontuação
+removida) e ``cpf_busca`` (só dígitos), ambos indexados, mais uma linha em
+PacienteBuscaToken por palavra do nome. Prefixo vira faixa (``>= 'mar'`` e
+``< 'mas'``), resolvida pelo índice em qualquer banco, sem depender de como o
+``LIKE`` trata collation.
+"""
+import re
+import unicodedata
+
+from django.db.models import Q
+
+from .models import Paciente, PacienteBuscaToken
+from .plano_utils import normalizar_cpf
+
+TOKEN_MAX = 64
+MIN_DIGITOS_CPF = 3
+# Autocomplete por palavra do meio do nome: lotes do índice de tokens
+LOTE_PALAVRAS = 200
+MAX_LOTES_PALAVRAS = 10
+
+
+def normalizar_texto_busca(texto: str | None) -> str:
+    """'João  D'Ávila-Souza' -> 'joao d avila souza'."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return re.sub(r"[^a-z0-9]+", " ", texto).strip()
+
+
+def tokens_nome(nome: str | None) -> list[str]:
+    return list(dict.fromkeys(t[:TOKEN_MAX] for t in normalizar_texto_busca(nome).split()))
+
+
+def campos_busca(paciente) -> dict:
+    return {
+        "nome_busca": normalizar_texto_busca(paciente.nome_completo)[:255],
+        "cpf_busca": normalizar_cpf(paciente.cpf)[:14],
+    }
+
+
+def indexar_tokens(paciente) -> None:
+    """Regrava as palavras do nome do paciente (chamado por Paciente.save)."""
+    PacienteBuscaToken.objects.filter(paciente=paciente).delete()
+    PacienteBuscaToken.objects.bulk_create(
+        [PacienteBuscaToken(paciente=paciente, token=t) for t in tokens_nome(paciente.nome_completo)]
+    )
+
+
+def reindexar_pacientes(lote: int = 1000) -> int:
+    """Recalcula campos e tokens de todos os pacientes (após importação/restauração)."""
+    total = 0
+    ultimo_id = 0
+    while True:
+        pacientes = list(
+            Paciente.objects.filter(id__gt=ultimo_id)
+            .order_by("id")
+            .only("id", "nome_completo", "cpf")[:lote]
+        )
+        if not pacientes:
+            return total
+        for p in pacientes:
+            for campo, valor in campos_busca(p).items():
+                setattr(p, campo, valor)
+        Paciente.objects.bulk_update(pacientes, ["nome_busca", "cpf_busca"])
+        ids = [p.id for p in pacientes]
+        PacienteBuscaToken.objects.filter(paciente_id__in=ids).delete()
+        PacienteBuscaToken.objects.bulk_create(
+            [
+                PacienteBuscaToken(paciente_id=p.id, token=t)
+                for p in pacientes
+                for t in tokens_nome(p.nome_completo)
+            ]
+        )
+        total += len(pacientes)
+        ultimo_id = ids[-1]
+
+
+def _prefixo(campo: str, prefixo: str) -> dict:
+    """Filtro de faixa equivalente a ``campo LIKE 'prefixo%'`` (texto já normalizado)."""
+    return {f"{campo}__gte": prefixo, f"{campo}__lt": prefixo[:-1] + chr(ord(prefixo[-1]) + 1)}
+
+
+def _consulta_cpf(q: str) -> str | None:
+    """Dígitos do CPF quando o termo é só número/pontuação ('123.456' -> '123456')."""
+    if re.search(r"[A-Za-zÀ-ÿ]", q or ""):
+        return None
+    digitos = normalizar_cpf(q)
+    return digitos if len(digitos) >= MIN_DIGITOS_CPF else None
+
+
+def filtrar_pacientes(queryset, q: str):
+    """
+    Restringe ``queryset`` ao termo: CPF por prefixo de dígitos ou, para nomes,
+    cada palavra digitada casando o início de alguma palavra do nome.
+    """
+    digitos = _consulta_cpf(q)
+    if digitos:
+        return queryset.filter(**_prefixo("cpf_busca", digitos))
+    termos = normalizar_texto_busca(q).split()
+    if not termos:
+        return queryset.none()
+    for termo in termos:
+        queryset = _com_token(queryset, termo)
+    return queryset
+
+
+def _com_token(queryset, termo: str):
+    return queryset.filter(
+        id__in=PacienteBuscaToken.objects.filter(**_prefixo("token", termo[:TOKEN_MAX])).values(
+            "paciente_id"
+        )
+    )
+
+
+def _por_palavras(queryset, termos, limite, excluir):
+    """
+    Percorre o índice (token, paciente) do termo mais longo em lotes, na ordem
+    do índice, e confere os demais termos só nos ids do lote: o custo não cresce
+    com a quantidade de pacientes que casam ("silva").
+    """
+    termos = sorted(termos, key=len, reverse=True)
+    principal, outros = termos[0][:TOKEN_MAX], termos[1:]
+    tokens = PacienteBuscaToken.objects.filter(**_prefixo("token", principal))
+    achados, vistos = [], set(excluir)
+    ultimo = None
+    for _ in range(MAX_LOTES_PALAVRAS):
+        pagina = tokens
+        if ultimo:
+            pagina = pagina.filter(
+                Q(token__gt=ultimo[0]) | Q(token=ultimo[0], paciente_id__gt=ultimo[1])
+            )
+        linhas = list(
+            pagina.order_by("token", "paciente_id").values_list("token", "paciente_id")[
+                :LOTE_PALAVRAS
+            ]
+        )
+        if not linhas:
+            break
+        ids = [pid for _, pid in linhas if pid not in vistos]
+        candidatos = queryset.filter(id__in=ids)
+        for termo in outros:
+            candidatos = _com_token(candidatos, termo)
+        por_id = {p.id: p for p in candidatos}
+        for _, pid in linhas:
+            if pid in por_id and pid not in vistos:
+                vistos.add(pid)
+                achados.append(por_id[pid])
+        if len(achados) >= limite or len(linhas) < LOTE_PALAVRAS:
+            break
+        ultimo = linhas[-1]
+    return achados[:limite]
+
+
+def buscar_pacientes(q: str, limite: int = 10, queryset=None) -> list:
+    """
+    Autocomplete ranqueado: primeiro quem tem o nome começando pelo termo
+    (faixa do índice de ``nome_busca``, já ordenada), depois quem casa por
+    palavras do meio do nome.
+    """
+    queryset = Paciente.objects.all() if queryset is None else queryset
+    digitos = _consulta_cpf(q)
+    if digitos:
+        return list(
+            queryset.filter(**_prefixo("cpf_busca", digitos)).order_by("cpf_busca", "id")[:limite]
+        )
+    frase = normalizar_texto_busca(q)
+    if not frase:
+        return []
+    resultado = list(
+        queryset.filter(**_prefixo("nome_busca", frase)).order_by("nome_busca", "id")[:limite]
+    )
+    if len(resultado) < limite:
+        resultado += _por_palavras(
+            queryset, frase.split(), limite - len(resultado), {p.id for p in resultado}
+        )
+    return resultado
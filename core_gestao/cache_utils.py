@@ -0,0 +1,161 @@
+"""
+Camada de cache por namespace sobre ``django.core.cache``.
+
+Cada namespace ("pacientes", "tv", ...) tem uma versão guardada no próprio
+cache; a versão entra em todas as chaves, então ``invalidar()`` descarta o
+namespace inteiro em qualquer worker com uma única escrita (as chaves antigas
+expiram sozinhas). Contadores (acertos/faltas, conexões do banco) são somados
+por processo e enviados de tempos em tempos à tabela ContadorEstatistica, para
+o diagnóstico enxergar a implantação toda: o envio é um ``UPDATE`` atômico
+(``F("valor") + n``), então processos concorrentes não perdem parcelas e nada
+é descartado por limite de entradas do cache.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import ContadorEstatistica
+
+# Intervalo mínimo entre envios dos contadores locais ao banco
+STATS_FLUSH_SEGUNDOS = 10
+
+_VERSAO_KEY = "ns:{}:versao"
+
+_lock = threading.Lock()
+_pendentes: dict[tuple[str, str], int] = {}
+_ultimo_flush = 0.0
+
+
+def _somar(grupo: str, evento: str, valor: int) -> None:
+    filtro = ContadorEstatistica.objects.filter(grupo=grupo, evento=evento)
+    if filtro.update(valor=F("valor") + valor):
+        return
+    try:
+        with transaction.atomic():
+            ContadorEstatistica.objects.create(grupo=grupo, evento=evento, valor=valor)
+    except IntegrityError:
+        # Outro processo criou o contador no meio tempo
+        filtro.update(valor=F("valor") + valor)
+
+
+def contar(grupo: str, evento: str, n: int = 1) -> None:
+    """Soma ``n`` ao contador (grupo, evento) deste processo; envia de tempos em tempos."""
+    global _ultimo_flush
+    with _lock:
+        _pendentes[(grupo, evento)] = _pendentes.get((grupo, evento), 0) + n
+        # Dentro de uma transação o envio esperaria o commit (e travaria as
+        # linhas dos contadores até lá): fica para a próxima contagem
+        if time.monotonic() - _ultimo_flush < STATS_FLUSH_SEGUNDOS or connection.in_atomic_block:
+            return
+        lote = dict(_pendentes)
+        _pendentes.clear()
+        _ultimo_flush = time.monotonic()
+    try:
+        enviar_estatisticas(lote)
+    except DatabaseError:
+        # Banco fora ou tabela ainda não criada (durante o migrate): tenta depois
+        with _lock:
+            for chave, n in lote.items():
+                _pendentes[chave] = _pendentes.get(chave, 0) + n
+
+
+def enviar_estatisticas(lote: dict | None = None) -> None:
+    """Soma os contadores locais no banco (chamado sozinho a cada poucos segundos)."""
+    if lote is None:
+        with _lock:
+            lote = dict(_pendentes)
+            _pendentes.clear()
+    if not lote:
+        return
+    # Ordem fixa: dois processos enviando juntos travam as linhas na mesma ordem
+    with transaction.atomic():
+        for (grupo, evento), total in sorted(lote.items()):
+            _somar(grupo, evento, total)
+
+
+def contadores(grupo: str) -> dict:
+    """Totais do grupo somando todos os processos (até o último envio de cada um)."""
+    return dict(ContadorEstatistica.objects.filter(grupo=grupo).values_list("evento", "valor"))
+
+
+class CacheNamespace:
+    """Chaves de um namespace versionado; mesma interface básica do cache."""
+
+    def __init__(self, nome: str, timeout: int | None = 300):
+        self.nome = nome
+        self.timeout = timeout
+
+    def versao(self) -> int:
+        versao = cache.get(_VERSAO_KEY.format(self.nome))
+        if versao is None:
+            cache.add(_VERSAO_KEY.format(self.nome), 1, None)
+            versao = cache.get(_VERSAO_KEY.format(self.nome)) or 1
+        return versao
+
+    def chave(self, nome: str) -> str:
+        return f"{self.nome}:v{self.versao()}:{nome}"
+
+    def get(self, nome: str, default=None):
+        valor = cache.get(self.chave(nome))
+        contar(f"cache.{self.nome}", "miss" if valor is None else "hit")
+        return default if valor is None else valor
+
+    def set(self, nome: str, valor, timeout="padrao") -> None:
+        cache.set(self.chave(nome), valor, self.timeout if timeout == "padrao" else timeout)
+
+    def delete(self, nome: str) -> None:
+        cache.delete(self.chave(nome))
+
+    def get_or_set(self, nome: str, calcular, timeout="padrao"):
+        """Valor em cache ou ``calcular()`` gravado (None não é guardado)."""
+        valor = self.get(nome)
+        if valor is None:
+            valor = calcular()
+            if valor is not None:
+                self.set(nome, valor, timeout)
+        return valor
+
+    def invalidar(self) -> int:
+        """Nova versão: todas as chaves do namespace deixam de valer."""
+        chave = _VERSAO_KEY.format(self.nome)
+        self.versao()
+        try:
+            return cache.incr(chave)
+        except ValueError:
+            cache.set(chave, 2, None)
+            return 2
+
+
+def estatisticas_cache() -> dict:
+    """Acertos/faltas por namespace somando todos os processos."""
+    enviar_estatisticas()
+    namespaces = {}
+    grupos = ContadorEstatistica.objects.filter(grupo__startswith="cache.").values_list("grupo", flat=True)
+    for grupo in grupos.order_by("grupo").distinct():
+        nome = grupo.split(".", 1)[1]
+        totais = contadores(grupo)
+        hits, misses = totais.get("hit", 0), totais.get("miss", 0)
+        namespaces[nome] = {
+            "hits": hits,
+            "misses": misses,
+            "taxa_acerto": round(hits / (hits + misses), 3) if hits + misses else None,
+            "versao": cache.get(_VERSAO_KEY.format(nome)),
+        }
+    return {
+        "backend": settings.CACHES["default"]["BACKEND"].rsplit(".", 1)[-1],
+        "namespaces": namespaces,
+    }
+
+
+def zerar_estatisticas() -> None:
+    with _lock:
+        _pendentes.clear()
+    ContadorEstatistica.objects.all().delete()
+
+
+# Namespaces usados pelo sistema
+CACHE_PACIENTES = CacheNamespace("pacientes", timeout=300)
@@ -0,0 +1,44 @@
+"""
+Conexões persistentes com o MariaDB: contadores para medir o reaproveitamento.
+
+Com ``CONN_MAX_AGE`` > 0 cada worker mantém a conexão entre requests (conferida
+por ``CONN_HEALTH_CHECKS`` antes do reuso); o diagnóstico compara requests
+atendidos com conexões abertas.
+"""
+from django.core.signals import request_started
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .cache_utils import contadores, contar, enviar_estatisticas
+
+GRUPO = "db"
+
+
+def _conexao_aberta(sender, connection, **kwargs):
+    contar(GRUPO, "conexoes_abertas")
+
+
+def _request_iniciado(sender, **kwargs):
+    contar(GRUPO, "requests")
+
+
+def conectar_sinais() -> None:
+    connection_created.connect(_conexao_aberta, dispatch_uid="ultramed_conexao_aberta")
+    request_started.connect(_request_iniciado, dispatch_uid="ultramed_request_iniciado")
+
+
+def estatisticas_conexoes() -> dict:
+    enviar_estatisticas()
+    totais = contadores(GRUPO)
+    requests = totais.get("requests", 0)
+    abertas = totais.get("conexoes_abertas", 0)
+    reaproveitadas = max(0, requests - abertas)
+    db = connections["default"].settings_dict
+    return {
+        "conn_max_age": db.get("CONN_MAX_AGE"),
+        "conn_health_checks": db.get("CONN_HEALTH_CHECKS"),
+        "requests": requests,
+        "conexoes_abertas": abertas,
+        "conexoes_evitadas": reaproveitadas,
+        "taxa_reuso": round(reaproveitadas / requests, 3) if requests else None,
+    }
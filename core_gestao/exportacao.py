@@ -0,0 +1,327 @@
+"""
+Exportação em streaming (CSV e XLSX) de pacientes, faturas e agenda.
+
+As linhas são lidas em lotes por cursor (keyset: ``id > último``), não com
+``.iterator()``: o driver MySQL carrega o resultado inteiro do cursor na
+memória, então só lotes curtos garantem memória constante. Cada formato
+consome o gerador de linhas e devolve pedaços de bytes para um
+``StreamingHttpResponse``; o XLSX é um zip escrito em fluxo (SpreadsheetML
+mínimo com strings inline, sem dependência externa).
+"""
+import csv
+import re
+import zipfile
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from .models import Fatura, Paciente, Plano
+
+LOTE_EXPORTACAO = 2000
+# Pedaço mínimo enviado ao cliente (menos chamadas de write no gunicorn/nginx)
+PEDACO_BYTES = 64 * 1024
+XLSX_MAX_LINHAS = 1_048_576
+FORMATOS = ("csv", "xlsx")
+
+_CONTROLE_XML = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+# --- Linhas ---------------------------------------------------------------
+
+def _lotes(queryset, campos, ordem=("id",), lote=None):
+    """
+    Tuplas de ``values_list(*campos)`` em lotes pela ordem (única) dada, sem
+    OFFSET. Tuplas em vez de instâncias: montar o modelo (e os relacionados)
+    custava mais que a consulta.
+    """
+    lote = lote or LOTE_EXPORTACAO
+    posicoes = [campos.index(campo) for campo in ordem]
+    ultimo = None
+    while True:
+        pagina = queryset
+        if ultimo is not None:
+            # (a, b, c) > (x, y, z) expandido em OR para qualquer banco; o
+            # "a >= x" na frente vira faixa do índice (a, b, ...) e o banco
+            # lê o lote já na ordem, sem reordenar o restante a cada página
+            condicao = Q()
+            for i, campo in enumerate(ordem):
+                parcial = Q(**{f"{campo}__gt": ultimo[i]})
+                for anterior, valor in zip(ordem[:i], ultimo):
+                    parcial &= Q(**{anterior: valor})
+                condicao |= parcial
+            pagina = pagina.filter(Q(**{f"{ordem[0]}__gte": ultimo[0]}) & condicao)
+        itens = list(pagina.order_by(*ordem).values_list(*campos)[:lote])
+        if not itens:
+            return
+        yield itens
+        if len(itens) < lote:
+            return
+        ultimo = tuple(itens[-1][p] for p in posicoes)
+
+
+_PLANOS = dict(Plano.NOME_CHOICES)
+
+CABECALHO_PACIENTES = [
+    "Tipo", "CPF titular", "Nome", "CPF", "Telefone", "Nascimento", "Sexo", "Plano",
+    "Vencimento plano", "Crônico", "Doenças crônicas", "Cidade", "Cadastro",
+]
+_CAMPOS_PACIENTE = [
+    "id", "responsavel_id", "nome_completo", "cpf", "telefone", "data_nascimento", "sexo",
+    "plano__nome", "vencimento_plano", "is_cronico", "doencas_cronicas", "cidade", "data_cadastro",
+]
+
+
+def _linha_paciente(p, cpf_titular):
+    (_, responsavel_id, nome, cpf, telefone, nascimento, sexo, plano, vencimento, cronico,
+     doencas, cidade, cadastro) = p
+    return [
+        "Titular" if responsavel_id is None else "Dependente",
+        cpf_titular,
+        nome,
+        cpf,
+        telefone,
+        nascimento,
+        sexo,
+        _PLANOS.get(plano, plano or ""),
+        vencimento,
+        cronico,
+        doencas or "",
+        cidade or "",
+        timezone.localtime(cadastro) if cadastro else None,
+    ]
+
+
+def linhas_pacientes(titulares):
+    """Cada titular do filtro seguido dos seus dependentes (uma consulta por lote)."""
+    yield CABECALHO_PACIENTES
+    for lote in _lotes(titulares, _CAMPOS_PACIENTE):
+        dependentes = {}
+        for d in (
+            Paciente.objects.filter(responsavel_id__in=[t[0] for t in lote])
+            .order_by("responsavel_id", "id")
+            .values_list(*_CAMPOS_PACIENTE)
+        ):
+            dependentes.setdefault(d[1], []).append(d)
+        for t in lote:
+            yield _linha_paciente(t, t[3])
+            for d in dependentes.get(t[0], ()):
+                yield _linha_paciente(d, t[3])
+
+
+CABECALHO_FATURAS = [
+    "Fatura", "Paciente", "CPF", "Plano", "Valor", "Status", "Método", "Vencimento",
+    "Pagamento", "ID Mercado Pago",
+]
+_CAMPOS_FATURA = [
+    "id", "paciente__nome_completo", "paciente__cpf", "plano__nome", "valor", "status",
+    "metodo_pagamento", "data_vencimento", "data_pagamento", "mercadopago_id",
+]
+
+
+def faturas_do_periodo(inicio, fim, status: str | None = None) -> list:
+    """
+    Trechos (queryset, ordem) das faturas de [inicio, fim): pagas pela data de
+    pagamento, as demais pelo vencimento. Um trecho por status para cada um
+    ser lido em ordem pelo índice (status, data).
+    """
+    trechos = []
+    for codigo, _ in Fatura.STATUS_CHOICES:
+        if status and codigo != status:
+            continue
+        campo = "data_pagamento" if codigo == "PAGO" else "data_vencimento"
+        trechos.append(
+            (
+                Fatura.objects.filter(status=codigo, **{f"{campo}__gte": inicio, f"{campo}__lt": fim}),
+                (campo, "id"),
+            )
+        )
+    return trechos
+
+
+def linhas_faturas(trechos):
+    yield CABECALHO_FATURAS
+    for faturas, ordem in trechos:
+        for lote in _lotes(faturas, _CAMPOS_FATURA, ordem=ordem):
+            for id_, nome, cpf, plano, valor, status, metodo, vencimento, pagamento, mp_id in lote:
+                yield [
+                    id_, nome, cpf, _PLANOS.get(plano, plano or ""), valor, status, metodo or "",
+                    vencimento, pagamento, mp_id or "",
+                ]
+
+
+CABECALHO_AGENDA = ["Data", "Hora", "Paciente", "CPF", "Tipo", "Status", "Observações"]
+_CAMPOS_AGENDA = [
+    "data", "hora", "paciente__nome_completo", "paciente__cpf", "tipo", "status", "observacoes", "id",
+]
+
+
+def linhas_agenda(agendamentos):
+    """Agenda na ordem do dia (data, hora), paginada pelo mesmo trio."""
+    yield CABECALHO_AGENDA
+    for lote in _lotes(agendamentos, _CAMPOS_AGENDA, ordem=("data", "hora", "id")):
+        for *linha, observacoes, _ in lote:
+            yield [*linha, observacoes or ""]
+
+
+# --- Formatos -------------------------------------------------------------
+
+# Texto que a planilha leria como fórmula (nomes e observações vêm de formulários
+# públicos): recebe um ' na frente e abre como texto
+_INICIO_FORMULA = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _texto(valor) -> str:
+    if valor is None:
+        return ""
+    if isinstance(valor, bool):
+        return "Sim" if valor else "Não"
+    if isinstance(valor, datetime):
+        return valor.strftime("%Y-%m-%d %H:%M")
+    if isinstance(valor, dtime):
+        return valor.strftime("%H:%M")
+    if isinstance(valor, date):
+        return valor.isoformat()
+    if isinstance(valor, str) and valor.startswith(_INICIO_FORMULA):
+        return "'" + valor
+    return str(valor)
+
+
+class _Eco:
+    """Arquivo falso: ``csv.writer`` devolve a linha escrita em vez de guardar."""
+
+    def write(self, valor):
+        return valor
+
+
+def _agrupar(pedacos):
+    buffer, tamanho = [], 0
+    for pedaco in pedacos:
+        buffer.append(pedaco)
+        tamanho += len(pedaco)
+        if tamanho >= PEDACO_BYTES:
+            yield b"".join(buffer)
+            buffer, tamanho = [], 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def csv_stream(linhas):
+    """CSV com ``;`` e BOM UTF-8 (abre direto no Excel em pt-BR)."""
+    escritor = csv.writer(_Eco(), delimiter=";")
+
+    def pedacos():
+        yield "\ufeff".encode()
+        for linha in linhas:
+            yield escritor.writerow([_texto(v) for v in linha]).encode()
+
+    return _agrupar(pedacos())
+
+
+class _SaidaZip:
+    """Destino sem ``seek`` para o ZipFile: acumula e é esvaziado a cada pedaço."""
+
+    def __init__(self):
+        self._partes = []
+
+    def write(self, dados):
+        self._partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def drenar(self) -> bytes:
+        dados = b"".join(self._partes)
+        self._partes.clear()
+        return dados
+
+
+_XLSX_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+_PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+_XML_DECL = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+
+
+def _partes_fixas_xlsx(aba: str) -> dict:
+    return {
+        "[Content_Types].xml": (
+            _XML_DECL
+            + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-'
+            'officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-'
+            'officedocument.spreadsheetml.worksheet+xml"/>'
+            "</Types>"
+        ),
+        "_rels/.rels": (
+            _XML_DECL
+            + f'<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/officeDocument" Target="xl/workbook.xml"/>'
+            "</Relationships>"
+        ),
+        "xl/workbook.xml": (
+            _XML_DECL
+            + f'<workbook xmlns="{_XLSX_NS}" xmlns:r="{_REL_NS}"><sheets>'
+            f'<sheet name="{escape(aba[:31], {chr(34): "&quot;"})}" sheetId="1" r:id="rId1"/>'
+            "</sheets></workbook>"
+        ),
+        "xl/_rels/workbook.xml.rels": (
+            _XML_DECL
+            + f'<Relationships xmlns="{_PKG_REL_NS}">'
+            f'<Relationship Id="rId1" Type="{_REL_NS}/worksheet" Target="worksheets/sheet1.xml"/>'
+            "</Relationships>"
+        ),
+    }
+
+
+def _celula_xlsx(valor) -> str:
+    if isinstance(valor, (int, float, Decimal)) and not isinstance(valor, bool):
+        return f"<c><v>{valor}</v></c>"
+    texto = escape(_CONTROLE_XML.sub("", _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def xlsx_stream(linhas, aba: str = "Dados"):
+    """Planilha de uma aba escrita em fluxo (números como número, resto como texto)."""
+    saida = _SaidaZip()
+    with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for nome, conteudo in _partes_fixas_xlsx(aba).items():
+            zf.writestr(nome, conteudo)
+        yield saida.drenar()
+        with zf.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as folha:
+            folha.write((_XML_DECL + f'<worksheet xmlns="{_XLSX_NS}"><sheetData>').encode())
+            for numero, linha in enumerate(linhas, 1):
+                if numero > XLSX_MAX_LINHAS:
+                    break
+                folha.write(
+                    f'<row r="{numero}">{"".join(_celula_xlsx(v) for v in linha)}</row>'.encode()
+                )
+                if numero % 500 == 0:
+                    dados = saida.drenar()
+                    if dados:
+                        yield dados
+            folha.write(b"</sheetData></worksheet>")
+    yield saida.drenar()
+
+
+def resposta_exportacao(linhas, formato: str, nome: str) -> StreamingHttpResponse:
+    """``StreamingHttpResponse`` para download (``formato`` em FORMATOS)."""
+    arquivo = f"{nome}_{timezone.localdate():%Y%m%d}.{formato}"
+    if formato == "xlsx":
+        response = StreamingHttpResponse(
+            _agrupar(xlsx_stream(linhas, aba=nome)),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+    else:
+        response = StreamingHttpResponse(csv_stream(linhas), content_type="text/csv; charset=utf-8")
+    response["Content-Disposition"] = f'attachment; filename="{arquivo}"'
+    response["Cache-Control"] = "no-store"
+    # nginx repassa em fluxo em vez de gravar o arquivo inteiro em disco antes
+    response["X-Accel-Buffering"] = "no"
+    return response
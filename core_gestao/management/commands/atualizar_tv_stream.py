@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core_gestao.tv_stream import (
+    TV_STREAM_PRAZO_SEGUNDOS,
+    atualizacao_solicitada,
+    atualizar_video_id,
+)
+
+
+class Command(BaseCommand):
+    help = "Resolve o vídeo ao vivo da TV da recepção (Jovem Pan News) e grava no cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Fica em execução contínua (worker do docker-compose).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=120.0,
+            help="Segundos entre atualizações no modo --loop.",
+        )
+        parser.add_argument(
+            "--prazo",
+            type=float,
+            default=TV_STREAM_PRAZO_SEGUNDOS,
+            help="Tempo máximo total de cada resolução (todas as consultas ao YouTube).",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            inicio = time.monotonic()
+            video_id = atualizar_video_id(options["prazo"])
+            if video_id:
+                self.stdout.write(
+                    f"TV: vídeo ao vivo {video_id} ({time.monotonic() - inicio:.1f}s)."
+                )
+            else:
+                self.stdout.write("TV: YouTube sem resposta útil; mantido o vídeo anterior.")
+            if not options["loop"]:
+                break
+            # Acorda antes se a TV pediu refresh (?refresh=1)
+            limite = time.monotonic() + options["intervalo"]
+            while time.monotonic() < limite and not atualizacao_solicitada():
+                time.sleep(1)
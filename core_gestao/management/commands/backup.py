@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from core_gestao.backup import fazer_backup, podar, tamanho
+
+
+class Command(BaseCommand):
+    help = (
+        "Backup do banco em partes .jsonl.gz com SHA-256 por tabela. Incremental sobre o "
+        "último backup enquanto o completo da cadeia tiver menos de BACKUP_COMPLETO_DIAS; "
+        "depois apaga as cadeias além de BACKUP_MANTER_COMPLETOS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--completo", action="store_true", help="Força um backup completo (nova cadeia).")
+        parser.add_argument("--destino", help="Pasta dos backups (padrão: BACKUP_DIR).")
+        parser.add_argument("--sem-podar", action="store_true", help="Não apaga cadeias antigas.")
+
+    def handle(self, *args, **options):
+        manifesto = fazer_backup(options["destino"], completo=options["completo"])
+        linhas = sum(t["linhas"] for t in manifesto["tabelas"].values())
+        self.stdout.write(
+            f"Backup {manifesto['tipo']} {manifesto['pasta'].name}: {linhas} linhas em "
+            f"{len(manifesto['tabelas'])} tabelas, {tamanho(manifesto) / 2**20:.1f} MB."
+        )
+        if options["sem_podar"]:
+            return
+        for nome in podar(options["destino"]):
+            self.stdout.write(f"Removido: {nome}")
@@ -0,0 +1,67 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core_gestao.benchmarks.micro import (
+    BASELINE_PADRAO,
+    LIMITE_PADRAO,
+    RODADAS,
+    TEMPO_MINIMO,
+    carregar_baseline,
+    comparar,
+    executar,
+    imprimir,
+    maquina_atual,
+    reconfirmar,
+    salvar_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmarks de plano_utils e do catálogo (sem banco nem rede). Compara o mínimo "
+        "por operação com a baseline desta máquina e falha acima de --limite; --salvar grava a baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--filtro", help="Só os casos cujo nome contém este texto.")
+        parser.add_argument("--rodadas", type=int, default=RODADAS, help="Amostras por caso.")
+        parser.add_argument(
+            "--tempo-minimo", type=float, default=TEMPO_MINIMO, help="Duração mínima de cada rodada (s)."
+        )
+        parser.add_argument("--baseline", default=str(BASELINE_PADRAO), help="Arquivo JSON das baselines.")
+        parser.add_argument("--maquina", default=maquina_atual(), help="Chave da baseline (padrão: hostname).")
+        parser.add_argument(
+            "--limite", type=float, default=LIMITE_PADRAO, help="Aumento máximo aceito (0.25 = +25%%)."
+        )
+        parser.add_argument("--salvar", action="store_true", help="Grava o resultado como baseline.")
+        parser.add_argument("--json", action="store_true", help="Resultado e comparação em JSON.")
+
+    def handle(self, *args, **options):
+        rodadas = max(2, options["rodadas"])
+        resultado = executar(options["filtro"], rodadas, options["tempo_minimo"])
+        if not resultado["casos"]:
+            raise CommandError(f"Nenhum caso com {options['filtro']!r}.")
+        baseline = carregar_baseline(options["baseline"], options["maquina"])
+        comparacao = comparar(resultado, baseline, options["limite"])
+        if comparacao["regressoes"] and not options["salvar"]:
+            reconfirmar(resultado, comparacao["regressoes"], rodadas, options["tempo_minimo"])
+            comparacao = comparar(resultado, baseline, options["limite"])
+
+        if options["json"]:
+            self.stdout.write(json.dumps({**resultado, "comparacao": comparacao}, indent=2))
+        else:
+            imprimir(resultado, comparacao, saida=self.stdout.write)
+
+        if options["salvar"]:
+            salvar_baseline(resultado, options["baseline"], options["maquina"])
+            self.stdout.write(f"Baseline de {options['maquina']!r} gravada em {options['baseline']}.")
+            return
+        if baseline is None:
+            self.stdout.write(f"Sem baseline para {options['maquina']!r}: rode com --salvar para criar.")
+            return
+        if comparacao["regressoes"]:
+            raise CommandError(
+                f"{len(comparacao['regressoes'])} caso(s) acima de +{options['limite']:.0%}: "
+                + ", ".join(comparacao["regressoes"])
+            )
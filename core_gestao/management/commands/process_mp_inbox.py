@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core_gestao.mp_inbox import limpar_pagamentos_expirados, processar_inbox
+from core_gestao.rate_limit import limpar_rate_limit_expirado
+
+# Limpeza do índice de deduplicação e do rate limit (TTL) no máximo uma vez por hora
+LIMPEZA_INTERVALO = 3600
+
+
+class Command(BaseCommand):
+    help = "Processa a caixa de entrada de webhooks Mercado Pago (Ultramed e Rinan)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=100, help="Notificações por lote.")
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Fica em execução contínua (worker do docker-compose).",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos de espera quando a fila está vazia (modo --loop).",
+        )
+
+    def handle(self, *args, **options):
+        lote = max(1, options["lote"])
+        ultima_limpeza = 0.0
+        while True:
+            close_old_connections()
+            if time.monotonic() - ultima_limpeza >= LIMPEZA_INTERVALO:
+                apagados = limpar_pagamentos_expirados()
+                ultima_limpeza = time.monotonic()
+                if apagados:
+                    self.stdout.write(f"Índice MP: {apagados} registros expirados removidos.")
+                apagados = limpar_rate_limit_expirado()
+                if apagados:
+                    self.stdout.write(f"Rate limit: {apagados} contadores expirados removidos.")
+            resumo = processar_inbox(lote)
+            if resumo["notificacoes"]:
+                self.stdout.write(
+                    f"Inbox MP: {resumo['notificacoes']} notificações, "
+                    f"{resumo['pagamentos']} pagamentos, {resumo['erros']} erros, "
+                    f"{resumo['evitados']} repetidos (sem consulta ao MP)."
+                )
+            if not options["loop"]:
+                break
+            if resumo["notificacoes"] < lote:
+                time.sleep(options["intervalo"])
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core_gestao.receita_mensal import reconstruir_receita, verificar_receita
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a receita mensal do dashboard (ReceitaMensal) a partir das faturas pagas. "
+        "Com --verificar só compara e falha se houver divergência."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ano", type=int, help="Só este ano.")
+        parser.add_argument("--mes", type=int, help="Só este mês (exige --ano).")
+        parser.add_argument(
+            "--verificar", action="store_true", help="Não altera nada; lista as divergências."
+        )
+
+    def handle(self, *args, **options):
+        ano, mes = options["ano"], options["mes"]
+        if mes and not ano:
+            raise CommandError("--mes exige --ano.")
+        if mes and not 1 <= mes <= 12:
+            raise CommandError("--mes deve estar entre 1 e 12.")
+        if not options["verificar"]:
+            linhas = reconstruir_receita(ano, mes)
+            self.stdout.write(f"Receita mensal: {linhas} linhas recalculadas.")
+            return
+        divergencias = verificar_receita(ano, mes)
+        for d in divergencias:
+            self.stdout.write(
+                f"{d['mes']:02d}/{d['ano']} {d['metodo_pagamento'] or 'não informado'}: "
+                f"faturas R$ {d['faturas']['soma']} ({d['faturas']['quantidade']}) x "
+                f"receita R$ {d['receita']['soma']} ({d['receita']['quantidade']})"
+            )
+        if divergencias:
+            raise CommandError(
+                f"{len(divergencias)} divergência(s); rode sem --verificar para recalcular."
+            )
+        self.stdout.write("Receita mensal consistente com as faturas.")
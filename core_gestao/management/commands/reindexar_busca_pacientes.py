@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core_gestao.busca_pacientes import reindexar_pacientes
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula o índice de busca de pacientes (nome sem acento, CPF só dígitos). "
+        "Use após cargas em massa que não passam por Paciente.save."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000, help="Pacientes por lote.")
+
+    def handle(self, *args, **options):
+        total = reindexar_pacientes(max(1, options["lote"]))
+        self.stdout.write(f"Busca de pacientes: {total} pacientes reindexados.")
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core_gestao.backup import BackupInvalido, cadeia, restaurar, verificar
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura o banco a partir de um backup de manage.py backup (o completo da cadeia e "
+        "os incrementais até o escolhido). Confere checksums e migrações antes de gravar; "
+        "com --verificar só confere."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "backup", nargs="?", default="ultimo", help="Id ou pasta do backup (padrão: o último)."
+        )
+        parser.add_argument("--destino", help="Pasta dos backups (padrão: BACKUP_DIR).")
+        parser.add_argument("--verificar", action="store_true", help="Só confere a cadeia; não altera o banco.")
+        parser.add_argument(
+            "--noinput", "--no-input", action="store_false", dest="interactive",
+            help="Não pede confirmação.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            elos = cadeia(options["backup"], options["destino"])
+            verificar(elos)
+        except BackupInvalido as exc:
+            raise CommandError(str(exc)) from exc
+        nomes = " -> ".join(m["pasta"].name for m in elos)
+        self.stdout.write(f"Cadeia íntegra: {nomes}")
+        if options["verificar"]:
+            return
+        if options["interactive"]:
+            resposta = input(
+                "Todas as tabelas do backup serão substituídas neste banco. Digite 'sim' para continuar: "
+            )
+            if resposta.strip().lower() != "sim":
+                raise CommandError("Restauração cancelada.")
+        contagem = restaurar(elos)
+        self.stdout.write(
+            f"Restaurado {elos[-1]['pasta'].name}: {sum(contagem.values())} linhas em {len(contagem)} tabelas."
+        )
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core_gestao.benchmarks.massa import LOTE, criar_equipe, popular
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera massa sintética para testes de carga: titulares, dependentes, faturas (pico nos "
+        "dias 10/20), agenda, prontuários e exames via bulk_create. Só com DEBUG ou --forcar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--pacientes", type=int, default=10_000, help="Total de pacientes a criar.")
+        parser.add_argument("--semente", type=int, default=7, help="Semente do gerador (massa reprodutível).")
+        parser.add_argument("--lote", type=int, default=LOTE, help="Pacientes por transação.")
+        parser.add_argument(
+            "--senha-equipe",
+            help="Cria master/recepcao/medico com esta senha se ainda não existirem (login do cenário de carga).",
+        )
+        parser.add_argument("--forcar", action="store_true", help="Permite rodar com DEBUG desligado.")
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["forcar"]:
+            raise CommandError("Massa sintética só em ambiente de teste: use DEBUG=1 ou --forcar.")
+        if options["pacientes"] < 1:
+            raise CommandError("--pacientes deve ser positivo.")
+        if options["senha_equipe"]:
+            for username in criar_equipe(options["senha_equipe"]):
+                self.stdout.write(f"Usuário criado: {username}")
+        contagem = popular(options["pacientes"], semente=options["semente"], lote=max(1, options["lote"]))
+        self.stdout.write(
+            "Massa gerada: {pacientes} pacientes ({titulares} titulares, {dependentes} dependentes), "
+            "{faturas} faturas, {agenda} agendamentos, {prontuarios} prontuários, {exames} exames.".format(**contagem)
+        )
@@ -0,0 +1,255 @@
+"""
+Métricas no formato texto do Prometheus (``/sistema/metrics``).
+
+Os contadores usam os grupos de ``cache_utils``: cada processo (workers do
+gunicorn, inbox do MP, ASGI da TV) soma localmente e envia ao banco
+(ContadorEstatistica) a cada ``STATS_FLUSH_SEGUNDOS``, então a coleta enxerga a
+implantação inteira qualquer que seja o worker que responda. Histogramas são
+guardados como um contador por balde (não cumulativo) mais a soma em
+microssegundos; a exposição acumula os baldes. Gauges (fila do inbox, rate
+limit) são lidos do banco na hora da coleta.
+"""
+import os
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.db.models import Count, Min, Q
+from django.utils import timezone
+
+from .cache_utils import STATS_FLUSH_SEGUNDOS, contadores, contar, enviar_estatisticas
+
+BALDES_SEGUNDOS = (0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+GRUPO_HTTP = "metricas.http"
+GRUPO_MP = "metricas.mp"
+SEM_ROTA = "<sem rota>"
+
+_PROCESSOS_KEY = "metricas:processos"
+_PROCESSO_KEY = "metricas:processo:{}"
+PROCESSO_TTL = 300  # processo sem request nesse intervalo deixa de contar como ativo
+
+_lock = threading.Lock()
+_ultimo_batimento = 0.0
+
+
+def _chave(*partes) -> str:
+    return "|".join(str(p) for p in partes)
+
+
+def observar(grupo: str, rotulos: tuple, segundos: float) -> None:
+    """Uma observação do histograma ``grupo`` com os ``rotulos`` (tupla de valores)."""
+    balde = next((i for i, limite in enumerate(BALDES_SEGUNDOS) if segundos <= limite), len(BALDES_SEGUNDOS))
+    contar(grupo, _chave("b", *rotulos, balde))
+    contar(grupo, _chave("s", *rotulos), int(segundos * 1_000_000))
+
+
+def registrar_request(view: str, metodo: str, status: int, segundos: float) -> None:
+    contar(GRUPO_HTTP, _chave("n", view, metodo, f"{status // 100}xx"))
+    observar(GRUPO_HTTP, (view,), segundos)
+
+
+def operacao_mp(metodo: str, url: str) -> str:
+    """``payment.create``, ``payment.get``, ``preference.create``... a partir da chamada HTTP."""
+    partes = [p for p in urlsplit(url).path.split("/") if p and p not in ("v1", "checkout")]
+    recurso = partes[0].rstrip("s") if partes else "desconhecido"
+    acao = {"POST": "create", "PUT": "update", "DELETE": "delete"}.get(metodo.upper())
+    if acao is None:
+        acao = "get" if len(partes) > 1 and partes[1] != "search" else "search"
+    return f"{recurso}.{acao}"
+
+
+def registrar_mp(operacao: str, conta: str, resultado: str, segundos: float) -> None:
+    contar(GRUPO_MP, _chave("n", operacao, conta, resultado))
+    observar(GRUPO_MP, (operacao, conta), segundos)
+
+
+def _batimento() -> None:
+    """Marca este processo como ativo (no máximo uma escrita a cada STATS_FLUSH_SEGUNDOS)."""
+    global _ultimo_batimento
+    with _lock:
+        if time.monotonic() - _ultimo_batimento < STATS_FLUSH_SEGUNDOS:
+            return
+        _ultimo_batimento = time.monotonic()
+    ident = f"{socket.gethostname()}:{os.getpid()}"
+    cache.set(_PROCESSO_KEY.format(ident), time.time(), PROCESSO_TTL)
+    processos = cache.get(_PROCESSOS_KEY) or set()
+    if ident not in processos:
+        cache.set(_PROCESSOS_KEY, processos | {ident}, None)
+
+
+def processos_ativos() -> dict:
+    """{host: processos com request nos últimos PROCESSO_TTL segundos}; esquece os expirados."""
+    processos = cache.get(_PROCESSOS_KEY) or set()
+    vivos = cache.get_many([_PROCESSO_KEY.format(p) for p in processos])
+    ativos = {p for p in processos if _PROCESSO_KEY.format(p) in vivos}
+    if ativos != processos:
+        cache.set(_PROCESSOS_KEY, ativos, None)
+    por_host = {}
+    for p in ativos:
+        host = p.rsplit(":", 1)[0]
+        por_host[host] = por_host.get(host, 0) + 1
+    return por_host
+
+
+class MetricasMiddleware:
+    """Contagem e latência de cada request por nome de rota, método e classe de status."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        view = getattr(getattr(request, "resolver_match", None), "view_name", None) or SEM_ROTA
+        registrar_request(view, request.method, response.status_code, time.perf_counter() - inicio)
+        _batimento()
+        return response
+
+
+# -----------------------------------------------------------------
+# Exposição
+# -----------------------------------------------------------------
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _rotulos(nomes, valores, extra=()) -> str:
+    pares = list(zip(nomes, valores)) + list(extra)
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{nome}="{_escapar(valor)}"' for nome, valor in pares) + "}"
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float):
+        return repr(round(valor, 6))
+    return str(valor)
+
+
+class _Saida:
+    def __init__(self):
+        self.linhas = []
+
+    def metrica(self, nome, tipo, ajuda, series) -> None:
+        """``series``: [(nomes, valores, valor)]; cabeçalho mesmo sem séries."""
+        self.linhas.append(f"# HELP {nome} {ajuda}")
+        self.linhas.append(f"# TYPE {nome} {tipo}")
+        for nomes, valores, valor in series:
+            self.linhas.append(f"{nome}{_rotulos(nomes, valores)} {_numero(valor)}")
+
+    def contador_por_evento(self, nome, ajuda, grupo, nomes) -> None:
+        series = []
+        for evento, total in sorted(contadores(grupo).items()):
+            partes = evento.split("|")
+            if partes[0] == "n" and len(partes) == len(nomes) + 1:
+                series.append((nomes, partes[1:], total))
+        self.metrica(nome, "counter", ajuda, series)
+
+    def histograma(self, nome, ajuda, grupo, nomes) -> None:
+        baldes, somas = {}, {}
+        for evento, total in contadores(grupo).items():
+            partes = evento.split("|")
+            if partes[0] == "b" and len(partes) == len(nomes) + 2:
+                chave = tuple(partes[1:-1])
+                baldes.setdefault(chave, [0] * (len(BALDES_SEGUNDOS) + 1))[int(partes[-1])] += total
+            elif partes[0] == "s" and len(partes) == len(nomes) + 1:
+                somas[tuple(partes[1:])] = total
+        self.linhas.append(f"# HELP {nome} {ajuda}")
+        self.linhas.append(f"# TYPE {nome} histogram")
+        for chave in sorted(baldes):
+            acumulado = 0
+            for limite, n in zip(BALDES_SEGUNDOS + ("+Inf",), baldes[chave]):
+                acumulado += n
+                rotulos = _rotulos(nomes, chave, [("le", limite)])
+                self.linhas.append(f"{nome}_bucket{rotulos} {acumulado}")
+            self.linhas.append(f"{nome}_sum{_rotulos(nomes, chave)} {somas.get(chave, 0) / 1_000_000}")
+            self.linhas.append(f"{nome}_count{_rotulos(nomes, chave)} {acumulado}")
+
+    def texto(self) -> str:
+        return "\n".join(self.linhas) + "\n"
+
+
+def _inbox_mp() -> dict:
+    from .models import NotificacaoMP
+
+    agg = NotificacaoMP.objects.aggregate(
+        pendentes=Count("id", filter=Q(status="PENDENTE")),
+        erros=Count("id", filter=Q(status="ERRO")),
+        mais_antiga=Min("recebido_em", filter=Q(status="PENDENTE")),
+    )
+    atraso = (timezone.now() - agg["mais_antiga"]).total_seconds() if agg["mais_antiga"] else 0.0
+    return {"pendentes": agg["pendentes"], "erros": agg["erros"], "atraso": max(0.0, atraso)}
+
+
+def exposicao() -> str:
+    """Texto ``text/plain; version=0.0.4`` com todas as métricas."""
+    from .cache_utils import estatisticas_cache
+    from .conexoes_db import estatisticas_conexoes
+    from .rate_limit import estatisticas_rate_limit
+    from .tv_eventos import estatisticas_tv
+
+    enviar_estatisticas()
+    saida = _Saida()
+    saida.metrica(
+        "ultramed_processos_ativos", "gauge",
+        f"Processos (workers) com request nos últimos {PROCESSO_TTL}s, por host/container.",
+        [(("host",), (host,), n) for host, n in sorted(processos_ativos().items())],
+    )
+    saida.contador_por_evento(
+        "ultramed_http_requests_total", "Requests por rota, método e classe de status.",
+        GRUPO_HTTP, ("view", "metodo", "status"),
+    )
+    saida.histograma(
+        "ultramed_http_request_duration_seconds", "Latência dos requests por rota (até a view responder).",
+        GRUPO_HTTP, ("view",),
+    )
+    saida.contador_por_evento(
+        "ultramed_mp_requests_total",
+        "Chamadas HTTP ao Mercado Pago por operação, conta e resultado (cada tentativa conta).",
+        GRUPO_MP, ("operacao", "conta", "resultado"),
+    )
+    saida.histograma(
+        "ultramed_mp_request_duration_seconds", "Latência das chamadas ao Mercado Pago.",
+        GRUPO_MP, ("operacao", "conta"),
+    )
+
+    inbox = _inbox_mp()
+    saida.metrica("ultramed_mp_inbox_pendentes", "gauge", "Notificações do MP aguardando o worker.",
+                  [((), (), inbox["pendentes"])])
+    saida.metrica("ultramed_mp_inbox_erros", "gauge", "Notificações do MP que esgotaram as tentativas.",
+                  [((), (), inbox["erros"])])
+    saida.metrica("ultramed_mp_inbox_atraso_seconds", "gauge",
+                  "Idade da notificação pendente mais antiga (0 com a fila vazia).",
+                  [((), (), inbox["atraso"])])
+
+    tv = estatisticas_tv()
+    saida.metrica(
+        "ultramed_tv_polls_total", "counter", "Polls da TV da sala de espera por resposta (200/304).",
+        [(("status",), ("200",), tv["respostas_200"]), (("status",), ("304",), tv["respostas_304"])],
+    )
+
+    namespaces = estatisticas_cache()["namespaces"]
+    saida.metrica(
+        "ultramed_cache_requests_total", "counter", "Leituras do cache compartilhado por namespace.",
+        [
+            (("namespace", "resultado"), (nome, resultado), ns[chave])
+            for nome, ns in sorted(namespaces.items())
+            for resultado, chave in (("hit", "hits"), ("miss", "misses"))
+        ],
+    )
+
+    banco = estatisticas_conexoes()
+    saida.metrica("ultramed_db_requests_total", "counter", "Requests atendidos (base do reuso de conexão).",
+                  [((), (), banco["requests"])])
+    saida.metrica("ultramed_db_connections_opened_total", "counter", "Conexões novas abertas com o banco.",
+                  [((), (), banco["conexoes_abertas"])])
+
+    regras = estatisticas_rate_limit(top=0)["regras"]
+    saida.metrica(
+        "ultramed_rate_limit_bloqueados", "gauge", "Requests bloqueados nas janelas/baldes vigentes, por regra.",
+        [(("regra",), (regra,), r["bloqueados"]) for regra, r in sorted(regras.items())],
+    )
+    return saida.texto()
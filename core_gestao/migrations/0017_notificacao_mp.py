@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0016_fatura_licenca_sistema'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificacaoMP',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conta', models.CharField(choices=[('ULTRAMED', 'Ultramed'), ('RINAN', 'Rinan Code')], default='ULTRAMED', max_length=10)),
+                ('payment_id', models.CharField(max_length=100)),
+                ('status', models.CharField(choices=[('PENDENTE', 'Pendente'), ('PROCESSADO', 'Processado'), ('ERRO', 'Erro')], default='PENDENTE', max_length=10)),
+                ('tentativas', models.PositiveSmallIntegerField(default=0)),
+                ('erro', models.CharField(blank=True, default='', max_length=255)),
+                ('recebido_em', models.DateTimeField(auto_now_add=True)),
+                ('processado_em', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Notificação Mercado Pago',
+                'verbose_name_plural': 'Notificações Mercado Pago',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='notifmp_status_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0017_notificacao_mp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PagamentoMPProcessado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conta', models.CharField(choices=[('ULTRAMED', 'Ultramed'), ('RINAN', 'Rinan Code')], max_length=10)),
+                ('payment_id', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('processado_em', models.DateTimeField(auto_now_add=True)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('repeticoes', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Pagamento MP processado',
+                'verbose_name_plural': 'Pagamentos MP processados',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='pagamentompprocessado',
+            constraint=models.UniqueConstraint(fields=('conta', 'payment_id', 'status'), name='pagmp_conta_payment_status_uniq'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 08:47
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0018_pagamento_mp_processado'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paciente',
+            name='cpf_busca',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=14),
+        ),
+        migrations.AddField(
+            model_name='paciente',
+            name='nome_busca',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.CreateModel(
+            name='PacienteBuscaToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64)),
+                ('paciente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_busca', to='core_gestao.paciente')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'paciente'], name='pac_busca_token_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def preencher_busca(apps, schema_editor):
+    from core_gestao.busca_pacientes import normalizar_texto_busca, tokens_nome
+    from core_gestao.plano_utils import normalizar_cpf
+
+    Paciente = apps.get_model("core_gestao", "Paciente")
+    PacienteBuscaToken = apps.get_model("core_gestao", "PacienteBuscaToken")
+    ultimo_id = 0
+    while True:
+        pacientes = list(
+            Paciente.objects.filter(id__gt=ultimo_id).order_by("id").only("id", "nome_completo", "cpf")[:1000]
+        )
+        if not pacientes:
+            return
+        for p in pacientes:
+            p.nome_busca = normalizar_texto_busca(p.nome_completo)[:255]
+            p.cpf_busca = normalizar_cpf(p.cpf)[:14]
+        Paciente.objects.bulk_update(pacientes, ["nome_busca", "cpf_busca"])
+        PacienteBuscaToken.objects.bulk_create(
+            [
+                PacienteBuscaToken(paciente_id=p.id, token=t)
+                for p in pacientes
+                for t in tokens_nome(p.nome_completo)
+            ]
+        )
+        ultimo_id = pacientes[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0019_paciente_busca'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_busca, migrations.RunPython.noop),
+    ]
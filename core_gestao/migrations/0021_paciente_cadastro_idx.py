@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0020_paciente_busca_backfill'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['data_cadastro', 'id'], name='pac_cadastro_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0021_paciente_cadastro_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fatura',
+            name='preferencia_expira_em',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='fatura',
+            name='preferencia_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='fatura',
+            name='preferencia_valor',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True),
+        ),
+    ]
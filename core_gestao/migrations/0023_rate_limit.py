@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0022_fatura_preferencia_mp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBalde',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('regra', models.CharField(max_length=50)),
+                ('chave', models.CharField(max_length=200, unique=True)),
+                ('tokens', models.FloatField()),
+                ('atualizado_em', models.FloatField(help_text='Epoch da última reposição')),
+                ('permitidos', models.PositiveIntegerField(default=0)),
+                ('bloqueados', models.PositiveIntegerField(default=0)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Rate limit (token bucket)',
+                'verbose_name_plural': 'Rate limit (token buckets)',
+            },
+        ),
+        migrations.CreateModel(
+            name='RateLimitJanela',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('regra', models.CharField(max_length=50)),
+                ('chave', models.CharField(max_length=200)),
+                ('inicio', models.BigIntegerField(help_text='Início da janela (epoch, segundos)')),
+                ('permitidos', models.PositiveIntegerField(default=0)),
+                ('bloqueados', models.PositiveIntegerField(default=0)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Rate limit (janela)',
+                'verbose_name_plural': 'Rate limit (janelas)',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ratelimitjanela',
+            constraint=models.UniqueConstraint(fields=('chave', 'inicio'), name='rl_janela_chave_inicio_uniq'),
+        ),
+    ]
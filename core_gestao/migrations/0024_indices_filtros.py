@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0023_rate_limit'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='agenda',
+            index=models.Index(fields=['data', 'status', 'hora'], name='agenda_data_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['status', 'data_pagamento'], name='fatura_status_pag_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fatura',
+            index=models.Index(fields=['paciente', 'plano', 'status', 'data_vencimento'], name='fatura_checkout_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paciente',
+            index=models.Index(fields=['is_titular', 'vencimento_plano'], name='pac_titular_venc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prontuario',
+            index=models.Index(fields=['paciente', 'data_atendimento'], name='pront_pac_data_idx'),
+        ),
+    ]
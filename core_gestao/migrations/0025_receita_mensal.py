@@ -0,0 +1,35 @@
+# Generated by Django 4.2.30 on 2026-10-18 09:21
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0024_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceitaMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('metodo_pagamento', models.CharField(blank=True, default='', help_text='Vazio = não informado', max_length=20)),
+                ('soma', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('quantidade', models.PositiveIntegerField(default=0)),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Receita mensal',
+                'verbose_name_plural': 'Receitas mensais',
+                'ordering': ['-ano', '-mes', 'metodo_pagamento'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='receitamensal',
+            constraint=models.UniqueConstraint(fields=('ano', 'mes', 'metodo_pagamento'), name='receita_mes_metodo_uniq'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+
+def preencher_receita(apps, schema_editor):
+    Fatura = apps.get_model("core_gestao", "Fatura")
+    ReceitaMensal = apps.get_model("core_gestao", "ReceitaMensal")
+    totais = {}
+    linhas = (
+        Fatura.objects.filter(status="PAGO", data_pagamento__isnull=False)
+        .annotate(ano=ExtractYear("data_pagamento"), mes=ExtractMonth("data_pagamento"))
+        .values("ano", "mes", "metodo_pagamento")
+        .annotate(soma=Sum("valor"), quantidade=Count("id"))
+        .order_by()
+    )
+    for linha in linhas:
+        chave = (linha["ano"], linha["mes"], linha["metodo_pagamento"] or "")
+        soma, qtd = totais.get(chave, (Decimal("0"), 0))
+        totais[chave] = (soma + (linha["soma"] or 0), qtd + linha["quantidade"])
+    agora = timezone.now()
+    ReceitaMensal.objects.bulk_create(
+        [
+            ReceitaMensal(
+                ano=ano, mes=mes, metodo_pagamento=metodo, soma=soma, quantidade=qtd, atualizado_em=agora
+            )
+            for (ano, mes, metodo), (soma, qtd) in totais.items()
+        ]
+    )
+
+
+def limpar_receita(apps, schema_editor):
+    apps.get_model("core_gestao", "ReceitaMensal").objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0025_receita_mensal'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_receita, limpar_receita),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0028_atualizado_em_backup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendaRecursoDia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(max_length=20)),
+                ('data', models.DateField()),
+                ('agendamentos', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Agenda (trava por sala e dia)',
+                'verbose_name_plural': 'Agenda (travas por sala e dia)',
+            },
+        ),
+        migrations.AddField(
+            model_name='agenda',
+            name='duracao_min',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agenda',
+            name='procedimento_id',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='agenda',
+            name='recurso',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddConstraint(
+            model_name='agendarecursodia',
+            constraint=models.UniqueConstraint(fields=('recurso', 'data'), name='agenda_recurso_data_uniq'),
+        ),
+    ]
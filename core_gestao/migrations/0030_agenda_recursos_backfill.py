@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def preencher_recursos(apps, schema_editor):
+    from core_gestao.agendamento import procedimento_da_observacao, recurso_e_duracao
+
+    Agenda = apps.get_model("core_gestao", "Agenda")
+    ultimo_id = 0
+    while True:
+        agendamentos = list(
+            Agenda.objects.filter(id__gt=ultimo_id).order_by("id").only("id", "tipo", "observacoes")[:1000]
+        )
+        if not agendamentos:
+            return
+        for ag in agendamentos:
+            ag.procedimento_id = procedimento_da_observacao(ag.observacoes)
+            ag.recurso, ag.duracao_min = recurso_e_duracao(ag.procedimento_id, ag.tipo)
+        Agenda.objects.bulk_update(agendamentos, ["procedimento_id", "recurso", "duracao_min"])
+        ultimo_id = agendamentos[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0029_agenda_recursos'),
+    ]
+
+    operations = [
+        migrations.RunPython(preencher_recursos, migrations.RunPython.noop),
+    ]
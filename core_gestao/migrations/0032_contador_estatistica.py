@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-18 11:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core_gestao', '0031_atualizado_em_prontuario_receita'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorEstatistica',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grupo', models.CharField(max_length=100)),
+                ('evento', models.CharField(max_length=255)),
+                ('valor', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Contador de diagnóstico',
+                'verbose_name_plural': 'Contadores de diagnóstico',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='contadorestatistica',
+            constraint=models.UniqueConstraint(fields=('grupo', 'evento'), name='contador_grupo_evento_uniq'),
+        ),
+    ]
@@ -52,10 +52,70 @@ class Paciente(models.Model):
     doencas_cronicas = models.CharField(max_length=500, blank=True, null=True)
     
     data_cadastro = models.DateTimeField(auto_now_add=True)
+    # Marca d'água do backup incremental (core_gestao/backup.py)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Busca (core_gestao/busca_pacientes.py): preenchidos no save
+    nome_busca = models.CharField(max_length=255, blank=True, default="", db_index=True, editable=False)
+    cpf_busca = models.CharField(max_length=14, blank=True, default="", db_index=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Paginação por cursor das listagens (core_gestao/paginacao.py)
+            models.Index(fields=["data_cadastro", "id"], name="pac_cadastro_id_idx"),
+            # Planos a vencer / alertas do dashboard
+            models.Index(fields=["is_titular", "vencimento_plano"], name="pac_titular_venc_idx"),
+        ]
 
     def __str__(self):
         return self.nome_completo
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._nome_busca_indexado = instance.__dict__.get("nome_busca")
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .busca_pacientes import campos_busca, indexar_tokens
+        from .cache_utils import CACHE_PACIENTES
+
+        for campo, valor in campos_busca(self).items():
+            setattr(self, campo, valor)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            extras = {"atualizado_em"}
+            if {"nome_completo", "cpf"} & set(update_fields):
+                extras |= {"nome_busca", "cpf_busca"}
+            kwargs["update_fields"] = set(update_fields) | extras
+        super().save(*args, **kwargs)
+        # Tokens só mudam com o nome (salvar o cadastro sem renomear não reescreve)
+        if getattr(self, "_nome_busca_indexado", None) != self.nome_busca:
+            indexar_tokens(self)
+            self._nome_busca_indexado = self.nome_busca
+        # Contagens das listagens (plano, vencimento e filtros podem ter mudado)
+        CACHE_PACIENTES.invalidar()
+
+    def delete(self, *args, **kwargs):
+        from .cache_utils import CACHE_PACIENTES
+
+        resultado = super().delete(*args, **kwargs)
+        CACHE_PACIENTES.invalidar()
+        return resultado
+
+
+class PacienteBuscaToken(models.Model):
+    """Uma palavra do nome (sem acento) por linha: prefixo indexado para a busca."""
+
+    paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name="tokens_busca")
+    token = models.CharField(max_length=64)
+
+    class Meta:
+        indexes = [models.Index(fields=["token", "paciente"], name="pac_busca_token_idx")]
+
+    def __str__(self):
+        return f"{self.token} → {self.paciente_id}"
+
 # =================================================================
 # 3. FINANCEIRO (UNIFICADO COM MERCADO PAGO)
 # =================================================================
@@ -77,6 +137,26 @@ class Fatura(models.Model):
     # Ajustado: removido unique=True para evitar travamentos em reprocessamentos
     mercadopago_id = models.CharField(max_length=100, null=True, blank=True)
 
+    # Preferência do checkout MP reaproveitada entre recargas da página
+    preferencia_id = models.CharField(max_length=100, null=True, blank=True)
+    preferencia_valor = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    preferencia_expira_em = models.DateTimeField(null=True, blank=True)
+
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Recebimentos do mês (master_dashboard)
+            models.Index(fields=["status", "data_pagamento"], name="fatura_status_pag_idx"),
+            # Fatura pendente reaproveitada no checkout
+            models.Index(
+                fields=["paciente", "plano", "status", "data_vencimento"],
+                name="fatura_checkout_idx",
+            ),
+            # Exportação das pendentes/atrasadas do mês, lida na ordem do índice
+            models.Index(fields=["status", "data_vencimento"], name="fatura_status_venc_idx"),
+        ]
+
     def __str__(self):
         return f"Fatura {self.id} - {self.paciente.nome_completo} ({self.status})"
 
@@ -99,11 +179,41 @@ class Agenda(models.Model):
     tipo = models.CharField(max_length=10, choices=TIPOS, default='CONSULTA')
     status = models.CharField(max_length=15, choices=STATUS, default='AGENDADO')
     observacoes = models.TextField(blank=True, null=True)
+    # Id do catálogo, sala ocupada e duração (vazios em registros antigos: ver agendamento.py)
+    procedimento_id = models.CharField(max_length=50, blank=True, default="")
+    recurso = models.CharField(max_length=20, blank=True, default="")
+    duracao_min = models.PositiveSmallIntegerField(default=0)
     data_registro = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Fila do dia por status, já na ordem de hora (painéis médico/recepção)
+            models.Index(fields=["data", "status", "hora"], name="agenda_data_status_idx"),
+            # Exportação por período na ordem (data, hora) sem reordenar
+            models.Index(fields=["data", "hora"], name="agenda_data_hora_idx"),
+        ]
 
     def __str__(self):
         return f"{self.data} {self.hora} - {self.paciente.nome_completo}"
 
+
+class AgendaRecursoDia(models.Model):
+    """Linha de trava por (sala, dia): agendamentos concorrentes na mesma sala e dia se enfileiram."""
+    recurso = models.CharField(max_length=20)
+    data = models.DateField()
+    agendamentos = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Agenda (trava por sala e dia)"
+        verbose_name_plural = "Agenda (travas por sala e dia)"
+        constraints = [
+            models.UniqueConstraint(fields=["recurso", "data"], name="agenda_recurso_data_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.recurso} {self.data}: {self.agendamentos}"
+
 class Exame(models.Model):
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='exames_paciente')
     nome_exame = models.CharField(max_length=255)
@@ -113,6 +223,7 @@ class Exame(models.Model):
     valor_tabela = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     valor_pago = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     arquivo = models.FileField(upload_to='exames/%Y/%m/%d/', blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.nome_exame} - {self.paciente.nome_completo}"
@@ -123,6 +234,13 @@ class Prontuario(models.Model):
     data_atendimento = models.DateTimeField(auto_now_add=True)
     evolucao = models.TextField()
     prescricao = models.TextField(blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Uso no mês (desconto Essencial) e histórico do paciente
+            models.Index(fields=["paciente", "data_atendimento"], name="pront_pac_data_idx"),
+        ]
 
 class Receita(models.Model):
     paciente = models.ForeignKey(Paciente, on_delete=models.CASCADE, related_name='receitas')
@@ -130,6 +248,7 @@ class Receita(models.Model):
     conteudo = models.TextField()
     data_emissao = models.DateTimeField(auto_now_add=True)
     hash_digital = models.CharField(max_length=100, blank=True, null=True)
+    atualizado_em = models.DateTimeField(auto_now=True, db_index=True)
 
 # =================================================================
 # 5. CRM E LEADS
@@ -152,6 +271,8 @@ class ChamadaPainel(models.Model):
     def registrar(cls, paciente, consultorio="Consultório 1"):
         from django.utils import timezone
 
+        from .tv_eventos import publicar_chamada
+
         obj, _ = cls.objects.update_or_create(
             pk=1,
             defaults={
@@ -164,6 +285,8 @@ class ChamadaPainel(models.Model):
         # Garante novo timestamp ao repetir o mesmo paciente (TV detecta nova chamada)
         cls.objects.filter(pk=obj.pk).update(chamada_em=timezone.now())
         obj.refresh_from_db()
+        # Versão no cache compartilhado: polling responde 304 sem ir ao banco
+        publicar_chamada(obj)
         return obj
 
 
@@ -225,3 +348,167 @@ class FaturaLicencaSistema(models.Model):
             return f"{meses[int(mes)]} / {ano}"
         except Exception:
             return self.referencia
+
+
+# =================================================================
+# 7. MERCADO PAGO — CAIXA DE ENTRADA DE WEBHOOKS
+# =================================================================
+
+class NotificacaoMP(models.Model):
+    """
+    Notificação de pagamento recebida do Mercado Pago, gravada pelo webhook
+    e processada depois pelo worker ``manage.py process_mp_inbox``.
+    """
+    CONTA_CHOICES = [("ULTRAMED", "Ultramed"), ("RINAN", "Rinan Code")]
+    STATUS = [
+        ("PENDENTE", "Pendente"),
+        ("PROCESSADO", "Processado"),
+        ("ERRO", "Erro"),
+    ]
+
+    conta = models.CharField(max_length=10, choices=CONTA_CHOICES, default="ULTRAMED")
+    payment_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS, default="PENDENTE")
+    tentativas = models.PositiveSmallIntegerField(default=0)
+    erro = models.CharField(max_length=255, blank=True, default="")
+    recebido_em = models.DateTimeField(auto_now_add=True)
+    processado_em = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [
+            models.Index(fields=["status", "id"], name="notifmp_status_id_idx"),
+        ]
+        verbose_name = "Notificação Mercado Pago"
+        verbose_name_plural = "Notificações Mercado Pago"
+
+    def __str__(self):
+        return f"{self.conta} {self.payment_id} ({self.status})"
+
+
+class PagamentoMPProcessado(models.Model):
+    """
+    Índice de pagamentos MP já processados em status final, por conta.
+    Repetições do mesmo payment_id são respondidas daqui, sem consultar o MP.
+    """
+    conta = models.CharField(max_length=10, choices=NotificacaoMP.CONTA_CHOICES)
+    payment_id = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    processado_em = models.DateTimeField(auto_now_add=True)
+    expira_em = models.DateTimeField(db_index=True)
+    repeticoes = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conta", "payment_id", "status"],
+                name="pagmp_conta_payment_status_uniq",
+            ),
+        ]
+        verbose_name = "Pagamento MP processado"
+        verbose_name_plural = "Pagamentos MP processados"
+
+    def __str__(self):
+        return f"{self.conta} {self.payment_id} → {self.status}"
+
+
+# =================================================================
+# 8. RATE LIMITING (compartilhado entre workers)
+# =================================================================
+
+class RateLimitJanela(models.Model):
+    """
+    Contador de uma janela fixa por chave; duas janelas consecutivas formam a
+    janela deslizante de ``core_gestao.rate_limit``.
+    """
+    regra = models.CharField(max_length=50)
+    chave = models.CharField(max_length=200)
+    inicio = models.BigIntegerField(help_text="Início da janela (epoch, segundos)")
+    permitidos = models.PositiveIntegerField(default=0)
+    bloqueados = models.PositiveIntegerField(default=0)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["chave", "inicio"], name="rl_janela_chave_inicio_uniq"),
+        ]
+        verbose_name = "Rate limit (janela)"
+        verbose_name_plural = "Rate limit (janelas)"
+
+    def __str__(self):
+        return f"{self.chave} @{self.inicio}: {self.permitidos}/{self.bloqueados}"
+
+
+class RateLimitBalde(models.Model):
+    """Saldo do token bucket de uma chave (reposto continuamente)."""
+    regra = models.CharField(max_length=50)
+    chave = models.CharField(max_length=200, unique=True)
+    tokens = models.FloatField()
+    atualizado_em = models.FloatField(help_text="Epoch da última reposição")
+    permitidos = models.PositiveIntegerField(default=0)
+    bloqueados = models.PositiveIntegerField(default=0)
+    expira_em = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Rate limit (token bucket)"
+        verbose_name_plural = "Rate limit (token buckets)"
+
+    def __str__(self):
+        return f"{self.chave}: {self.tokens:.1f} tokens"
+
+
+# =================================================================
+# 9. RECEITA MENSAL (agregado do dashboard)
+# =================================================================
+
+class ReceitaMensal(models.Model):
+    """
+    Recebimentos de faturas pagas somados por (ano, mês, método), mantidos a
+    cada pagamento por ``core_gestao.receita_mensal``; o dashboard lê daqui.
+    """
+    ano = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    metodo_pagamento = models.CharField(
+        max_length=20, blank=True, default="", help_text="Vazio = não informado"
+    )
+    soma = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    quantidade = models.PositiveIntegerField(default=0)
+    atualizado_em = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ano", "mes", "metodo_pagamento"], name="receita_mes_metodo_uniq"
+            ),
+        ]
+        ordering = ["-ano", "-mes", "metodo_pagamento"]
+        verbose_name = "Receita mensal"
+        verbose_name_plural = "Receitas mensais"
+
+    def __str__(self):
+        return f"{self.mes:02d}/{self.ano} {self.metodo_pagamento or '—'}: {self.soma} ({self.quantidade})"
+
+
+# =================================================================
+# 10. CONTADORES DE DIAGNÓSTICO (compartilhados entre processos)
+# =================================================================
+
+class ContadorEstatistica(models.Model):
+    """
+    Total de um evento (acertos do cache, requests por rota...) somando todos
+    os processos; cada um envia sua parcela com ``UPDATE valor = valor + n``
+    em ``core_gestao.cache_utils``.
+    """
+    grupo = models.CharField(max_length=100)
+    evento = models.CharField(max_length=255)
+    valor = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["grupo", "evento"], name="contador_grupo_evento_uniq"),
+        ]
+        verbose_name = "Contador de diagnóstico"
+        verbose_name_plural = "Contadores de diagnóstico"
+
+    def __str__(self):
+        return f"{self.grupo} {self.evento}: {self.valor}"
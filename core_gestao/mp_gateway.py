@@ -0,0 +1,218 @@
+"""Gateway Mercado Pago: um SDK e um pool HTTP por access token (por processo)."""
+import logging
+import os
+import threading
+import time
+
+import mercadopago
+import requests
+from django.conf import settings
+from mercadopago.config import RequestOptions
+from mercadopago.http import HttpClient
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+from .metricas import operacao_mp, registrar_mp
+from .perfil_requests import medir_http
+
+logger = logging.getLogger(__name__)
+
+MP_API_BASE_URL = "https://api.mercadopago.com"
+
+_STATUS_RETRY = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_clientes = {}
+_pid = os.getpid()
+_stats = {"pool_hit": 0, "pool_miss": 0}
+
+
+def mp_timeout_seconds():
+    try:
+        return max(5, int(getattr(settings, "MERCADO_PAGO_TIMEOUT_SECONDS", 15)))
+    except (TypeError, ValueError):
+        return 15
+
+
+def mp_max_attempts():
+    try:
+        return max(1, int(getattr(settings, "MERCADO_PAGO_MAX_ATTEMPTS", 2)))
+    except (TypeError, ValueError):
+        return 2
+
+
+def _mp_connect_timeout():
+    # Handshake TCP/TLS curto; o restante do orçamento fica para a leitura.
+    return min(5, mp_timeout_seconds())
+
+
+class PooledHttpClient(HttpClient):
+    """
+    HttpClient do SDK com ``requests.Session`` persistente (keep-alive).
+    Timeouts são de socket (connect/read) — sem thread auxiliar por chamada.
+    Retentativas ficam em ``mp_call`` (uma política só, com log).
+    """
+
+    def __init__(self, pool_maxsize=4, conta="ultramed"):
+        self.conta = conta
+        self._session = requests.Session()
+        self._adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(0, read=False),
+        )
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+        self._requisicoes = 0
+
+    def request(
+        self,
+        method,
+        url,
+        maxretries=None,
+        retry_on=None,
+        backoff_factor=None,
+        **kwargs,
+    ):
+        from mercadopago.errors.exceptions import MPServerError
+
+        base = (getattr(settings, "MERCADO_PAGO_API_BASE_URL", "") or "").rstrip("/")
+        if base and base != MP_API_BASE_URL and url.startswith(MP_API_BASE_URL):
+            url = base + url[len(MP_API_BASE_URL):]
+        kwargs["timeout"] = (_mp_connect_timeout(), mp_timeout_seconds())
+        self._requisicoes += 1
+        inicio = time.perf_counter()
+        resultado = "erro"
+        try:
+            with medir_http("mercadopago"):
+                api_result = self._session.request(method, url, **kwargs)
+            resultado = f"{api_result.status_code // 100}xx"
+        except requests.Timeout:
+            resultado = "timeout"
+            raise
+        finally:
+            registrar_mp(operacao_mp(method, url), self.conta, resultado, time.perf_counter() - inicio)
+        response = {"status": api_result.status_code, "response": None}
+        if api_result.status_code != 204 and api_result.content:
+            try:
+                response["response"] = api_result.json()
+            except ValueError as exc:
+                raise MPServerError(
+                    api_result.status_code,
+                    {"message": "Invalid JSON in response body", "error": "invalid_response"},
+                ) from exc
+        return response
+
+    def estatisticas(self):
+        conexoes = 0
+        pools = self._adapter.poolmanager.pools
+        for chave in list(pools.keys()):
+            conexoes += getattr(pools[chave], "num_connections", 0)
+        return {
+            "requisicoes": self._requisicoes,
+            "handshakes": conexoes,
+            "reutilizadas": max(0, self._requisicoes - conexoes),
+        }
+
+
+def _conta_por_token(token):
+    if token and token == (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip():
+        return "rinan"
+    return "ultramed"
+
+
+def mp_sdk(access_token=None):
+    """SDK reaproveitado por token (Ultramed por padrão; Rinan passando o token dela)."""
+    global _pid
+    token = (access_token or getattr(settings, "MERCADO_PAGO_ACCESS_TOKEN", "") or "").strip()
+    with _lock:
+        if os.getpid() != _pid:
+            # Processo filho (fork do gunicorn): não herdar sockets do pai.
+            _clientes.clear()
+            _pid = os.getpid()
+        sdk = _clientes.get(token)
+        if sdk is not None:
+            _stats["pool_hit"] += 1
+            return sdk
+        _stats["pool_miss"] += 1
+        sdk = mercadopago.SDK(
+            token,
+            http_client=PooledHttpClient(conta=_conta_por_token(token)),
+            request_options=mp_request_options(),
+        )
+        _clientes[token] = sdk
+        return sdk
+
+
+def mp_request_options(custom_headers=None):
+    """RequestOptions com o timeout do projeto e sem retry interno do SDK."""
+    return RequestOptions(
+        connection_timeout=float(mp_timeout_seconds()),
+        custom_headers=custom_headers,
+        max_retries=0,
+    )
+
+
+def _mp_should_retry(resp):
+    if not isinstance(resp, dict):
+        return True
+    return resp.get("status") in _STATUS_RETRY
+
+
+def mp_call(callable_, *args):
+    """Executa chamada do SDK com timeout de socket e retry em 429/5xx/timeout."""
+    max_attempts = mp_max_attempts()
+    last_response = None
+
+    for attempt in range(1, max_attempts + 1):
+        try:
+            response = callable_(*args)
+        except requests.Timeout:
+            response = {
+                "status": 504,
+                "response": {
+                    "message": f"timeout_after_{mp_timeout_seconds()}s",
+                    "status_detail": "gateway_timeout",
+                },
+            }
+        except Exception as exc:
+            response = {"status": 500, "response": {"message": str(exc)}}
+
+        last_response = response
+        if not _mp_should_retry(response):
+            break
+        if attempt < max_attempts:
+            logger.warning(
+                "Retry de chamada Mercado Pago (tentativa %s/%s).",
+                attempt + 1,
+                max_attempts,
+            )
+    return last_response or {"status": 500, "response": {"message": "empty_response"}}
+
+
+def estatisticas_pool():
+    """Hit/miss do registro de SDKs e handshakes/reuso de conexão por conta."""
+    with _lock:
+        contas = {}
+        for token, sdk in _clientes.items():
+            conta = _conta_por_token(token)
+            contas[conta] = sdk.http_client.estatisticas()
+        return {
+            "pid": os.getpid(),
+            "pool_hit": _stats["pool_hit"],
+            "pool_miss": _stats["pool_miss"],
+            "contas": contas,
+        }
+
+
+def resetar_pool():
+    """Fecha sessões e zera contadores (testes / troca de credencial)."""
+    with _lock:
+        for sdk in _clientes.values():
+            try:
+                sdk.http_client._session.close()
+            except Exception:
+                pass
+        _clientes.clear()
+        _stats["pool_hit"] = 0
+        _stats["pool_miss"] = 0
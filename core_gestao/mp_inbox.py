@@ -0,0 +1,161 @@
+"""Caixa de entrada de webhooks Mercado Pago (gravação rápida + processamento em lote)."""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+
+from .licenca_rinan import rinan_mp_configurado
+from .models import Fatura, NotificacaoMP, PagamentoMPProcessado
+from .mp_gateway import mp_call, mp_sdk
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 5
+
+# Status em que o pagamento não muda mais para as regras da clínica/licença
+STATUS_FINAIS = ("approved", "rejected", "cancelled", "canceled", "refunded", "charged_back")
+
+
+def _dedup_ttl():
+    try:
+        return timedelta(days=max(1, int(getattr(settings, "MERCADO_PAGO_DEDUP_TTL_DIAS", 30))))
+    except (TypeError, ValueError):
+        return timedelta(days=30)
+
+
+def pagamento_ja_finalizado(conta: str, payment_id) -> bool:
+    """
+    True se o payment_id já foi processado em status final (índice válido).
+    Cada acerto conta uma consulta ao MP evitada.
+    """
+    evitadas = PagamentoMPProcessado.objects.filter(
+        conta=conta,
+        payment_id=str(payment_id)[:100],
+        status__in=STATUS_FINAIS,
+        expira_em__gt=timezone.now(),
+    ).update(repeticoes=F("repeticoes") + 1)
+    return evitadas > 0
+
+
+def marcar_pagamento_processado(conta: str, payment_id, status: str | None) -> None:
+    if status not in STATUS_FINAIS:
+        return
+    try:
+        PagamentoMPProcessado.objects.get_or_create(
+            conta=conta,
+            payment_id=str(payment_id)[:100],
+            status=status,
+            defaults={"expira_em": timezone.now() + _dedup_ttl()},
+        )
+    except IntegrityError:
+        pass
+
+
+def limpar_pagamentos_expirados() -> int:
+    apagados, _ = PagamentoMPProcessado.objects.filter(expira_em__lte=timezone.now()).delete()
+    return apagados
+
+
+def estatisticas_dedup() -> dict:
+    agg = PagamentoMPProcessado.objects.aggregate(
+        pagamentos=Count("id"), chamadas_evitadas=Sum("repeticoes")
+    )
+    return {
+        "pagamentos_indexados": agg["pagamentos"] or 0,
+        "chamadas_mp_evitadas": agg["chamadas_evitadas"] or 0,
+    }
+
+
+def registrar_notificacao(conta: str, payment_id) -> NotificacaoMP | None:
+    """
+    Grava a notificação para o worker; o webhook responde 200 logo em seguida.
+    Repetição de pagamento já finalizado não entra na fila (retorna None).
+    """
+    if pagamento_ja_finalizado(conta, payment_id):
+        return None
+    return NotificacaoMP.objects.create(conta=conta, payment_id=str(payment_id)[:100])
+
+
+def _consultar_pagamento(conta: str, payment_id: str) -> dict | None:
+    if conta == "RINAN":
+        token = (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip()
+        sdk = mp_sdk(token)
+    else:
+        sdk = mp_sdk()
+    payment_info = mp_call(sdk.payment().get, payment_id)
+    if payment_info.get("status") != 200:
+        return None
+    return payment_info.get("response") or {}
+
+
+def _aplicar_pagamento(conta: str, payment_id: str, resposta: dict) -> None:
+    # Import tardio: as regras de confirmação vivem nas views (mesmo fluxo do checkout).
+    from .views import _confirmar_fatura_paga, _confirmar_licenca_por_pagamento_mp
+
+    if conta == "RINAN":
+        _confirmar_licenca_por_pagamento_mp(payment_id, resposta)
+        return
+    if resposta.get("status") != "approved":
+        return
+    fatura_id = str(resposta.get("external_reference") or "").strip()
+    if not fatura_id.isdigit():
+        return
+    fatura = Fatura.objects.filter(id=fatura_id).first()
+    if fatura and fatura.status == "PENDENTE":
+        _confirmar_fatura_paga(fatura, payment_id, resposta.get("transaction_amount"))
+
+
+def processar_inbox(lote: int = 100) -> dict:
+    """
+    Processa até ``lote`` notificações pendentes. Repetições do mesmo
+    (conta, payment_id) no lote viram uma única consulta ao Mercado Pago.
+    """
+    pendentes = list(
+        NotificacaoMP.objects.filter(status="PENDENTE").order_by("id")[:lote]
+    )
+    grupos: dict[tuple[str, str], list[NotificacaoMP]] = {}
+    for n in pendentes:
+        grupos.setdefault((n.conta, n.payment_id), []).append(n)
+
+    resumo = {
+        "notificacoes": len(pendentes),
+        "pagamentos": len(grupos),
+        "erros": 0,
+        "evitados": 0,
+    }
+    for (conta, payment_id), itens in grupos.items():
+        ids = [n.id for n in itens]
+        erro = ""
+        try:
+            if pagamento_ja_finalizado(conta, payment_id):
+                resumo["evitados"] += 1
+            elif conta == "RINAN" and not rinan_mp_configurado():
+                pass
+            else:
+                resposta = _consultar_pagamento(conta, payment_id)
+                if resposta is None:
+                    erro = "Mercado Pago indisponível ao consultar o pagamento."
+                else:
+                    _aplicar_pagamento(conta, payment_id, resposta)
+                    marcar_pagamento_processado(conta, payment_id, resposta.get("status"))
+        except Exception as exc:
+            logger.exception("Inbox MP: falha ao processar %s/%s", conta, payment_id)
+            erro = str(exc)[:255] or exc.__class__.__name__
+
+        agora = timezone.now()
+        if not erro:
+            NotificacaoMP.objects.filter(id__in=ids).update(
+                status="PROCESSADO", processado_em=agora, erro=""
+            )
+            continue
+        resumo["erros"] += 1
+        tentativas = max(n.tentativas for n in itens) + 1
+        NotificacaoMP.objects.filter(id__in=ids).update(
+            tentativas=tentativas,
+            erro=erro,
+            status="ERRO" if tentativas >= MAX_TENTATIVAS else "PENDENTE",
+        )
+    return resumo
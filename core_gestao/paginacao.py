@@ -0,0 +1,91 @@
+"""
+Paginação por cursor (keyset) das listagens de pacientes.
+
+A página seguinte parte do último (data_cadastro, id) visto, em vez de OFFSET:
+o custo é o mesmo na primeira e na milésima página. O total exibido é uma
+contagem em cache (curta, descartada quando um paciente muda), não um
+COUNT(*) por request.
+"""
+import base64
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .cache_utils import CACHE_PACIENTES
+from .models import Paciente
+
+TAMANHO_PAGINA = 50
+TAMANHO_MAXIMO = 200
+CONTAGEM_CACHE_TTL = 300
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+_MICRO = timedelta(microseconds=1)
+
+
+def codificar_cursor(data_cadastro, pk) -> str:
+    micros = (data_cadastro - _EPOCA) // _MICRO
+    return base64.urlsafe_b64encode(f"{micros}:{pk}".encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str | None):
+    """(data_cadastro, id) ou None para cursor ausente/inválido (volta à 1ª página)."""
+    if not cursor:
+        return None
+    try:
+        bruto = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        micros, pk = bruto.split(":")
+        return _EPOCA + int(micros) * _MICRO, int(pk)
+    except (ValueError, UnicodeDecodeError, OverflowError):
+        return None
+
+
+def com_dependentes(queryset):
+    """``plano`` no mesmo SELECT e total de dependentes por subconsulta indexada."""
+    dependentes = (
+        Paciente.objects.filter(responsavel=OuterRef("pk"))
+        .order_by()
+        .values("responsavel")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return queryset.select_related("plano").annotate(
+        qtd_dependentes=Coalesce(Subquery(dependentes, output_field=IntegerField()), Value(0))
+    )
+
+
+def pagina_keyset(queryset, cursor: str | None = None, tamanho: int = TAMANHO_PAGINA) -> dict:
+    """Itens mais recentes primeiro; ``proximo_cursor`` None na última página."""
+    try:
+        tamanho = max(1, min(int(tamanho), TAMANHO_MAXIMO))
+    except (TypeError, ValueError):
+        tamanho = TAMANHO_PAGINA
+    posicao = decodificar_cursor(cursor)
+    if posicao:
+        data, pk = posicao
+        queryset = queryset.filter(Q(data_cadastro__lt=data) | Q(data_cadastro=data, id__lt=pk))
+    itens = list(queryset.order_by("-data_cadastro", "-id")[: tamanho + 1])
+    proximo = None
+    if len(itens) > tamanho:
+        itens = itens[:tamanho]
+        proximo = codificar_cursor(itens[-1].data_cadastro, itens[-1].pk)
+    return {"itens": itens, "proximo_cursor": proximo}
+
+
+def contagem_estimada(queryset, ttl: int = CONTAGEM_CACHE_TTL) -> int:
+    """COUNT(*) do filtro guardado por alguns minutos (chave = SQL da consulta)."""
+    sql = str(queryset.order_by().query)
+    chave = "contagem:" + hashlib.sha1(sql.encode()).hexdigest()
+    return CACHE_PACIENTES.get_or_set(chave, queryset.order_by().count, ttl)
+
+
+def paciente_para_json(p) -> dict:
+    return {
+        "id": p.id,
+        "nome_completo": p.nome_completo,
+        "cpf": p.cpf,
+        "plano": p.plano.nome if p.plano else None,
+        "vencimento_plano": p.vencimento_plano.isoformat() if p.vencimento_plano else None,
+        "qtd_dependentes": getattr(p, "qtd_dependentes", None),
+        "data_cadastro": p.data_cadastro.isoformat(),
+    }
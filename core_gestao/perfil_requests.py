@@ -0,0 +1,240 @@
+"""
+Perfil por request (opt-in): consultas SQL, tempo de banco, templates e HTTP externo.
+
+Com ``PERFIL_REQUESTS`` ligado, ``PerfilRequestsMiddleware`` mede cada request
+e guarda, por nome de rota, as últimas ``PERFIL_JANELA`` amostras deste
+processo (cada worker do gunicorn tem a sua janela). ``api_perfil`` (master)
+mostra percentis, histograma de latência e as consultas repetidas no mesmo
+request (suspeitas de N+1). Requests acima de ``PERFIL_LENTO_MS`` vão para o
+log. O tempo medido vai até a view devolver a resposta; o corpo de respostas
+em streaming não entra.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from math import ceil
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+BALDES_MS = (50, 100, 250, 500, 1000, 2500, 5000)
+MAX_IMPRESSOES = 200  # consultas repetidas guardadas por rota
+SEM_ROTA = "<sem rota>"
+
+_atual = ContextVar("perfil_medicao", default=None)
+_lock = threading.Lock()
+_rotas = {}
+
+_RE_IN = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+_RE_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_RE_NUMERO = re.compile(r"\b\d+\b")
+_RE_ESPACO = re.compile(r"\s+")
+
+
+def impressao_sql(sql: str) -> str:
+    """SQL sem valores: consultas que só mudam os parâmetros têm a mesma impressão."""
+    sql = _RE_ESPACO.sub(" ", sql).strip()
+    sql = _RE_IN.sub("IN (...)", sql)
+    sql = _RE_TEXTO.sub("?", sql)
+    return _RE_NUMERO.sub("?", sql)
+
+
+class _Medicao:
+    __slots__ = ("consultas", "db", "template", "http", "impressoes")
+
+    def __init__(self):
+        self.consultas = 0
+        self.db = 0.0
+        self.template = 0.0
+        self.http = {}
+        self.impressoes = Counter()
+
+
+def _medir_sql(execute, sql, params, many, context):
+    medicao = _atual.get()
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if medicao is not None:
+            medicao.consultas += 1
+            medicao.db += time.perf_counter() - inicio
+            medicao.impressoes[impressao_sql(sql)] += 1
+
+
+@contextmanager
+def medir_http(servico: str):
+    """Soma a duração do bloco no HTTP externo do request em medição (se houver)."""
+    medicao = _atual.get()
+    if medicao is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.http[servico] = medicao.http.get(servico, 0.0) + time.perf_counter() - inicio
+
+
+def _instrumentar_templates() -> None:
+    # render() dos templates do backend Django (includes internos não passam aqui)
+    from django.template.backends.django import Template
+
+    if getattr(Template.render, "_perfil", False):
+        return
+    original = Template.render
+
+    @wraps(original)
+    def render(self, context=None, request=None):
+        medicao = _atual.get()
+        if medicao is None:
+            return original(self, context, request)
+        inicio = time.perf_counter()
+        try:
+            return original(self, context, request)
+        finally:
+            medicao.template += time.perf_counter() - inicio
+
+    render._perfil = True
+    Template.render = render
+
+
+def registrar(rota: str, ms: float, medicao: _Medicao) -> None:
+    repetidas = {sql: n for sql, n in medicao.impressoes.items() if n > 1}
+    amostra = (
+        ms,
+        medicao.consultas,
+        medicao.db * 1000,
+        medicao.template * 1000,
+        {servico: s * 1000 for servico, s in medicao.http.items()},
+    )
+    with _lock:
+        dados = _rotas.get(rota)
+        if dados is None:
+            dados = _rotas[rota] = {
+                "requests": 0,
+                "amostras": deque(maxlen=settings.PERFIL_JANELA),
+                "repetidas": Counter(),
+                "max_repeticoes": {},
+            }
+        dados["requests"] += 1
+        dados["amostras"].append(amostra)
+        for sql, n in repetidas.items():
+            dados["repetidas"][sql] += 1
+            dados["max_repeticoes"][sql] = max(n, dados["max_repeticoes"].get(sql, 0))
+        if len(dados["repetidas"]) > MAX_IMPRESSOES:
+            mantidas = dict(dados["repetidas"].most_common(MAX_IMPRESSOES // 2))
+            dados["repetidas"] = Counter(mantidas)
+            dados["max_repeticoes"] = {sql: dados["max_repeticoes"][sql] for sql in mantidas}
+    if ms >= settings.PERFIL_LENTO_MS:
+        logger.warning(
+            "Request lento %s: %.0f ms, %d consultas (%.0f ms no banco), template %.0f ms, "
+            "HTTP externo %s; repetidas: %s",
+            rota,
+            ms,
+            medicao.consultas,
+            amostra[2],
+            amostra[3],
+            {servico: round(v) for servico, v in amostra[4].items()} or "-",
+            sorted(repetidas.items(), key=lambda item: -item[1])[:3] or "-",
+        )
+
+
+def _percentil(valores: list, p: float):
+    return valores[max(0, ceil(p * len(valores)) - 1)]
+
+
+def _resumo(dados: dict) -> dict:
+    amostras = list(dados["amostras"])
+    ms = sorted(a[0] for a in amostras)
+    consultas = sorted(a[1] for a in amostras)
+    db = sorted(a[2] for a in amostras)
+    template = sorted(a[3] for a in amostras)
+    http = {}
+    for a in amostras:
+        for servico, v in a[4].items():
+            http.setdefault(servico, []).append(v)
+    histograma = {str(limite): 0 for limite in BALDES_MS}
+    histograma["+Inf"] = 0
+    for v in ms:
+        balde = next((str(limite) for limite in BALDES_MS if v <= limite), "+Inf")
+        histograma[balde] += 1
+    n = len(amostras)
+    return {
+        "requests": dados["requests"],
+        "amostras": n,
+        "ms": {
+            "p50": round(_percentil(ms, 0.5), 1),
+            "p95": round(_percentil(ms, 0.95), 1),
+            "p99": round(_percentil(ms, 0.99), 1),
+            "max": round(ms[-1], 1),
+        },
+        "consultas": {
+            "media": round(sum(consultas) / n, 1),
+            "p95": _percentil(consultas, 0.95),
+            "max": consultas[-1],
+        },
+        "db_ms": {"media": round(sum(db) / n, 1), "p95": round(_percentil(db, 0.95), 1)},
+        "template_ms": {"media": round(sum(template) / n, 1), "p95": round(_percentil(template, 0.95), 1)},
+        "http_ms": {
+            servico: {"requests": len(v), "media": round(sum(v) / len(v), 1), "max": round(max(v), 1)}
+            for servico, v in http.items()
+        },
+        "histograma_ms": histograma,
+        "consultas_repetidas": [
+            {"sql": sql, "requests": qtd, "max_por_request": dados["max_repeticoes"][sql]}
+            for sql, qtd in dados["repetidas"].most_common(5)
+        ],
+    }
+
+
+def estatisticas_perfil() -> dict:
+    """Resumo por rota deste processo, das rotas mais lentas (p95) para as mais rápidas."""
+    with _lock:
+        rotas = {rota: _resumo(dados) for rota, dados in _rotas.items() if dados["amostras"]}
+    return {
+        "ativo": bool(getattr(settings, "PERFIL_REQUESTS", False)),
+        "pid": os.getpid(),
+        "janela": settings.PERFIL_JANELA,
+        "lento_ms": settings.PERFIL_LENTO_MS,
+        "rotas": dict(sorted(rotas.items(), key=lambda item: -item[1]["ms"]["p95"])),
+    }
+
+
+def zerar_perfil() -> None:
+    with _lock:
+        _rotas.clear()
+
+
+class PerfilRequestsMiddleware:
+    """Mede cada request (SQL, templates, HTTP externo); fora do ar sem PERFIL_REQUESTS."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PERFIL_REQUESTS", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _instrumentar_templates()
+
+    def __call__(self, request):
+        medicao = _Medicao()
+        token = _atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pilha:
+                for conexao in connections.all():
+                    pilha.enter_context(conexao.execute_wrapper(_medir_sql))
+                response = self.get_response(request)
+        finally:
+            _atual.reset(token)
+        rota = getattr(getattr(request, "resolver_match", None), "view_name", None) or SEM_ROTA
+        registrar(rota, (time.perf_counter() - inicio) * 1000, medicao)
+        return response
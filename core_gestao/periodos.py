@@ -0,0 +1,23 @@
+"""
+Limites de mês para filtros por faixa (``>= início`` e ``< início do mês
+seguinte``): ao contrário de ``__month``/``__year``, usam o índice da coluna.
+"""
+from datetime import date, datetime, time
+
+from django.utils import timezone
+
+
+def intervalo_mes(ano: int, mes: int) -> tuple[date, date]:
+    """(primeiro dia do mês, primeiro dia do mês seguinte)."""
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+
+def intervalo_mes_local(ano: int, mes: int) -> tuple[datetime, datetime]:
+    """Mesmo intervalo em datetimes do fuso local (equivale a ``__month`` em DateTimeField)."""
+    inicio, fim = intervalo_mes(ano, mes)
+    return (
+        timezone.make_aware(datetime.combine(inicio, time.min)),
+        timezone.make_aware(datetime.combine(fim, time.min)),
+    )
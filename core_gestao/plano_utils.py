@@ -1,11 +1,14 @@
 """Regras de plano, checkout e descontos — Ultramed."""
+import hashlib
 import re
 import unicodedata
+from functools import lru_cache
 
 from django.core import signing
 from django.utils import timezone
 
 from core_gestao.models import Plano, Prontuario
+from core_gestao.periodos import intervalo_mes_local
 from core_gestao.procedimentos_catalogo import (
     cobertura_catalogo,
     procedimento_por_id,
@@ -15,6 +18,7 @@ CHECKOUT_SALT = "ultramed-checkout-v1"
 CHECKOUT_MAX_AGE = 86400 * 2  # 48h
 CARTEIRINHA_SALT = "ultramed-carteirinha-v1"
 CARTEIRINHA_MAX_AGE = 86400 * 400  # ~13 meses
+LOGIN_POS_PAGAMENTO_SALT = "ultramed-login-pos-pagamento-v1"
 
 PLANO_TIPO_MAP = {
     "essencial": "ESSENCIAL",
@@ -101,6 +105,9 @@ PROCEDIMENTOS_LAB_ROTINA = (
     "rotina",
 )
 
+# Master/Empresarial clínico: montado uma vez (antes era concatenado a cada avaliação)
+PROCEDIMENTOS_MASTER_BASE = PROCEDIMENTOS_ESSENCIAL + PROCEDIMENTOS_MASTER_EXTRA
+
 RESUMO_PROCEDIMENTOS_PLANO = {
     "ESSENCIAL": [
         "Ultrassonografia (USG)",
@@ -128,6 +135,7 @@ def normalizar_cpf(cpf: str) -> str:
     return re.sub(r"\D", "", str(cpf or ""))
 
 
+@lru_cache(maxsize=2048)
 def _normalizar_procedimento(nome: str | None) -> str:
     if not nome:
         return ""
@@ -136,8 +144,18 @@ def _normalizar_procedimento(nome: str | None) -> str:
     return re.sub(r"\s+", " ", texto).strip()
 
 
+@lru_cache(maxsize=None)
+def _matcher(termos: tuple[str, ...]):
+    """Uma alternação compilada por lista de termos: search == any(termo in nome)."""
+    if not termos:
+        return None
+    alternativas = sorted(set(termos), key=len, reverse=True)
+    return re.compile("|".join(re.escape(t) for t in alternativas))
+
+
 def _contem_termo(nome: str, termos: tuple[str, ...]) -> bool:
-    return any(termo in nome for termo in termos)
+    matcher = _matcher(termos)
+    return bool(matcher and matcher.search(nome))
 
 
 def _nome_procedimento(nome: str | None, tipo_agenda: str | None) -> str:
@@ -152,6 +170,7 @@ def _eh_laboratorial_rotina(nome: str) -> bool:
     return _contem_termo(nome, PROCEDIMENTOS_LAB_ROTINA)
 
 
+@lru_cache(maxsize=4096)
 def _cobertura_por_plano(plano_nome: str, nome: str, tipo_agenda: str | None) -> tuple[bool, str]:
     plano = (plano_nome or "").upper()
     if not nome and (tipo_agenda or "").upper() != "CONSULTA":
@@ -162,7 +181,7 @@ def _cobertura_por_plano(plano_nome: str, nome: str, tipo_agenda: str | None) ->
             return True, "essencial"
         return False, ""
 
-    base = PROCEDIMENTOS_ESSENCIAL + PROCEDIMENTOS_MASTER_EXTRA
+    base = PROCEDIMENTOS_MASTER_BASE
     if "MASTER" in plano:
         if (tipo_agenda or "").upper() == "CONSULTA" or _contem_termo(nome, base):
             return True, "master"
@@ -187,6 +206,15 @@ def procedimento_coberto_pelo_plano(
     return _cobertura_por_plano(plano_nome, nome, tipo_agenda)
 
 
+def _aquecer_matchers() -> None:
+    """Compila as alternações na importação (primeira avaliação sem custo extra)."""
+    for termos in (PROCEDIMENTOS_ESSENCIAL, PROCEDIMENTOS_MASTER_BASE, PROCEDIMENTOS_LAB_ROTINA):
+        _matcher(termos)
+
+
+_aquecer_matchers()
+
+
 def procedimentos_resumo_plano(plano_nome: str) -> list[str]:
     plano = (plano_nome or "").upper()
     for chave, itens in RESUMO_PROCEDIMENTOS_PLANO.items():
@@ -209,8 +237,14 @@ def avaliar_desconto_procedimento(
     nome_procedimento: str | None = None,
     tipo_agenda: str | None = None,
     procedimento_id: str | None = None,
+    ja_usou_mes: bool | None = None,
 ) -> dict:
-    """Avalia cobertura e percentual de desconto para um procedimento."""
+    """
+    Avalia cobertura e percentual de desconto para um procedimento.
+
+    ``ja_usou_mes`` (atendimento do paciente no mês corrente) pode vir pronto
+    de uma avaliação em lote; None consulta o prontuário quando necessário.
+    """
     proc_catalogo = procedimento_por_id(procedimento_id)
 
     if not _plano_ativo(paciente):
@@ -249,7 +283,7 @@ def avaliar_desconto_procedimento(
             "procedimento_nome": nome_exib,
         }
 
-    percentual = _percentual_por_categoria(paciente, plano_nome, categoria)
+    percentual = _percentual_por_categoria(paciente, plano_nome, categoria, ja_usou_mes)
     return {
         "percentual": percentual,
         "coberto": True,
@@ -262,21 +296,62 @@ def avaliar_desconto_procedimento(
     }
 
 
-def _percentual_por_categoria(paciente, plano_nome: str, categoria: str) -> float:
+def _atendimentos_do_mes():
+    hoje = timezone.now().date()
+    inicio, fim = intervalo_mes_local(hoje.year, hoje.month)
+    return Prontuario.objects.filter(data_atendimento__gte=inicio, data_atendimento__lt=fim)
+
+
+def pacientes_com_atendimento_no_mes(paciente_ids) -> set[int]:
+    """Ids (entre ``paciente_ids``) com prontuário no mês corrente — uma consulta."""
+    ids = {int(i) for i in paciente_ids}
+    if not ids:
+        return set()
+    return set(
+        _atendimentos_do_mes()
+        .filter(paciente_id__in=ids)
+        .order_by()
+        .values_list("paciente_id", flat=True)
+        .distinct()
+    )
+
+
+def _percentual_por_categoria(
+    paciente, plano_nome: str, categoria: str, ja_usou_mes: bool | None = None
+) -> float:
     plano = (plano_nome or "").upper()
     if categoria == "lab_rotina":
         return 0.40
     if "ESSENCIAL" in plano:
-        hoje = timezone.now().date()
-        ja_usou = Prontuario.objects.filter(
-            paciente=paciente,
-            data_atendimento__month=hoje.month,
-            data_atendimento__year=hoje.year,
-        ).exists()
-        return 0.20 if ja_usou else 0.30
+        if ja_usou_mes is None:
+            ja_usou_mes = _atendimentos_do_mes().filter(paciente=paciente).exists()
+        return 0.20 if ja_usou_mes else 0.30
     return 0.30
 
 
+def avaliar_descontos_em_lote(pacientes, procedimento_ids) -> list[dict]:
+    """
+    Avalia todos os pares (paciente, procedimento) de uma vez — um paciente e
+    vários procedimentos na agenda, ou vários pacientes e um procedimento.
+
+    O uso no mês (regra do Essencial) é resolvido numa única consulta para
+    todos os pacientes com plano ativo; cada item traz ``paciente_id``.
+    """
+    pacientes = list(pacientes)
+    ativos = [p.id for p in pacientes if _plano_ativo(p)]
+    usaram = pacientes_com_atendimento_no_mes(ativos)
+    resultados = []
+    for paciente in pacientes:
+        ja_usou = paciente.id in usaram
+        for procedimento_id in procedimento_ids:
+            info = avaliar_desconto_procedimento(
+                paciente, procedimento_id=procedimento_id, ja_usou_mes=ja_usou
+            )
+            info["paciente_id"] = paciente.id
+            resultados.append(info)
+    return resultados
+
+
 def percentual_desconto(
     paciente,
     tipo_procedimento: str | None = None,
@@ -412,6 +487,34 @@ def validar_checkout_token(token: str, fatura_id: int, paciente_id: int | None =
         return False
 
 
+def _digest_checkout(checkout_token: str) -> str:
+    return hashlib.sha256((checkout_token or "").encode()).hexdigest()[:32]
+
+
+def gerar_grant_login_pos_pagamento(fatura_id: int, user_id: int, checkout_token: str) -> str:
+    """
+    Resultado assinado da checagem de senha pós-pagamento (``user_id`` 0 = negado),
+    preso à fatura e ao token de checkout. Fica só na sessão do navegador.
+    """
+    return signing.dumps(
+        {"f": int(fatura_id), "u": int(user_id), "t": _digest_checkout(checkout_token)},
+        salt=LOGIN_POS_PAGAMENTO_SALT,
+    )
+
+
+def ler_grant_login_pos_pagamento(grant: str | None, fatura_id: int, checkout_token: str) -> int | None:
+    """user_id concedido (0 se negado) ou None se não há grant válido para este checkout."""
+    if not grant:
+        return None
+    try:
+        data = signing.loads(grant, salt=LOGIN_POS_PAGAMENTO_SALT, max_age=CHECKOUT_MAX_AGE)
+        if int(data.get("f")) != int(fatura_id) or data.get("t") != _digest_checkout(checkout_token):
+            return None
+        return int(data.get("u"))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
 def calcular_valor_com_desconto(
     paciente,
     valor_base,
@@ -12,6 +12,42 @@ class ProcedimentoItem(TypedDict):
     tipo: str  # CONSULTA | EXAME
     categoria: str  # essencial | master_clinico | lab_rotina
     planos: list[str]
+    recurso: str  # chave de RECURSOS (sala que o procedimento ocupa)
+    duracao_min: int
+
+
+# Salas da clínica e quantos atendimentos cada uma comporta ao mesmo tempo
+# (capacidade ajustável por AGENDA_CAPACIDADES, ver core_gestao/agendamento.py).
+RECURSOS: dict[str, dict] = {
+    "consultorio": {"nome": "Consultório", "capacidade": 2},
+    "ultrassom": {"nome": "Sala de ultrassom", "capacidade": 1},
+    "cardiologia": {"nome": "Sala de ECG / espirometria", "capacidade": 1},
+    "coleta": {"nome": "Sala de coleta", "capacidade": 3},
+    "procedimentos": {"nome": "Sala de procedimentos", "capacidade": 1},
+}
+
+# Sala e duração padrão de cada grupo; exceções por procedimento abaixo
+_AGENDA_POR_GRUPO: dict[str, tuple[str, int]] = {
+    "Consultas": ("consultorio", 20),
+    "Ultrassonografia": ("ultrassom", 20),
+    "Cardiologia": ("cardiologia", 15),
+    "Laboratorial de rotina": ("coleta", 10),
+    "Procedimentos avançados": ("procedimentos", 40),
+}
+
+_DURACAO_MIN: dict[str, int] = {
+    "consulta_retorno": 15,
+    "usg_morfologica": 40,
+    "usg_obstetrica": 30,
+    "usg_doppler_obstetrico": 30,
+    "mapa_24h": 20,
+    "holter_24h": 20,
+    "espirometria": 30,
+    "endoscopia_digestiva": 45,
+    "paaf_biopsia": 30,
+    "eeg": 60,
+    "polissonografia": 60,
+}
 
 
 CATALOGO_PROCEDIMENTOS: list[ProcedimentoItem] = [
@@ -278,6 +314,11 @@ CATALOGO_PROCEDIMENTOS: list[ProcedimentoItem] = [
     },
 ]
 
+for _item in CATALOGO_PROCEDIMENTOS:
+    _item["recurso"] = _AGENDA_POR_GRUPO[_item["grupo"]][0]
+    _item["duracao_min"] = _DURACAO_MIN.get(_item["id"], _AGENDA_POR_GRUPO[_item["grupo"]][1])
+del _item
+
 _CATALOGO_MAP: dict[str, ProcedimentoItem] = {p["id"]: p for p in CATALOGO_PROCEDIMENTOS}
 
 
@@ -1,26 +1,198 @@
-"""Rate limiting simples por IP (cache Django)."""
-from django.core.cache import cache
-from django.http import JsonResponse
+"""
+Rate limiting compartilhado entre os workers (tabelas no banco, sem serviço externo).
 
+- Janela deslizante: contador por (chave, janela fixa) incrementado com UPDATE
+  atômico; a estimativa soma a janela atual e a fração ainda coberta da anterior.
+- Token bucket: saldo por chave reposto continuamente, criado com
+  ``INSERT IGNORE`` e lido sob ``select_for_update`` (permite rajadas curtas
+  até a capacidade).
 
-def rate_limit_ip(request, key_prefix: str, limit: int = 15, period: int = 3600) -> bool:
-    ip = (
-        request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip()
+Uso nas views: ``@rate_limit("login", limite=10, periodo=300, algoritmo=TOKEN_BUCKET)``.
+"""
+import logging
+import math
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import RateLimitBalde, RateLimitJanela
+
+logger = logging.getLogger(__name__)
+
+JANELA_DESLIZANTE = "janela"
+TOKEN_BUCKET = "balde"
+
+MENSAGEM_429 = "Muitas tentativas. Tente novamente mais tarde."
+
+
+def ip_cliente(request) -> str:
+    """IP real atrás do nginx (X-Real-IP é sobrescrito pelo proxy)."""
+    return (
+        request.META.get("HTTP_X_REAL_IP", "").strip()
+        or request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")[0].strip()
         or request.META.get("REMOTE_ADDR")
         or "unknown"
     )
-    key = f"rl:{key_prefix}:{ip}"
-    count = cache.get(key, 0)
-    if count >= limit:
-        return False
-    cache.set(key, count + 1, period)
-    return True
-
-
-def rate_limit_or_429(request, key_prefix: str, limit: int = 15, period: int = 3600):
-    if rate_limit_ip(request, key_prefix, limit, period):
-        return None
-    return JsonResponse(
-        {"success": False, "detail": "Muitas tentativas. Tente novamente mais tarde."},
-        status=429,
+
+
+def _expira(segundos: float):
+    return timezone.now() + timedelta(seconds=segundos)
+
+
+def _incrementar_janela(chave: str, regra: str, inicio: int, periodo: int) -> None:
+    filtro = RateLimitJanela.objects.filter(chave=chave, inicio=inicio)
+    if filtro.update(permitidos=F("permitidos") + 1):
+        return
+    try:
+        with transaction.atomic():
+            RateLimitJanela.objects.create(
+                regra=regra,
+                chave=chave,
+                inicio=inicio,
+                permitidos=1,
+                expira_em=_expira(2 * periodo),
+            )
+    except IntegrityError:
+        # Outro worker criou a mesma janela no meio tempo
+        filtro.update(permitidos=F("permitidos") + 1)
+
+
+def janela_deslizante(chave: str, regra: str, limite: int, periodo: int) -> bool:
+    """
+    Conta a tentativa e devolve se cabe no limite. Tentativas bloqueadas não
+    consomem cota (são desfeitas e contadas em ``bloqueados``).
+    """
+    agora = time.time()
+    inicio = int(agora // periodo) * periodo
+    _incrementar_janela(chave, regra, inicio, periodo)
+    contagens = dict(
+        RateLimitJanela.objects.filter(
+            chave=chave, inicio__in=(inicio, inicio - periodo)
+        ).values_list("inicio", "permitidos")
+    )
+    cobertura_anterior = 1 - (agora - inicio) / periodo
+    estimado = contagens.get(inicio, 0) + contagens.get(inicio - periodo, 0) * cobertura_anterior
+    if estimado <= limite:
+        return True
+    RateLimitJanela.objects.filter(chave=chave, inicio=inicio).update(
+        permitidos=F("permitidos") - 1, bloqueados=F("bloqueados") + 1
+    )
+    return False
+
+
+def token_bucket(chave: str, regra: str, capacidade: int, periodo: int) -> bool:
+    """Capacidade ``capacidade`` reposta integralmente a cada ``periodo`` segundos."""
+    agora = time.time()
+    taxa = capacidade / periodo
+    with transaction.atomic():
+        # Cria sem leitura travada: o get_or_create com select_for_update de uma
+        # chave nova deixa dois workers com gap lock no índice único e o MariaDB
+        # aborta um deles com deadlock
+        RateLimitBalde.objects.bulk_create(
+            [
+                RateLimitBalde(
+                    regra=regra,
+                    chave=chave,
+                    tokens=capacidade,
+                    atualizado_em=agora,
+                    expira_em=_expira(periodo),
+                )
+            ],
+            ignore_conflicts=True,
+        )
+        balde = RateLimitBalde.objects.select_for_update().get(chave=chave)
+        tokens = min(capacidade, balde.tokens + max(0.0, agora - balde.atualizado_em) * taxa)
+        permitido = tokens >= 1
+        if permitido:
+            tokens -= 1
+            balde.permitidos = F("permitidos") + 1
+        else:
+            balde.bloqueados = F("bloqueados") + 1
+        balde.tokens = tokens
+        balde.atualizado_em = agora
+        # Depois de cheio de novo, o registro não guarda informação útil
+        balde.expira_em = _expira((capacidade - tokens) / taxa + periodo)
+        balde.save(update_fields=["tokens", "atualizado_em", "permitidos", "bloqueados", "expira_em"])
+    return permitido
+
+
+def permitir(chave: str, regra: str, limite: int, periodo: int, algoritmo: str = JANELA_DESLIZANTE) -> bool:
+    if algoritmo == TOKEN_BUCKET:
+        return token_bucket(chave, regra, limite, periodo)
+    return janela_deslizante(chave, regra, limite, periodo)
+
+
+def _resposta_429(request, periodo: int):
+    aceita_json = (
+        "application/json" in (request.headers.get("Accept") or "")
+        or "application/json" in (request.content_type or "")
+        or request.headers.get("X-Requested-With") == "XMLHttpRequest"
     )
+    if aceita_json:
+        resposta = JsonResponse({"success": False, "detail": MENSAGEM_429}, status=429)
+    else:
+        resposta = HttpResponse(MENSAGEM_429, status=429, content_type="text/plain; charset=utf-8")
+    resposta["Retry-After"] = str(max(1, math.ceil(periodo / 10)))
+    return resposta
+
+
+def rate_limit(
+    regra: str,
+    limite: int,
+    periodo: int,
+    algoritmo: str = JANELA_DESLIZANTE,
+    metodos=("POST",),
+    chave=ip_cliente,
+):
+    """
+    Limita a view por ``chave(request)`` (IP por padrão) nos ``metodos``
+    indicados; acima do limite responde 429 (JSON para chamadas de API).
+    """
+
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrap(request, *args, **kwargs):
+            if request.method in metodos:
+                identificador = f"{regra}:{chave(request)}"[:200]
+                if not permitir(identificador, regra, limite, periodo, algoritmo):
+                    logger.info("Rate limit %s excedido por %s", regra, identificador)
+                    return _resposta_429(request, periodo)
+            return view_func(request, *args, **kwargs)
+
+        return _wrap
+
+    return decorator
+
+
+def limpar_rate_limit_expirado() -> int:
+    agora = timezone.now()
+    janelas, _ = RateLimitJanela.objects.filter(expira_em__lte=agora).delete()
+    baldes, _ = RateLimitBalde.objects.filter(expira_em__lte=agora).delete()
+    return janelas + baldes
+
+
+def estatisticas_rate_limit(top: int = 10) -> dict:
+    """Permitidos/bloqueados por regra e as chaves mais bloqueadas (registros vigentes)."""
+    regras = {}
+    for modelo in (RateLimitJanela, RateLimitBalde):
+        for linha in modelo.objects.values("regra").annotate(
+            permitidos=Sum("permitidos"), bloqueados=Sum("bloqueados"), chaves=Count("chave", distinct=True)
+        ):
+            item = regras.setdefault(linha["regra"], {"permitidos": 0, "bloqueados": 0, "chaves": 0})
+            for campo in ("permitidos", "bloqueados", "chaves"):
+                item[campo] += linha[campo] or 0
+    bloqueadas = []
+    for modelo in (RateLimitJanela, RateLimitBalde):
+        bloqueadas += list(
+            modelo.objects.filter(bloqueados__gt=0)
+            .values("chave", "regra")
+            .annotate(total=Sum("bloqueados"))
+            .order_by("-total")[:top]
+        )
+    bloqueadas.sort(key=lambda b: b["total"], reverse=True)
+    return {"regras": regras, "mais_bloqueadas": bloqueadas[:top]}
@@ -0,0 +1,161 @@
+"""
+Receita mensal pré-calculada para o dashboard master.
+
+Cada fatura que vira PAGO soma seu valor na linha (ano, mês, método) de
+ReceitaMensal, na mesma transação que grava o pagamento. O dashboard lê uma
+linha por método do mês em vez de agregar Fatura a cada carga.
+``reconstruir_receita`` recalcula a partir das faturas (carga inicial,
+correções feitas pelo admin) e ``verificar_receita`` aponta divergências.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import Fatura, ReceitaMensal
+from .periodos import intervalo_mes
+
+
+def _decimal(valor) -> Decimal:
+    # Faturas recém-criadas guardam o valor como veio (str/float do formulário)
+    return Decimal(str(valor or 0)).quantize(Decimal("0.01"))
+
+
+def registrar_recebimento(fatura) -> None:
+    """Soma a fatura paga no mês de ``data_pagamento`` (chamar dentro da transação do pagamento)."""
+    if fatura.status != "PAGO" or not fatura.data_pagamento:
+        return
+    chave = {
+        "ano": fatura.data_pagamento.year,
+        "mes": fatura.data_pagamento.month,
+        "metodo_pagamento": fatura.metodo_pagamento or "",
+    }
+    valor = _decimal(fatura.valor)
+    filtro = ReceitaMensal.objects.filter(**chave)
+    incremento = {
+        "soma": F("soma") + valor,
+        "quantidade": F("quantidade") + 1,
+        "atualizado_em": timezone.now(),
+    }
+    if filtro.update(**incremento):
+        return
+    try:
+        with transaction.atomic():
+            ReceitaMensal.objects.create(**chave, soma=valor, quantidade=1)
+    except IntegrityError:
+        # Outro worker criou a linha do mês no meio tempo
+        filtro.update(**incremento)
+
+
+def marcar_fatura_paga(fatura, **campos) -> bool:
+    """
+    PENDENTE/ATRASADO -> PAGO só uma vez (UPDATE condicional) e soma na receita
+    do mês. Devolve False se a fatura já estava paga (webhook repetido, dois
+    cliques em "baixar"): nada é somado de novo.
+    """
+    campos.setdefault("data_pagamento", timezone.now().date())
+    with transaction.atomic():
+        marcou = (
+            Fatura.objects.filter(id=fatura.id)
+            .exclude(status="PAGO")
+            .update(status="PAGO", atualizado_em=timezone.now(), **campos)
+        )
+        fatura.refresh_from_db()
+        if marcou:
+            registrar_recebimento(fatura)
+    return bool(marcou)
+
+
+def resumo_mes(ano: int, mes: int) -> dict:
+    """Total, quantidade e linhas por método do mês (formato do dashboard)."""
+    por_metodo = [
+        {
+            "metodo_pagamento": linha.metodo_pagamento or None,
+            "subtotal": linha.soma,
+            "quantidade": linha.quantidade,
+        }
+        for linha in ReceitaMensal.objects.filter(ano=ano, mes=mes, quantidade__gt=0).order_by(
+            "metodo_pagamento"
+        )
+    ]
+    return {
+        "total": sum((r["subtotal"] for r in por_metodo), Decimal("0")),
+        "quantidade": sum(r["quantidade"] for r in por_metodo),
+        "por_metodo": por_metodo,
+    }
+
+
+def _agregar_faturas(ano: int | None = None, mes: int | None = None) -> dict:
+    """{(ano, mes, metodo): (soma, quantidade)} direto de Fatura."""
+    faturas = Fatura.objects.filter(status="PAGO", data_pagamento__isnull=False)
+    if ano and mes:
+        inicio, fim = intervalo_mes(ano, mes)
+        faturas = faturas.filter(data_pagamento__gte=inicio, data_pagamento__lt=fim)
+    elif ano:
+        faturas = faturas.filter(data_pagamento__gte=date(ano, 1, 1), data_pagamento__lt=date(ano + 1, 1, 1))
+    linhas = (
+        faturas.annotate(ano=ExtractYear("data_pagamento"), mes=ExtractMonth("data_pagamento"))
+        .values("ano", "mes", "metodo_pagamento")
+        .annotate(soma=Sum("valor"), quantidade=Count("id"))
+        .order_by()
+    )
+    totais = {}
+    for linha in linhas:
+        chave = (linha["ano"], linha["mes"], linha["metodo_pagamento"] or "")
+        soma, qtd = totais.get(chave, (Decimal("0"), 0))
+        totais[chave] = (soma + _decimal(linha["soma"]), qtd + linha["quantidade"])
+    return totais
+
+
+def _linhas_receita(ano: int | None = None, mes: int | None = None):
+    linhas = ReceitaMensal.objects.all()
+    if ano:
+        linhas = linhas.filter(ano=ano)
+    if mes:
+        linhas = linhas.filter(mes=mes)
+    return linhas
+
+
+def reconstruir_receita(ano: int | None = None, mes: int | None = None) -> int:
+    """Regrava as linhas do período (tudo, um ano ou um mês) a partir das faturas."""
+    totais = _agregar_faturas(ano, mes)
+    agora = timezone.now()
+    with transaction.atomic():
+        _linhas_receita(ano, mes).delete()
+        ReceitaMensal.objects.bulk_create(
+            [
+                ReceitaMensal(
+                    ano=a, mes=m, metodo_pagamento=metodo, soma=soma, quantidade=qtd, atualizado_em=agora
+                )
+                for (a, m, metodo), (soma, qtd) in sorted(totais.items())
+            ]
+        )
+    return len(totais)
+
+
+def verificar_receita(ano: int | None = None, mes: int | None = None) -> list[dict]:
+    """Linhas em que o agregado difere da soma das faturas (vazio = consistente)."""
+    esperado = _agregar_faturas(ano, mes)
+    registrado = {
+        (r.ano, r.mes, r.metodo_pagamento): (_decimal(r.soma), r.quantidade)
+        for r in _linhas_receita(ano, mes)
+    }
+    divergencias = []
+    for chave in sorted(set(esperado) | set(registrado)):
+        faturas = esperado.get(chave, (Decimal("0"), 0))
+        receita = registrado.get(chave, (Decimal("0"), 0))
+        if faturas != receita:
+            a, m, metodo = chave
+            divergencias.append(
+                {
+                    "ano": a,
+                    "mes": m,
+                    "metodo_pagamento": metodo or None,
+                    "faturas": {"soma": faturas[0], "quantidade": faturas[1]},
+                    "receita": {"soma": receita[0], "quantidade": receita[1]},
+                }
+            )
+    return divergencias
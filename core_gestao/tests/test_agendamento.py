@@ -0,0 +1,151 @@
+"""Motor da agenda: índice de intervalos, capacidade por sala, conflitos e horários livres."""
+
+import random
+from datetime import time, timedelta
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao.agendamento import HorarioIndisponivel, OcupacaoDia, agendar, horarios_livres
+from core_gestao.models import Agenda, AgendaRecursoDia, Fatura, Paciente
+
+AGENDA = {
+    "AGENDA_ABERTURA": "07:00",
+    "AGENDA_FECHAMENTO": "18:00",
+    "AGENDA_PASSO_MIN": 10,
+    "AGENDA_CAPACIDADES": "",
+}
+
+
+class OcupacaoDiaTests(SimpleTestCase):
+    def test_confere_com_forca_bruta(self):
+        rnd = random.Random(3)
+        for passo in (5, 10, 15):
+            indice = OcupacaoDia(passo)
+            celulas = [0] * indice.n
+            for _ in range(60):
+                inicio, duracao = rnd.randrange(0, 24 * 60), rnd.randrange(5, 90)
+                indice.ocupar(inicio, duracao)
+                ini, fim = indice.celulas(inicio, duracao)
+                for c in range(ini, fim):
+                    celulas[c] += 1
+
+                inicio, duracao, cap = rnd.randrange(0, 23 * 60), rnd.randrange(5, 60), rnd.randint(1, 4)
+                ini, fim = indice.celulas(inicio, duracao)
+                self.assertEqual(indice.maximo(inicio, duracao), max(celulas[ini:fim]))
+                self.assertEqual(indice.cabe(inicio, duracao, cap), max(celulas[ini:fim]) < cap)
+                lotadas = [c for c in range(inicio // passo, indice.n) if celulas[c] >= cap]
+                self.assertEqual(indice.primeira_lotada(inicio, cap), lotadas[0] * passo if lotadas else None)
+
+            esperado = [
+                m for m in range(420, 18 * 60 - 30 + 1, 10)
+                if max(celulas[slice(*indice.celulas(m, 30))]) < 2
+            ]
+            self.assertEqual(indice.livres(30, 2, 420, 18 * 60, 10), esperado)
+
+
+@override_settings(**AGENDA)
+class AgendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dia = timezone.now().date() + timedelta(days=30)
+        cls.ana, cls.bia, cls.caio = (
+            Paciente.objects.create(
+                nome_completo=nome, cpf=cpf, telefone="94000000000", data_nascimento=timezone.now().date()
+            )
+            for nome, cpf in (("Ana", "10000000001"), ("Bia", "10000000002"), ("Caio", "10000000003"))
+        )
+
+    def test_capacidade_do_consultorio(self):
+        agendar(self.ana, self.dia, time(9, 0), "consulta_clinica")
+        agendar(self.bia, self.dia, time(9, 10), "consulta_clinica")
+        with self.assertRaisesMessage(HorarioIndisponivel, "Próximo horário livre: 09:20"):
+            agendar(self.caio, self.dia, time(9, 10), "consulta_clinica")
+        # Outra sala no mesmo horário não disputa o consultório
+        ag = agendar(self.caio, self.dia, time(9, 10), "lab_hemograma")
+        self.assertEqual((ag.recurso, ag.duracao_min, ag.tipo), ("coleta", 10, "EXAME"))
+        self.assertEqual(Agenda.objects.filter(data=self.dia).count(), 3)
+        travas = dict(AgendaRecursoDia.objects.filter(data=self.dia).values_list("recurso", "agendamentos"))
+        self.assertEqual(travas, {"consultorio": 2, "coleta": 1})
+
+    def test_duracao_bloqueia_horarios_livres(self):
+        agendar(self.ana, self.dia, time(10, 0), "usg_morfologica")  # 40 min
+        livres = horarios_livres("usg_abdomen", self.dia)  # 20 min
+        self.assertEqual((livres["recurso"], livres["capacidade"], livres["duracao_min"]), ("ultrassom", 1, 20))
+        self.assertIn("09:40", livres["horarios"])
+        for hora in ("09:50", "10:00", "10:30"):
+            self.assertNotIn(hora, livres["horarios"])
+        self.assertIn("10:40", livres["horarios"])
+        self.assertEqual(livres["horarios"][-1], "17:40")
+        with self.assertRaises(HorarioIndisponivel):
+            agendar(self.bia, self.dia, time(10, 20), "usg_abdomen")
+
+        Agenda.objects.filter(paciente=self.ana).update(status="CANCELADO")
+        self.assertIn("10:00", horarios_livres("usg_abdomen", self.dia)["horarios"])
+
+    def test_registro_antigo_conta_pela_observacao(self):
+        Agenda.objects.create(
+            paciente=self.ana, data=self.dia, hora=time(8, 0), tipo="EXAME",
+            observacoes="Procedimento: USG Abdômen [usg_abdomen] | Cobertura: sem cobertura (particular)",
+        )
+        self.assertNotIn("08:00", horarios_livres("usg_mamas", self.dia)["horarios"])
+
+    def test_paciente_expediente_e_dia_passado(self):
+        agendar(self.ana, self.dia, time(9, 0), "consulta_clinica")
+        with self.assertRaisesMessage(HorarioIndisponivel, "09:00"):
+            agendar(self.ana, self.dia, time(9, 10), "lab_glicemia")
+        with self.assertRaisesMessage(HorarioIndisponivel, "fora do expediente"):
+            agendar(self.bia, self.dia, time(17, 30), "polissonografia")
+        with override_settings(AGENDA_CAPACIDADES="consultorio=1"):
+            self.assertNotIn("09:10", horarios_livres("consulta_clinica", self.dia)["horarios"])
+        self.assertEqual(horarios_livres("consulta_clinica", self.dia - timedelta(days=60))["horarios"], [])
+
+
+@override_settings(**AGENDA)
+class AgendaViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user(username="recepcao", password="senha-teste-123")
+        self.client.login(username="recepcao", password="senha-teste-123")
+        self.dia = timezone.now().date() + timedelta(days=30)
+        self.paciente = Paciente.objects.create(
+            nome_completo="Paciente Agenda", cpf="10000000009", telefone="94000000000",
+            data_nascimento=timezone.now().date(),
+        )
+
+    def _post(self, hora, **headers):
+        return self.client.post(
+            reverse("sistema_interno:agenda_view"),
+            {
+                "paciente_id": self.paciente.id, "procedimento_id": "usg_abdomen", "valor_cheio": "150",
+                "comprovante": "PIX", "data": self.dia.isoformat(), "hora": hora,
+            },
+            **headers,
+        )
+
+    def test_conflito_nao_grava_agenda_nem_fatura(self):
+        self.assertEqual(self._post("10:00").status_code, 302)
+        ag = Agenda.objects.get()
+        self.assertEqual((ag.procedimento_id, ag.recurso, ag.duracao_min), ("usg_abdomen", "ultrassom", 20))
+        self.assertEqual(Fatura.objects.count(), 1)
+
+        r = self._post("10:10", HTTP_X_REQUESTED_WITH="XMLHttpRequest")
+        self.assertEqual(r.status_code, 409)
+        self.assertIn("Sala de ultrassom", r.json()["detail"])
+        r = self._post("10:10")
+        self.assertEqual(r.status_code, 302)
+        self.assertEqual(Agenda.objects.count(), 1)
+        self.assertEqual(Fatura.objects.count(), 1)
+
+        r = self.client.get(reverse("sistema_interno:agenda_view"), {"data": self.dia.isoformat()})
+        self.assertContains(r, "10:20")  # fim do agendamento na lista do dia
+
+    def test_endpoint_horarios_livres(self):
+        self._post("07:00")
+        url = reverse("sistema_interno:api_horarios_livres")
+        d = self.client.get(url, {"procedimento_id": "usg_abdomen", "data": self.dia.isoformat()}).json()
+        self.assertEqual(d["horarios"][:2], ["07:20", "07:30"])
+        self.assertEqual(d["recurso_nome"], "Sala de ultrassom")
+        self.assertEqual(self.client.get(url, {"procedimento_id": "xyz"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"procedimento_id": "ecg", "data": "ontem"}).status_code, 400)
@@ -0,0 +1,120 @@
+"""Backup incremental: cadeia completo + incrementais, restauração, verificação e poda."""
+
+import gzip
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Group, User
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core_gestao import backup
+from core_gestao.models import Agenda, Fatura, Paciente, Plano, Prontuario
+
+
+class BackupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.medico = User.objects.create_user(username="medico", password="senha-teste-123")
+        cls.medico.groups.add(Group.objects.create(name="Medicos"))
+        cls.plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        cls.ana = Paciente.objects.create(
+            nome_completo="Ana Backup",
+            cpf="11111111111",
+            telefone="94000000000",
+            data_nascimento=date(1990, 1, 1),
+            sexo="F",
+            plano=cls.plano,
+        )
+
+    def setUp(self):
+        self.pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.pasta)
+        ajustes = override_settings(BACKUP_DIR=self.pasta, BACKUP_COMPLETO_DIAS=7, BACKUP_MANTER_COMPLETOS=2)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.hoje = timezone.now().date()
+
+    def _estado(self):
+        modelos = (Paciente, Fatura, Agenda, Prontuario, Plano, User, User.groups.through)
+        return {m.__name__: list(m.objects.order_by("pk").values()) for m in modelos}
+
+    def _backup(self, *args):
+        call_command("backup", *args, stdout=StringIO())
+        return backup.listar_backups()[-1]
+
+    @mock.patch.object(backup, "MARGEM_MARCA", timedelta(0))
+    def test_incremental_leva_insercoes_alteracoes_e_exclusoes(self):
+        fatura = Fatura.objects.create(
+            paciente=self.ana, plano=self.plano, valor=Decimal("59.90"), data_vencimento=self.hoje
+        )
+        agenda = Agenda.objects.create(paciente=self.ana, data=self.hoje, hora=time(8))
+        prontuario = Prontuario.objects.create(paciente=self.ana, medico=self.medico, evolucao="Primeira")
+        completo = self._backup()
+        self.assertEqual(completo["tipo"], "completo")
+        estado_completo = self._estado()
+
+        bia = Paciente.objects.create(
+            nome_completo="Bia Backup",
+            cpf="22222222222",
+            telefone="94000000001",
+            data_nascimento=date(2015, 1, 1),
+            sexo="F",
+            is_titular=False,
+            responsavel=self.ana,
+        )
+        Prontuario.objects.create(paciente=bia, medico=self.medico, evolucao="Retorno")
+        prontuario.evolucao = "Primeira (corrigida no admin)"
+        prontuario.save()
+        fatura.status = "PAGO"
+        fatura.data_pagamento = self.hoje
+        fatura.save()
+        agenda.delete()
+        incremental = self._backup()
+        self.assertEqual((incremental["tipo"], incremental["anterior"]), ("incremental", completo["id"]))
+        tabelas = incremental["tabelas"]
+        self.assertEqual(tabelas["core_gestao.paciente"]["linhas"], 1)
+        self.assertEqual(tabelas["core_gestao.fatura"]["linhas"], 1)
+        self.assertEqual(tabelas["core_gestao.prontuario"]["linhas"], 2)
+        self.assertEqual(tabelas["core_gestao.agenda"]["linhas"], 0)
+        estado_final = self._estado()
+
+        # Banco "perdido": apaga e altera o que der; a restauração volta ao último backup
+        Fatura.objects.all().delete()
+        Paciente.objects.filter(pk=self.ana.pk).update(nome_completo="Outro nome")
+        call_command("restaurar_backup", interactive=False, stdout=StringIO())
+        self.assertEqual(self._estado(), estado_final)
+
+        call_command("restaurar_backup", completo["id"], interactive=False, stdout=StringIO())
+        self.assertEqual(self._estado(), estado_completo)
+
+    def test_parte_corrompida_nao_altera_o_banco(self):
+        Fatura.objects.create(
+            paciente=self.ana, plano=self.plano, valor=Decimal("10.00"), data_vencimento=self.hoje
+        )
+        manifesto = self._backup()
+        parte = manifesto["tabelas"]["core_gestao.fatura"]["partes"][0]["arquivo"]
+        with gzip.open(manifesto["pasta"] / parte, "wt", encoding="utf-8") as f:
+            f.write("[]\n")
+        Fatura.objects.all().delete()
+
+        with self.assertRaisesMessage(CommandError, "corrompido"):
+            call_command("restaurar_backup", "--verificar", stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command("restaurar_backup", interactive=False, stdout=StringIO())
+        self.assertFalse(Fatura.objects.exists())
+
+    def test_novo_completo_apos_prazo_e_poda_das_cadeias(self):
+        agora = timezone.now()
+        tipos = [backup.fazer_backup(agora=agora - timedelta(days=d))["tipo"] for d in (30, 29, 20, 10, 9)]
+        self.assertEqual(tipos, ["completo", "incremental", "completo", "completo", "incremental"])
+        self.assertEqual(self._backup("--completo")["tipo"], "completo")
+
+        restantes = [m["tipo"] for m in backup.listar_backups()]
+        self.assertEqual(restantes, ["completo", "incremental", "completo"])
+        call_command("restaurar_backup", "--verificar", stdout=StringIO())
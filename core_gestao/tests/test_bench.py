@@ -0,0 +1,66 @@
+"""Micro-benchmarks: casos cobertos, baseline por máquina e detecção de regressão."""
+
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+
+from core_gestao.benchmarks import micro
+
+
+class MicroBenchTests(SimpleTestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta)
+        self.baseline = Path(pasta) / "baseline.json"
+
+    def _bench(self, *args):
+        saida = StringIO()
+        call_command(
+            "bench", "--filtro", "valores_mp", "--rodadas", "3", "--tempo-minimo", "0.001",
+            "--baseline", str(self.baseline), "--maquina", "ci", *args, stdout=saida,
+        )
+        return saida.getvalue()
+
+    def _escalar_baseline(self, fator):
+        dados = json.loads(self.baseline.read_text())
+        for caso in dados["maquinas"]["ci"]["casos"].values():
+            caso["min_ns"] *= fator
+        self.baseline.write_text(json.dumps(dados))
+
+    def test_casos_cobrem_as_funcoes_da_recepcao(self):
+        nomes = {c.nome.split(".")[0] for c in micro.casos()}
+        for funcao in (
+            "avaliar_desconto_procedimento", "procedimento_coberto_pelo_plano", "_normalizar_procedimento",
+            "status_plano_carteirinha", "catalogo_por_grupos", "gerar_carteirinha_token",
+            "ler_carteirinha_token", "valores_mp_coincidem",
+        ):
+            self.assertIn(funcao, nomes)
+        resultado = micro.executar("status_plano", rodadas=2, tempo_minimo=0.001)
+        medida = resultado["casos"]["status_plano_carteirinha"]
+        self.assertGreater(medida["min_ns"], 0)
+        self.assertLessEqual(medida["min_ns"], medida["mediana_ns"])
+
+    def test_baseline_por_maquina_e_regressao(self):
+        self.assertIn("Sem baseline para 'ci'", self._bench())
+        self._bench("--salvar")
+        self.assertIn("ci", json.loads(self.baseline.read_text())["maquinas"])
+
+        self._escalar_baseline(10)  # baseline 10x mais lenta: medição atual bem abaixo
+        self.assertIn("valores_mp_coincidem", self._bench())
+
+        self._escalar_baseline(0.001)  # baseline muito mais rápida: regressão mesmo após remedir
+        with self.assertRaisesMessage(CommandError, "valores_mp_coincidem"):
+            self._bench()
+
+    def test_comparar(self):
+        resultado = {"casos": {"a": {"min_ns": 130.0}, "b": {"min_ns": 90.0}, "c": {"min_ns": 5.0}}}
+        baseline = {"casos": {"a": {"min_ns": 100.0}, "b": {"min_ns": 100.0}}}
+        comparacao = micro.comparar(resultado, baseline, limite=0.25)
+        self.assertEqual(comparacao["regressoes"], ["a"])
+        self.assertEqual(comparacao["variacoes"], {"a": 0.3, "b": -0.1})
+        self.assertEqual(comparacao["sem_baseline"], ["c"])
@@ -0,0 +1,72 @@
+"""Busca de pacientes: acentos, pontuação do CPF, prefixo e ranking."""
+
+from datetime import date
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from core_gestao.busca_pacientes import buscar_pacientes, filtrar_pacientes
+from core_gestao.models import Paciente, PacienteBuscaToken
+
+
+def _paciente(nome, cpf, **extra):
+    return Paciente.objects.create(
+        nome_completo=nome,
+        cpf=cpf,
+        telefone="94000000000",
+        data_nascimento=date(1990, 1, 1),
+        **extra,
+    )
+
+
+class BuscaPacientesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.joao = _paciente("João da Silva", "123.456.789-01")
+        cls.maria = _paciente("Maria Joana Souza", "98765432100")
+        cls.ana = _paciente("Ana D'Ávila", "55544433322")
+
+    def test_acentos_e_caixa_ignorados(self):
+        self.assertEqual(buscar_pacientes("joao"), [self.joao])
+        self.assertEqual(buscar_pacientes("DAVILA"), [])
+        self.assertEqual(buscar_pacientes("avila"), [self.ana])
+
+    def test_cpf_com_ou_sem_pontuacao(self):
+        self.assertEqual(buscar_pacientes("123456"), [self.joao])
+        self.assertEqual(buscar_pacientes("123.456"), [self.joao])
+        self.assertEqual(buscar_pacientes("987.654.321-00"), [self.maria])
+
+    def test_prefixo_do_nome_vem_antes_de_palavra_do_meio(self):
+        self.assertEqual(buscar_pacientes("jo"), [self.joao, self.maria])
+
+    def test_varias_palavras_casam_todas(self):
+        self.assertEqual(buscar_pacientes("jo sou"), [self.maria])
+        qs = filtrar_pacientes(Paciente.objects.all(), "silva jo")
+        self.assertEqual(list(qs), [self.joao])
+
+    def test_renomear_atualiza_tokens(self):
+        self.joao.nome_completo = "João Pereira"
+        self.joao.save()
+        self.assertEqual(buscar_pacientes("silva"), [])
+        self.assertEqual(buscar_pacientes("pere"), [self.joao])
+
+    def test_salvar_sem_renomear_nao_reescreve_tokens(self):
+        p = Paciente.objects.get(pk=self.maria.pk)
+        p.telefone = "94999999999"
+        with self.assertNumQueries(1):
+            p.save()
+
+    def test_reindexar_apos_update_em_massa(self):
+        Paciente.objects.filter(pk=self.ana.pk).update(nome_completo="Ana Beatriz")
+        call_command("reindexar_busca_pacientes", stdout=StringIO())
+        self.assertEqual(buscar_pacientes("beatriz"), [self.ana])
+        self.assertFalse(PacienteBuscaToken.objects.filter(token="avila").exists())
+
+    def test_api_buscar_paciente(self):
+        User.objects.create_user(username="recepcao", password="senha-teste-123")
+        self.client.login(username="recepcao", password="senha-teste-123")
+        r = self.client.get(reverse("sistema_interno:api_buscar_paciente"), {"q": "Joã"})
+        self.assertEqual([x["id"] for x in r.json()["results"]], [self.joao.id, self.maria.id])
@@ -0,0 +1,117 @@
+"""Camada de cache por namespace: versões, invalidação e estatísticas."""
+
+from datetime import date
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from core_gestao import cache_utils
+from core_gestao.cache_utils import CacheNamespace, estatisticas_cache
+from core_gestao.models import Paciente
+from core_gestao.paginacao import contagem_estimada
+
+
+class CacheNamespaceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.zerar_estatisticas()
+        self.ns = CacheNamespace("teste", timeout=60)
+
+    def test_invalidar_descarta_todas_as_chaves(self):
+        self.ns.set("a", 1)
+        self.ns.set("b", 0)
+        self.assertEqual((self.ns.get("a"), self.ns.get("b")), (1, 0))
+        outro = CacheNamespace("outro")
+        outro.set("a", "x")
+
+        self.assertEqual(self.ns.invalidar(), 2)
+        self.assertIsNone(self.ns.get("a"))
+        self.assertEqual(self.ns.get("b", "padrao"), "padrao")
+        self.assertEqual(outro.get("a"), "x")
+
+    def test_get_or_set_e_estatisticas(self):
+        calcular = mock.Mock(return_value=42)
+        for _ in range(3):
+            self.assertEqual(self.ns.get_or_set("x", calcular), 42)
+        calcular.assert_called_once()
+
+        stats = estatisticas_cache()
+        self.assertEqual(stats["backend"], "LocMemCache")
+        self.assertEqual(
+            {k: stats["namespaces"]["teste"][k] for k in ("hits", "misses", "versao")},
+            {"hits": 2, "misses": 1, "versao": 1},
+        )
+        self.assertEqual(stats["namespaces"]["teste"]["taxa_acerto"], 0.667)
+
+    def test_contadores_somam_envios_de_varios_processos(self):
+        # Cada processo envia só a sua parcela; o banco soma (sem ler e regravar)
+        cache_utils.enviar_estatisticas({("grupo", "a"): 2, ("grupo", "b"): 1})
+        cache_utils.enviar_estatisticas({("grupo", "a"): 3})
+        cache.clear()  # limpar/podar o cache não apaga os contadores
+        self.assertEqual(cache_utils.contadores("grupo"), {"a": 5, "b": 1})
+
+    def test_contar_dentro_de_transacao_adia_o_envio(self):
+        cache_utils._ultimo_flush = 0.0
+        cache_utils.contar("grupo", "a")  # TestCase: já dentro de uma transação
+        self.assertEqual(cache_utils.contadores("grupo"), {})
+        cache_utils.enviar_estatisticas()
+        self.assertEqual(cache_utils.contadores("grupo"), {"a": 1})
+
+
+class ContagemPacientesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _paciente(self, n):
+        return Paciente.objects.create(
+            nome_completo=f"Contagem {n}",
+            cpf=f"4040404040{n}",
+            telefone="94000000040",
+            data_nascimento=date(1990, 1, 1),
+            sexo="F",
+            is_titular=True,
+        )
+
+    def test_contagem_refeita_quando_paciente_muda(self):
+        self._paciente(1)
+        qs = Paciente.objects.filter(is_titular=True)
+        self.assertEqual(contagem_estimada(qs), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(contagem_estimada(qs), 1)
+        p = self._paciente(2)
+        self.assertEqual(contagem_estimada(qs), 2)
+        p.delete()
+        self.assertEqual(contagem_estimada(qs), 1)
+
+    def test_diagnostico_so_master(self):
+        url = reverse("sistema_interno:api_diagnostico")
+        self.client.force_login(User.objects.create_user(username="recepcao", password="x"))
+        self.assertNotEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user(username="master", password="x"))
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn("namespaces", r.json()["cache"])
+
+
+class ConexoesBancoTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache_utils.zerar_estatisticas()
+
+    def test_conta_requests_e_conexoes_abertas(self):
+        from django.db import connection
+        from django.db.backends.signals import connection_created
+
+        self.client.get(reverse("sistema_interno:login"))
+        self.client.get(reverse("sistema_interno:login"))
+        connection_created.send(sender=connection.__class__, connection=connection)
+
+        self.client.force_login(User.objects.create_user(username="master", password="x"))
+        banco = self.client.get(reverse("sistema_interno:api_diagnostico")).json()["banco"]
+        self.assertEqual(banco["requests"], 3)
+        self.assertEqual(banco["conexoes_abertas"], 1)
+        self.assertEqual(banco["conexoes_evitadas"], 2)
+        self.assertIn("conn_max_age", banco)
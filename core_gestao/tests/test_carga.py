@@ -0,0 +1,111 @@
+"""Massa sintética, Mercado Pago falso com webhook assinado e cenário de carga."""
+
+import time
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao import mp_gateway
+from core_gestao.benchmarks import carga
+from core_gestao.benchmarks.mp_falso import ServidorMPFalso
+from core_gestao.models import Agenda, Fatura, NotificacaoMP, Paciente, PacienteBuscaToken, Plano
+from core_gestao.mp_inbox import processar_inbox
+from core_gestao.receita_mensal import verificar_receita
+
+
+class SeedBenchmarkTests(TestCase):
+    def test_familias_movimento_e_indices(self):
+        with override_settings(DEBUG=True):
+            call_command("seed_benchmark", pacientes=80, senha_equipe="senha-teste-123", stdout=StringIO())
+            call_command("seed_benchmark", pacientes=20, semente=8, stdout=StringIO())
+
+        self.assertEqual(Paciente.objects.count(), 100)
+        self.assertFalse(Paciente.objects.filter(is_titular=False, responsavel__isnull=True).exists())
+        self.assertFalse(Paciente.objects.filter(nome_busca="").exists())
+        self.assertEqual(
+            PacienteBuscaToken.objects.values("paciente").distinct().count(), Paciente.objects.count()
+        )
+        self.assertTrue(Fatura.objects.filter(status="PAGO").exists())
+        self.assertTrue(Agenda.objects.exists())
+        self.assertEqual(verificar_receita(), [])
+        self.assertTrue(User.objects.filter(username="recepcao").exists())
+        self.assertEqual(Plano.objects.count(), 3)
+
+    def test_recusa_sem_debug(self):
+        with override_settings(DEBUG=False):
+            with self.assertRaises(CommandError):
+                call_command("seed_benchmark", pacientes=10, stdout=StringIO())
+        self.assertFalse(Paciente.objects.exists())
+
+
+class MPFalsoECargaTests(LiveServerTestCase):
+    def setUp(self):
+        mp_gateway.resetar_pool()
+        self.addCleanup(mp_gateway.resetar_pool)
+        User.objects.create_user(username="master", password="senha-teste-123")
+        self.mp = ServidorMPFalso(
+            webhook_url=self.live_server_url + reverse("sistema_interno:mp_webhook"),
+            webhook_secret="segredo-webhook",
+        ).iniciar()
+        self.addCleanup(self.mp.parar)
+
+    def _esperar(self, condicao, segundos=5):
+        limite = time.monotonic() + segundos
+        while not condicao() and time.monotonic() < limite:
+            time.sleep(0.05)
+        return condicao()
+
+    def test_pagamento_no_mp_falso_chega_pelo_webhook_assinado(self):
+        plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=Decimal("59.90"))
+        paciente = Paciente.objects.create(
+            nome_completo="Ana Carga", cpf="12345678901", telefone="94000000000",
+            data_nascimento=timezone.now().date(), plano=plano,
+        )
+        fatura = Fatura.objects.create(
+            paciente=paciente, plano=plano, valor=Decimal("59.90"), data_vencimento=timezone.now().date()
+        )
+        with override_settings(
+            MERCADO_PAGO_API_BASE_URL=self.mp.url, MERCADO_PAGO_WEBHOOK_SECRET="segredo-webhook"
+        ):
+            sdk = mp_gateway.mp_sdk("TEST-carga")
+            self.assertEqual(mp_gateway.mp_call(sdk.user().get)["status"], 200)
+            pref = mp_gateway.mp_call(sdk.preference().create, {"items": [], "external_reference": str(fatura.id)})
+            self.assertEqual(pref["status"], 201)
+            pagamento = mp_gateway.mp_call(
+                sdk.payment().create,
+                {"transaction_amount": 59.90, "payment_method_id": "visa", "external_reference": str(fatura.id)},
+            )
+            self.assertEqual(pagamento["response"]["status"], "approved")
+            self.assertTrue(self._esperar(NotificacaoMP.objects.exists))
+            self.assertEqual(self.mp.estatisticas()["webhooks"], {"enviados": 1, "falhas": 0})
+            processar_inbox()
+        fatura.refresh_from_db()
+        self.assertEqual(fatura.status, "PAGO")
+
+        with override_settings(MERCADO_PAGO_WEBHOOK_SECRET="outro-segredo"), self.assertLogs(
+            "core_gestao.mp_webhook_utils", "WARNING"
+        ):
+            self.mp.notificar(pagamento["response"]["id"], assincrono=False)
+        self.assertEqual(self.mp.estatisticas()["webhooks"]["falhas"], 1)
+
+    def test_cenario_reporta_percentis_por_view(self):
+        # Um usuário só: o servidor de teste divide a mesma conexão SQLite entre as threads
+        Paciente.objects.create(
+            nome_completo="Ana Silva", cpf="99100000001", telefone="94000000000",
+            data_nascimento=timezone.now().date(),
+        )
+        resultado = carga.executar(
+            self.live_server_url, "master", "senha-teste-123", "dia_de_pagamento",
+            usuarios=1, duracao=1.5, webhook_secret="", mp_porta=0,
+        )
+        self.assertGreater(resultado["requests"], 0)
+        for nome, view in resultado["views"].items():
+            self.assertEqual(view["erros"], 0, nome)
+            self.assertLessEqual(view["p50"], view["p95"])
+            self.assertLessEqual(view["p95"], view["p99"])
+        self.assertIn("mp_webhook", resultado["views"])
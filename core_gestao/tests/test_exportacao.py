@@ -0,0 +1,144 @@
+"""Exportação CSV/XLSX em streaming: filtros do dashboard, lotes e formato da planilha."""
+
+import csv
+import io
+import zipfile
+from datetime import date, time, timedelta
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao import exportacao
+from core_gestao.models import Agenda, Fatura, Paciente, Plano
+
+
+def _paciente(nome, cpf, **extra):
+    dados = {
+        "nome_completo": nome,
+        "cpf": cpf,
+        "telefone": "94000000000",
+        "data_nascimento": date(1990, 1, 1),
+        "sexo": "F",
+    }
+    dados.update(extra)
+    return Paciente.objects.create(**dados)
+
+
+class ExportacaoTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="master", password="senha-teste-123")
+        User.objects.create_user(username="recepcao", password="senha-teste-123")
+        cls.plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        cls.ana = _paciente("Ana Souza", "11111111111", plano=cls.plano, doencas_cronicas="ASMA")
+        cls.bia = _paciente("Bia Souza", "22222222222", is_titular=False, responsavel=cls.ana)
+        cls.caio = _paciente("Caio Lima", "33333333333")
+
+    def setUp(self):
+        self.client.login(username="master", password="senha-teste-123")
+        self.hoje = timezone.now().date()
+
+    def _csv(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        corpo = b"".join(response.streaming_content).decode("utf-8-sig")
+        return list(csv.reader(io.StringIO(corpo), delimiter=";"))
+
+    def test_pacientes_titular_seguido_dos_dependentes(self):
+        linhas = self._csv(self.client.get(reverse("sistema_interno:exportar_pacientes")))
+        self.assertEqual(linhas[0], exportacao.CABECALHO_PACIENTES)
+        self.assertEqual(
+            [(l[0], l[1], l[2]) for l in linhas[1:]],
+            [
+                ("Titular", "11111111111", "Ana Souza"),
+                ("Dependente", "11111111111", "Bia Souza"),
+                ("Titular", "33333333333", "Caio Lima"),
+            ],
+        )
+        filtradas = self._csv(
+            self.client.get(reverse("sistema_interno:exportar_pacientes"), {"doenca": "ASMA"})
+        )
+        self.assertEqual([l[2] for l in filtradas[1:]], ["Ana Souza", "Bia Souza"])
+
+    def test_faturas_por_periodo_e_status(self):
+        mes_passado = self.hoje.replace(day=1) - timedelta(days=1)
+        comum = {"paciente": self.ana, "plano": self.plano, "valor": "59.90", "metodo_pagamento": "PIX"}
+        paga = Fatura.objects.create(
+            status="PAGO", data_vencimento=mes_passado, data_pagamento=self.hoje, **comum
+        )
+        pendente = Fatura.objects.create(status="PENDENTE", data_vencimento=self.hoje, **comum)
+        Fatura.objects.create(
+            status="PAGO", data_vencimento=mes_passado, data_pagamento=mes_passado, **comum
+        )
+        url = reverse("sistema_interno:exportar_faturas")
+        todas = self._csv(self.client.get(url))
+        self.assertEqual(sorted(int(l[0]) for l in todas[1:]), [paga.id, pendente.id])
+        pagas = self._csv(self.client.get(url, {"status": "PAGO"}))
+        self.assertEqual([int(l[0]) for l in pagas[1:]], [paga.id])
+        anterior = self._csv(
+            self.client.get(
+                url,
+                {"mes_referencia": mes_passado.month, "ano_referencia": mes_passado.year, "status": "pago"},
+            )
+        )
+        self.assertEqual(len(anterior), 2)
+        self.assertEqual(self.client.get(url, {"status": "X"}).status_code, 400)
+
+    def test_agenda_em_ordem_e_lotes_sem_offset(self):
+        for hora in (time(10), time(8), time(9)):
+            Agenda.objects.create(paciente=self.caio, data=self.hoje, hora=hora, status="AGENDADO")
+        Agenda.objects.create(paciente=self.ana, data=self.hoje + timedelta(days=1), hora=time(7))
+        Agenda.objects.create(paciente=self.ana, data=self.hoje + timedelta(days=9), hora=time(7))
+        url = reverse("sistema_interno:exportar_agenda")
+        fim = (self.hoje + timedelta(days=1)).isoformat()
+        # Lotes de 2: a paginação (data, hora, id) atravessa dias e horas
+        with mock.patch.object(exportacao, "LOTE_EXPORTACAO", 2):
+            response = self.client.get(url, {"data_inicio": self.hoje.isoformat(), "data_fim": fim})
+            linhas = self._csv(response)
+        self.assertEqual(
+            [(l[0], l[1]) for l in linhas[1:]],
+            [
+                (self.hoje.isoformat(), "08:00"),
+                (self.hoje.isoformat(), "09:00"),
+                (self.hoje.isoformat(), "10:00"),
+                (fim, "07:00"),
+            ],
+        )
+
+    def test_xlsx_valido(self):
+        response = self.client.get(reverse("sistema_interno:exportar_pacientes"), {"formato": "xlsx"})
+        self.assertIn("attachment;", response["Content-Disposition"])
+        arquivo = zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertIsNone(arquivo.testzip())
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        folha = ElementTree.fromstring(arquivo.read("xl/worksheets/sheet1.xml"))
+        linhas = folha.findall("s:sheetData/s:row", ns)
+        self.assertEqual(len(linhas), 4)
+        primeira = [t.text for t in linhas[1].iter("{%s}t" % ns["s"])]
+        self.assertEqual(primeira[:3], ["Titular", "11111111111", "Ana Souza"])
+
+    def test_texto_que_vira_formula_sai_como_texto(self):
+        _paciente('=HYPERLINK("http://x.invalid","abrir")', "44444444444")
+        Agenda.objects.create(
+            paciente=self.caio, data=self.hoje, hora=time(8), observacoes="@SUM(A1:A9)"
+        )
+        linhas = self._csv(self.client.get(reverse("sistema_interno:exportar_pacientes")))
+        self.assertIn('\'=HYPERLINK("http://x.invalid","abrir")', [l[2] for l in linhas])
+        agenda = self._csv(self.client.get(reverse("sistema_interno:exportar_agenda")))
+        self.assertEqual(agenda[1][-1], "'@SUM(A1:A9)")
+        self.assertEqual(
+            [exportacao._texto(v) for v in ("+55 94", "-1", "\tx", "\rx", "Ana", -5)],
+            ["'+55 94", "'-1", "'\tx", "'\rx", "Ana", "-5"],
+        )
+
+    def test_restrito_ao_master(self):
+        self.client.login(username="recepcao", password="senha-teste-123")
+        r = self.client.get(reverse("sistema_interno:exportar_faturas"))
+        self.assertEqual(r.status_code, 302)
+        self.client.login(username="master", password="senha-teste-123")
+        r = self.client.get(reverse("sistema_interno:exportar_faturas"), {"formato": "pdf"})
+        self.assertEqual(r.status_code, 400)
@@ -0,0 +1,84 @@
+"""Métricas Prometheus: requests por rota, Mercado Pago, inbox e acesso ao endpoint."""
+
+from datetime import timedelta
+from unittest import mock
+
+import requests
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao import cache_utils, metricas
+from core_gestao.metricas import exposicao, operacao_mp
+from core_gestao.models import NotificacaoMP
+from core_gestao.mp_gateway import PooledHttpClient
+
+
+class MetricasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="master", password="senha-teste-123")
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.zerar_estatisticas()
+        metricas._ultimo_batimento = 0.0
+
+    def test_requests_por_rota_em_histograma(self):
+        self.client.login(username="master", password="senha-teste-123")
+        self.client.get(reverse("sistema_interno:cliente_list"))
+        self.client.get(reverse("sistema_interno:cliente_list"))
+        texto = self.client.get(reverse("sistema_interno:metricas")).content.decode()
+
+        view = 'view="sistema_interno:cliente_list"'
+        self.assertIn(f'ultramed_http_requests_total{{{view},metodo="GET",status="2xx"}} 2', texto)
+        self.assertIn(f'ultramed_http_request_duration_seconds_bucket{{{view},le="+Inf"}} 2', texto)
+        self.assertIn(f"ultramed_http_request_duration_seconds_count{{{view}}} 2", texto)
+        self.assertIn("# TYPE ultramed_http_request_duration_seconds histogram", texto)
+        self.assertRegex(texto, r'ultramed_processos_ativos\{host="[^"]+"\} 1')
+
+    def test_chamadas_mp_por_operacao_conta_e_resultado(self):
+        cliente = PooledHttpClient(conta="rinan")
+        resposta = mock.Mock(status_code=201, content=b'{"id": "pref"}')
+        resposta.json.return_value = {"id": "pref"}
+        with mock.patch.object(cliente._session, "request", return_value=resposta):
+            cliente.request("POST", "https://api.mercadopago.com/checkout/preferences", data="{}")
+        with mock.patch.object(cliente._session, "request", side_effect=requests.Timeout):
+            with self.assertRaises(requests.Timeout):
+                cliente.request("GET", "https://api.mercadopago.com/v1/payments/123")
+
+        texto = exposicao()
+        self.assertIn(
+            'ultramed_mp_requests_total{operacao="preference.create",conta="rinan",resultado="2xx"} 1', texto
+        )
+        self.assertIn(
+            'ultramed_mp_requests_total{operacao="payment.get",conta="rinan",resultado="timeout"} 1', texto
+        )
+        self.assertIn(
+            'ultramed_mp_request_duration_seconds_count{operacao="payment.get",conta="rinan"} 1', texto
+        )
+        self.assertEqual(operacao_mp("GET", "https://api.mercadopago.com/users/me"), "user.get")
+        self.assertEqual(operacao_mp("GET", "https://api.mercadopago.com/v1/payments/search"), "payment.search")
+
+    def test_atraso_do_inbox_mp(self):
+        antiga = NotificacaoMP.objects.create(payment_id="1")
+        NotificacaoMP.objects.filter(pk=antiga.pk).update(recebido_em=timezone.now() - timedelta(minutes=5))
+        NotificacaoMP.objects.create(payment_id="2")
+        NotificacaoMP.objects.create(payment_id="3", status="ERRO")
+        linhas = dict(
+            linha.rsplit(" ", 1) for linha in exposicao().splitlines() if not linha.startswith("#")
+        )
+        self.assertEqual(linhas["ultramed_mp_inbox_pendentes"], "2")
+        self.assertEqual(linhas["ultramed_mp_inbox_erros"], "1")
+        self.assertGreaterEqual(float(linhas["ultramed_mp_inbox_atraso_seconds"]), 300)
+
+    @override_settings(METRICAS_TOKEN="segredo-coletor")
+    def test_acesso_por_token_ou_master(self):
+        url = reverse("sistema_interno:metricas")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION="Bearer errado").status_code, 403)
+        r = self.client.get(url, HTTP_AUTHORIZATION="Bearer segredo-coletor")
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r["Content-Type"].startswith("text/plain; version=0.0.4"))
@@ -0,0 +1,74 @@
+"""Testes do gateway Mercado Pago (pool por token, timeout de socket)."""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import TestCase, override_settings
+
+from core_gestao import mp_gateway
+
+
+class _FakeMPHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path.startswith("/v1/payments/lento"):
+            time.sleep(7)
+        body = json.dumps({"id": 1, "status": "approved"}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MPGatewayTests(TestCase):  # as chamadas somam métricas no banco
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeMPHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        mp_gateway.resetar_pool()
+
+    def test_sdk_reaproveitado_por_token(self):
+        a = mp_gateway.mp_sdk("TEST-a")
+        b = mp_gateway.mp_sdk("TEST-a")
+        c = mp_gateway.mp_sdk("TEST-b")
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+        stats = mp_gateway.estatisticas_pool()
+        self.assertEqual(stats["pool_hit"], 1)
+        self.assertEqual(stats["pool_miss"], 2)
+
+    def test_conexao_reutilizada_entre_chamadas(self):
+        with override_settings(MERCADO_PAGO_API_BASE_URL=self.base_url):
+            sdk = mp_gateway.mp_sdk("TEST-pool")
+            for _ in range(3):
+                resp = mp_gateway.mp_call(sdk.payment().get, 1)
+                self.assertEqual(resp["status"], 200)
+        conta = mp_gateway.estatisticas_pool()["contas"]["ultramed"]
+        self.assertEqual(conta["requisicoes"], 3)
+        self.assertEqual(conta["handshakes"], 1)
+        self.assertEqual(conta["reutilizadas"], 2)
+
+    @override_settings(MERCADO_PAGO_TIMEOUT_SECONDS=5, MERCADO_PAGO_MAX_ATTEMPTS=1)
+    def test_timeout_de_socket_vira_504(self):
+        with override_settings(MERCADO_PAGO_API_BASE_URL=self.base_url):
+            sdk = mp_gateway.mp_sdk("TEST-lento")
+            resp = mp_gateway.mp_call(sdk.payment().get, "lento")
+        self.assertEqual(resp["status"], 504)
@@ -0,0 +1,125 @@
+"""Webhook Mercado Pago: enfileira sem chamar o MP; worker processa em lote."""
+
+from datetime import date, timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao.models import Fatura, NotificacaoMP, PagamentoMPProcessado, Paciente, Plano
+from core_gestao.mp_inbox import (
+    estatisticas_dedup,
+    limpar_pagamentos_expirados,
+    processar_inbox,
+)
+
+
+@override_settings(MERCADO_PAGO_WEBHOOK_SECRET="")
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        self.plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        self.paciente = Paciente.objects.create(
+            nome_completo="Pac Inbox",
+            cpf="12121212121",
+            telefone="94000000010",
+            data_nascimento=date(1990, 1, 1),
+            sexo="F",
+            is_titular=True,
+        )
+        self.fatura = Fatura.objects.create(
+            paciente=self.paciente,
+            plano=self.plano,
+            valor=718.80,
+            data_vencimento=timezone.now().date(),
+            status="PENDENTE",
+            metodo_pagamento="PIX",
+        )
+
+    def _post_webhook(self, payment_id):
+        return self.client.post(
+            reverse("sistema_interno:mp_webhook"),
+            data={"type": "payment", "data": {"id": payment_id}},
+            content_type="application/json",
+        )
+
+    def test_webhook_enfileira_sem_chamar_mp(self):
+        with mock.patch("core_gestao.mp_inbox.mp_call") as mp_call:
+            r = self._post_webhook("555")
+        self.assertEqual(r.status_code, 200)
+        mp_call.assert_not_called()
+        n = NotificacaoMP.objects.get()
+        self.assertEqual((n.conta, n.payment_id, n.status), ("ULTRAMED", "555", "PENDENTE"))
+
+    def test_worker_colapsa_duplicados_e_confirma_fatura(self):
+        for _ in range(3):
+            self._post_webhook("777")
+        resposta = {
+            "status": 200,
+            "response": {
+                "id": 777,
+                "status": "approved",
+                "external_reference": str(self.fatura.id),
+                "transaction_amount": 718.80,
+            },
+        }
+        with mock.patch("core_gestao.mp_inbox.mp_call", return_value=resposta) as mp_call:
+            resumo = processar_inbox()
+        self.assertEqual(mp_call.call_count, 1)
+        self.assertEqual(resumo["notificacoes"], 3)
+        self.assertEqual(resumo["pagamentos"], 1)
+        self.fatura.refresh_from_db()
+        self.assertEqual(self.fatura.status, "PAGO")
+        self.assertFalse(NotificacaoMP.objects.filter(status="PENDENTE").exists())
+
+    def test_falha_mp_mantem_pendente_para_nova_tentativa(self):
+        self._post_webhook("888")
+        with mock.patch(
+            "core_gestao.mp_inbox.mp_call", return_value={"status": 503, "response": {}}
+        ):
+            resumo = processar_inbox()
+        self.assertEqual(resumo["erros"], 1)
+        n = NotificacaoMP.objects.get()
+        self.assertEqual(n.status, "PENDENTE")
+        self.assertEqual(n.tentativas, 1)
+
+    def test_repeticao_de_pagamento_finalizado_nao_consulta_mp(self):
+        self._post_webhook("999")
+        resposta = {
+            "status": 200,
+            "response": {
+                "id": 999,
+                "status": "approved",
+                "external_reference": str(self.fatura.id),
+                "transaction_amount": 718.80,
+            },
+        }
+        with mock.patch("core_gestao.mp_inbox.mp_call", return_value=resposta):
+            processar_inbox()
+        self.assertTrue(
+            PagamentoMPProcessado.objects.filter(
+                conta="ULTRAMED", payment_id="999", status="approved"
+            ).exists()
+        )
+
+        with mock.patch("core_gestao.mp_inbox.mp_call") as mp_call, mock.patch(
+            "core_gestao.mp_inbox.Fatura.objects"
+        ) as faturas:
+            for _ in range(4):
+                r = self._post_webhook("999")
+                self.assertEqual(r.status_code, 200)
+            processar_inbox()
+        mp_call.assert_not_called()
+        faturas.filter.assert_not_called()
+        self.assertEqual(NotificacaoMP.objects.filter(payment_id="999").count(), 1)
+        self.assertEqual(estatisticas_dedup()["chamadas_mp_evitadas"], 4)
+
+    def test_limpeza_remove_indice_expirado(self):
+        PagamentoMPProcessado.objects.create(
+            conta="ULTRAMED",
+            payment_id="1",
+            status="approved",
+            expira_em=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(limpar_pagamentos_expirados(), 1)
+        self.assertFalse(PagamentoMPProcessado.objects.exists())
@@ -0,0 +1,107 @@
+"""Listagem de pacientes paginada por cursor (cliente_list / master_dashboard)."""
+
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao.models import Paciente, Plano
+from core_gestao.paginacao import decodificar_cursor, codificar_cursor
+
+
+class PaginacaoPacientesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="recepcao", password="senha-teste-123")
+        User.objects.create_user(username="master", password="senha-teste-123")
+        plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=79.90)
+        cls.titulares = []
+        for i in range(7):
+            t = Paciente.objects.create(
+                nome_completo=f"Titular {i}",
+                cpf=f"7000000000{i}",
+                telefone="94000000000",
+                data_nascimento=date(1980, 1, 1),
+                plano=plano,
+                is_titular=True,
+            )
+            cls.titulares.append(t)
+        for j in range(2):
+            Paciente.objects.create(
+                nome_completo=f"Dependente {j}",
+                cpf=f"7100000000{j}",
+                telefone="94000000000",
+                data_nascimento=date(2010, 1, 1),
+                is_titular=False,
+                responsavel=cls.titulares[0],
+            )
+        # Empate em data_cadastro: o id desempata sem repetir nem pular
+        Paciente.objects.filter(pk__in=[t.pk for t in cls.titulares[2:5]]).update(
+            data_cadastro=timezone.now()
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.login(username="recepcao", password="senha-teste-123")
+        self.url = reverse("sistema_interno:cliente_list")
+
+    def _todas_as_paginas(self):
+        ids, cursor, paginas = [], None, 0
+        while True:
+            params = {"formato": "json", "tamanho": 3}
+            if cursor:
+                params["cursor"] = cursor
+            data = self.client.get(self.url, params).json()
+            ids += [p["id"] for p in data["itens"]]
+            paginas += 1
+            cursor = data["proximo_cursor"]
+            if not cursor:
+                return ids, paginas, data
+
+    def test_cursor_percorre_todos_sem_repetir(self):
+        ids, paginas, data = self._todas_as_paginas()
+        self.assertEqual(sorted(ids), sorted(t.pk for t in self.titulares))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(paginas, 3)
+        self.assertEqual(data["total_estimado"], 7)
+
+    def test_dependentes_anotados_e_plano_sem_n_mais_1(self):
+        data = self.client.get(self.url, {"formato": "json", "tamanho": 50}).json()
+        por_id = {p["id"]: p for p in data["itens"]}
+        self.assertEqual(por_id[self.titulares[0].pk]["qtd_dependentes"], 2)
+        self.assertEqual(por_id[self.titulares[1].pk]["qtd_dependentes"], 0)
+        self.assertEqual(por_id[self.titulares[1].pk]["plano"], "MASTER")
+
+        with CaptureQueriesContext(connection) as ctx:
+            r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 200)
+        consultas_paciente = [
+            q for q in ctx.captured_queries if 'FROM "core_gestao_paciente"' in q["sql"]
+        ]
+        # Página (com plano e dependentes) apenas; a contagem veio do cache
+        self.assertEqual(len(consultas_paciente), 1)
+        self.assertContains(r, "2 dependentes")
+
+    def test_cursor_invalido_volta_a_primeira_pagina(self):
+        self.assertIsNone(decodificar_cursor("!!lixo"))
+        r = self.client.get(self.url, {"formato": "json", "cursor": "lixo", "tamanho": "x"})
+        self.assertEqual(len(r.json()["itens"]), 7)
+
+    def test_cursor_ida_e_volta(self):
+        t = Paciente.objects.get(pk=self.titulares[3].pk)
+        self.assertEqual(
+            decodificar_cursor(codificar_cursor(t.data_cadastro, t.pk)), (t.data_cadastro, t.pk)
+        )
+
+    def test_master_dashboard_paginado(self):
+        self.client.login(username="master", password="senha-teste-123")
+        r = self.client.get(reverse("sistema_interno:master_dashboard"))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(len(r.context["pacientes_lista"]), 7)
+        self.assertEqual(r.context["total_pacientes_lista"], 7)
+        self.assertIsNone(r.context["pacientes_proxima_url"])
@@ -0,0 +1,80 @@
+"""Perfil por request: consultas, repetidas, templates e HTTP externo por rota."""
+
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from core_gestao import perfil_requests
+from core_gestao.models import Paciente
+
+
+@override_settings(PERFIL_REQUESTS=True, PERFIL_LENTO_MS=60_000, PERFIL_JANELA=50)
+class PerfilRequestsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="master", password="senha-teste-123")
+        for i in range(3):
+            Paciente.objects.create(
+                nome_completo=f"Perfil {i}",
+                cpf=f"7000000000{i}",
+                telefone="94000000000",
+                data_nascimento=date(1990, 1, 1),
+                sexo="F",
+            )
+
+    def setUp(self):
+        perfil_requests.zerar_perfil()
+        self.addCleanup(perfil_requests.zerar_perfil)
+
+    def _medir(self, view, rota="teste:view"):
+        request = RequestFactory().get("/")
+        request.resolver_match = type("Match", (), {"view_name": rota})()
+        return perfil_requests.PerfilRequestsMiddleware(view)(request)
+
+    def test_desligado_sai_da_pilha(self):
+        with override_settings(PERFIL_REQUESTS=False):
+            with self.assertRaises(MiddlewareNotUsed):
+                perfil_requests.PerfilRequestsMiddleware(lambda r: HttpResponse())
+
+    def test_consultas_repetidas_e_http_externo(self):
+        def view(request):
+            # N+1: uma consulta por paciente com o mesmo SQL
+            for pk in Paciente.objects.values_list("pk", flat=True):
+                Paciente.objects.filter(responsavel_id=pk).exists()
+            with perfil_requests.medir_http("mercadopago"):
+                pass
+            return HttpResponse()
+
+        self._medir(view)
+        rota = perfil_requests.estatisticas_perfil()["rotas"]["teste:view"]
+        self.assertEqual(rota["consultas"]["max"], 4)
+        self.assertEqual(rota["http_ms"]["mercadopago"]["requests"], 1)
+        [repetida] = rota["consultas_repetidas"]
+        self.assertEqual((repetida["requests"], repetida["max_por_request"]), (1, 3))
+        self.assertIn("WHERE", repetida["sql"])
+        self.assertNotIn("70000000", repetida["sql"])
+        self.assertEqual(sum(rota["histograma_ms"].values()), 1)
+
+    def test_impressao_ignora_valores(self):
+        self.assertEqual(
+            perfil_requests.impressao_sql("SELECT 1 FROM t WHERE a = 'x'  AND b IN (%s, %s, %s)"),
+            perfil_requests.impressao_sql("SELECT 2 FROM t WHERE a = 'yy' AND b IN (%s)"),
+        )
+
+    def test_endpoint_master_e_log_de_lentos(self):
+        self.client.login(username="master", password="senha-teste-123")
+        with override_settings(PERFIL_LENTO_MS=0):
+            with self.assertLogs("core_gestao.perfil_requests", "WARNING") as logs:
+                self.client.get(reverse("sistema_interno:cliente_list"))
+        self.assertIn("sistema_interno:cliente_list", logs.output[0])
+
+        dados = self.client.get(reverse("sistema_interno:api_perfil")).json()
+        self.assertTrue(dados["ativo"])
+        rota = dados["rotas"]["sistema_interno:cliente_list"]
+        self.assertEqual(rota["requests"], 1)
+        self.assertGreater(rota["consultas"]["max"], 0)
+        self.assertGreater(rota["template_ms"]["media"], 0)
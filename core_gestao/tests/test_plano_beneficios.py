@@ -1,7 +1,10 @@
 """Testes de plano, checkout, descontos e confirmação de fatura."""
 
+import json
 from datetime import date, timedelta
+from unittest import mock
 
+from django.contrib.auth import hashers
 from django.contrib.auth.models import User
 from django.test import TestCase
 from django.urls import reverse
@@ -10,11 +13,13 @@ from django.utils import timezone
 from core_gestao.models import Fatura, Paciente, Plano, Prontuario
 from core_gestao.plano_utils import (
     avaliar_desconto_procedimento,
+    avaliar_descontos_em_lote,
     calcular_valor_com_desconto,
     gerar_acesso_checkout,
     gerar_checkout_token,
     max_dependentes_plano,
     percentual_desconto,
+    procedimento_coberto_pelo_plano,
     resolver_plano,
     validar_acesso_checkout,
     validar_checkout_token,
@@ -112,6 +117,56 @@ class DescontoPlanoTests(TestCase):
             percentual_desconto(self.paciente, procedimento_id="consulta_clinica"), 0.30
         )
 
+    def test_lote_resolve_uso_no_mes_numa_consulta(self):
+        medico = User.objects.create_user(username="medlote", password="x")
+        outro = Paciente.objects.create(
+            nome_completo="Titular Lote",
+            cpf="12345678902",
+            telefone="94000000098",
+            data_nascimento=date(1990, 1, 1),
+            sexo="F",
+            is_titular=True,
+            plano=self.plano,
+            vencimento_plano=date(2030, 1, 1),
+        )
+        Prontuario.objects.create(paciente=outro, medico=medico, evolucao="ok")
+        procs = ["usg_abdomen", "holter_24h", "endoscopia_digestiva", "consulta_clinica"]
+        pacientes = list(Paciente.objects.select_related("plano").order_by("id"))
+
+        with self.assertNumQueries(1):
+            lote = avaliar_descontos_em_lote(pacientes, procs)
+
+        self.assertEqual(len(lote), len(pacientes) * len(procs))
+        for info in lote:
+            paciente_id = info.pop("paciente_id")
+            paciente = next(p for p in pacientes if p.id == paciente_id)
+            self.assertEqual(
+                info, avaliar_desconto_procedimento(paciente, procedimento_id=info["procedimento_id"])
+            )
+        self.assertEqual(
+            [i["percentual"] for i in lote if i["procedimento_id"] == "usg_abdomen"], [0.30, 0.20]
+        )
+
+    def test_endpoint_lote(self):
+        self.client.force_login(User.objects.create_user(username="recepcao", password="x"))
+        r = self.client.get(
+            reverse("sistema_interno:api_descontos_lote"),
+            {
+                "paciente_id": [self.paciente.id, 999999, f"0{self.paciente.id}", "0999999"],
+                "procedimento_id": "usg_abdomen,endoscopia_digestiva",
+            },
+        )
+        self.assertEqual(r.status_code, 200)
+        d = r.json()
+        self.assertEqual(d["nao_encontrados"], [999999])
+        self.assertEqual(
+            [(i["procedimento_id"], i["percentual"], i["coberto"]) for i in d["resultados"]],
+            [("usg_abdomen", 0.30, True), ("endoscopia_digestiva", 0.0, False)],
+        )
+        self.assertEqual(d["resultados"][0]["plano"], "ESSENCIAL")
+        r = self.client.get(reverse("sistema_interno:api_descontos_lote"), {"paciente_id": "x"})
+        self.assertEqual(r.status_code, 400)
+
 
 class CoberturaProcedimentoTests(TestCase):
     @classmethod
@@ -165,6 +220,12 @@ class CoberturaProcedimentoTests(TestCase):
             200.0,
         )
 
+    def test_matcher_compilado_igual_varredura_linear(self):
+        from core_gestao.benchmarks.cobertura import casos, cobertura_linear
+
+        for caso in casos():
+            self.assertEqual(procedimento_coberto_pelo_plano(*caso), cobertura_linear(*caso), caso)
+
 
 class CatalogoProcedimentosTests(TestCase):
     def test_todos_ids_unicos(self):
@@ -253,3 +314,113 @@ class CadastroCheckoutFlowTests(TestCase):
 
         user = User.objects.get(username="33322211100")
         self.assertTrue(user.check_password("33322211100"))
+
+
+class LoginPosPagamentoTests(TestCase):
+    def setUp(self):
+        plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        self.paciente = Paciente.objects.create(
+            nome_completo="Pac Polling",
+            cpf="66655544433",
+            telefone="94000000077",
+            data_nascimento=date(1985, 5, 5),
+            sexo="F",
+            is_titular=True,
+        )
+        User.objects.create_user(username="66655544433", password="66655544433")
+        self.fatura = Fatura.objects.create(
+            paciente=self.paciente,
+            plano=plano,
+            valor=718.80,
+            data_vencimento=timezone.now().date(),
+            status="PAGO",
+            metodo_pagamento="PIX",
+            mercadopago_id="mp-777",
+        )
+        self.token = gerar_checkout_token(self.fatura.id, self.paciente.id, plano.id)
+
+    def _poll(self, token=None):
+        return self.client.post(
+            reverse("sistema_interno:status_pagamento"),
+            data=json.dumps(
+                {"external_reference": self.fatura.id, "checkout_token": token or self.token}
+            ),
+            content_type="application/json",
+        )
+
+    def test_hash_da_senha_roda_uma_vez_por_checkout(self):
+        with mock.patch(
+            "django.contrib.auth.base_user.check_password", wraps=hashers.check_password
+        ) as check:
+            for _ in range(5):
+                r = self._poll()
+                self.assertEqual(r.json()["status"], "approved")
+        self.assertEqual(check.call_count, 1)
+        self.assertEqual(
+            self.client.session["_auth_user_id"],
+            str(User.objects.get(username="66655544433").pk),
+        )
+
+    def test_senha_trocada_nao_loga_e_nao_repete_hash(self):
+        user = User.objects.get(username="66655544433")
+        user.set_password("outra-senha-123")
+        user.save()
+        with mock.patch(
+            "django.contrib.auth.base_user.check_password", wraps=hashers.check_password
+        ) as check:
+            for _ in range(3):
+                self._poll()
+        self.assertEqual(check.call_count, 1)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+
+class PreferenciaCheckoutTests(TestCase):
+    def setUp(self):
+        self.plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        self.paciente = Paciente.objects.create(
+            nome_completo="Pac Preferencia",
+            cpf="77766655544",
+            telefone="94000000066",
+            data_nascimento=date(1987, 7, 7),
+            sexo="M",
+            is_titular=True,
+        )
+        self.url = reverse(
+            "sistema_interno:checkout_pagamento", args=[self.paciente.id, self.plano.id]
+        )
+        self.token = gerar_acesso_checkout(self.paciente.id, self.plano.id)
+        self.seq = 0
+
+    def _criar_preferencia(self, _metodo, dados):
+        self.seq += 1
+        return {"status": 201, "response": {"id": f"pref-{self.seq}", "dados": dados}}
+
+    def _abrir(self):
+        r = self.client.get(self.url, {"t": self.token})
+        self.assertEqual(r.status_code, 200)
+        return r.context["preference_id"]
+
+    def test_reaproveita_preferencia_da_fatura_pendente(self):
+        with mock.patch("core_gestao.views.mp_sdk"), mock.patch(
+            "core_gestao.views.mp_call", side_effect=self._criar_preferencia
+        ) as mp_call:
+            self.assertEqual(self._abrir(), "pref-1")
+            self.assertEqual(self._abrir(), "pref-1")
+            self.assertEqual(mp_call.call_count, 1)
+
+            fatura = Fatura.objects.get(paciente=self.paciente)
+            self.assertEqual(fatura.preferencia_id, "pref-1")
+            self.assertEqual(float(fatura.preferencia_valor), float(fatura.valor))
+
+            # Valor da fatura alterado: nova preferência
+            fatura.valor = 100
+            fatura.save()
+            self.assertEqual(self._abrir(), "pref-2")
+
+            # Preferência perto de expirar: renova
+            Fatura.objects.filter(id=fatura.id).update(
+                preferencia_expira_em=timezone.now() + timedelta(minutes=1)
+            )
+            self.assertEqual(self._abrir(), "pref-3")
+            self.assertEqual(self._abrir(), "pref-3")
+            self.assertEqual(mp_call.call_count, 3)
@@ -0,0 +1,104 @@
+"""Rate limiting compartilhado (janela deslizante e token bucket no banco)."""
+
+from unittest import mock
+
+from django.db.models.query import QuerySet
+from django.test import TestCase
+from django.urls import reverse
+
+from core_gestao import rate_limit
+from core_gestao.models import LeadSite, RateLimitBalde, RateLimitJanela
+
+
+class _Relogio:
+    def __init__(self, agora):
+        self.agora = agora
+
+    def __call__(self):
+        return self.agora
+
+
+class JanelaDeslizanteTests(TestCase):
+    def setUp(self):
+        self.relogio = _Relogio(1_000_040.0)  # 20s após o início de uma janela de 60s
+        patcher = mock.patch("core_gestao.rate_limit.time.time", self.relogio)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _tentar(self):
+        return rate_limit.janela_deslizante("t:1.2.3.4", "t", limite=3, periodo=60)
+
+    def test_limite_e_bloqueados_nao_consomem_cota(self):
+        self.assertEqual([self._tentar() for _ in range(5)], [True, True, True, False, False])
+        janela = RateLimitJanela.objects.get(chave="t:1.2.3.4")
+        self.assertEqual((janela.permitidos, janela.bloqueados), (3, 2))
+
+    def test_janela_anterior_pesa_pela_fracao_coberta(self):
+        for _ in range(3):
+            self._tentar()
+        # Próxima janela, 30s dentro: metade das 3 anteriores ainda conta (1,5)
+        self.relogio.agora += 70
+        self.assertEqual([self._tentar() for _ in range(2)], [True, False])
+        # Duas janelas depois: nada do histórico conta
+        self.relogio.agora += 120
+        self.assertEqual([self._tentar() for _ in range(4)], [True, True, True, False])
+
+
+class TokenBucketTests(TestCase):
+    def test_rajada_ate_capacidade_e_reposicao(self):
+        relogio = _Relogio(5000.0)
+        with mock.patch("core_gestao.rate_limit.time.time", relogio):
+            tentar = lambda: rate_limit.token_bucket("b:ip", "b", capacidade=2, periodo=60)
+            self.assertEqual([tentar(), tentar(), tentar()], [True, True, False])
+            relogio.agora += 30  # repõe 1 token
+            self.assertEqual([tentar(), tentar()], [True, False])
+        balde = RateLimitBalde.objects.get(chave="b:ip")
+        self.assertEqual((balde.permitidos, balde.bloqueados), (3, 2))
+
+        stats = rate_limit.estatisticas_rate_limit()
+        self.assertEqual(stats["regras"]["b"], {"permitidos": 3, "bloqueados": 2, "chaves": 1})
+        self.assertEqual(stats["mais_bloqueadas"][0]["chave"], "b:ip")
+
+    def test_chave_nova_nao_e_lida_com_trava(self):
+        # Leitura travada de chave inexistente = gap lock (deadlock no MariaDB)
+        travar = QuerySet.select_for_update
+        existia = []
+
+        def espiar(qs, *args, **kwargs):
+            if qs.model is RateLimitBalde:
+                existia.append(RateLimitBalde.objects.filter(chave="b:novo").exists())
+            return travar(qs, *args, **kwargs)
+
+        with mock.patch.object(QuerySet, "select_for_update", espiar):
+            self.assertTrue(rate_limit.token_bucket("b:novo", "b", capacidade=2, periodo=60))
+            self.assertTrue(rate_limit.token_bucket("b:novo", "b", capacidade=2, periodo=60))
+        self.assertEqual(existia, [True, True])
+        self.assertEqual(RateLimitBalde.objects.get(chave="b:novo").permitidos, 2)
+
+
+class RateLimitViewsTests(TestCase):
+    def test_lead_capture_responde_429_json(self):
+        url = reverse("sistema_interno:lead_capture")
+        dados = {"nome": "Lead", "telefone": "94999999999"}
+        for _ in range(20):
+            self.assertEqual(self.client.post(url, dados).status_code, 200)
+        r = self.client.post(url, dados, HTTP_ACCEPT="application/json")
+        self.assertEqual(r.status_code, 429)
+        self.assertIn("Retry-After", r)
+        self.assertFalse(r.json()["success"])
+        self.assertEqual(LeadSite.objects.count(), 20)
+        # Outro IP (X-Real-IP do nginx) tem cota própria
+        r = self.client.post(url, dados, HTTP_X_REAL_IP="10.0.0.9")
+        self.assertEqual(r.status_code, 200)
+
+    def test_login_limita_so_post(self):
+        url = reverse("sistema_interno:login")
+        for _ in range(10):
+            self.client.post(url, {"username": "x", "password": "y"})
+        self.assertEqual(self.client.post(url, {"username": "x", "password": "y"}).status_code, 429)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_limpeza_remove_expirados(self):
+        rate_limit.janela_deslizante("t:x", "t", limite=1, periodo=1)
+        RateLimitJanela.objects.update(expira_em="2000-01-01T00:00:00Z")
+        self.assertEqual(rate_limit.limpar_rate_limit_expirado(), 1)
@@ -0,0 +1,96 @@
+"""Receita mensal pré-calculada: atualização no pagamento, dashboard e verificador."""
+
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core_gestao.models import Fatura, Paciente, Plano, ReceitaMensal
+from core_gestao.receita_mensal import reconstruir_receita, resumo_mes, verificar_receita
+from core_gestao.views import _confirmar_fatura_paga
+
+
+class ReceitaMensalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username="master", password="senha-teste-123")
+        cls.plano = Plano.objects.create(nome="MASTER", descricao="", valor_anual=59.90)
+        cls.paciente = Paciente.objects.create(
+            nome_completo="Pac Receita",
+            cpf="12312312399",
+            telefone="94000000055",
+            data_nascimento=date(1985, 5, 5),
+            sexo="F",
+            is_titular=True,
+        )
+
+    def setUp(self):
+        self.client.login(username="master", password="senha-teste-123")
+        self.hoje = timezone.now().date()
+
+    def _fatura(self, valor, metodo="PIX", **extra):
+        dados = {
+            "paciente": self.paciente,
+            "plano": self.plano,
+            "valor": valor,
+            "data_vencimento": self.hoje,
+            "status": "PENDENTE",
+            "metodo_pagamento": metodo,
+        }
+        dados.update(extra)
+        return Fatura.objects.create(**dados)
+
+    def test_confirmacao_repetida_soma_uma_vez(self):
+        fatura = self._fatura(Decimal("718.80"))
+        self.assertTrue(_confirmar_fatura_paga(fatura, "mp-1", 718.80))
+        self.assertTrue(_confirmar_fatura_paga(Fatura.objects.get(id=fatura.id), "mp-1", 718.80))
+        linha = ReceitaMensal.objects.get(ano=self.hoje.year, mes=self.hoje.month, metodo_pagamento="PIX")
+        self.assertEqual((linha.soma, linha.quantidade), (Decimal("718.80"), 1))
+
+    def test_store_baixar_e_agregado_no_dashboard(self):
+        self.client.post(
+            reverse("sistema_interno:fatura_store"),
+            {
+                "paciente": str(self.paciente.id),
+                "metodo_pagamento": "CARTAO",
+                "valor": "80,50",
+                "status": "PAGO",
+            },
+        )
+        pendente = self._fatura(Decimal("59.90"), metodo=None)
+        self.client.get(reverse("sistema_interno:fatura_baixar", args=[pendente.id]))
+        self.client.get(reverse("sistema_interno:fatura_baixar", args=[pendente.id]))
+        self.assertEqual(verificar_receita(), [])
+
+        with self.assertNumQueries(1):
+            resumo = resumo_mes(self.hoje.year, self.hoje.month)
+        self.assertEqual(resumo["total"], Decimal("140.40"))
+        self.assertEqual(resumo["quantidade"], 2)
+        self.assertEqual(
+            [r["metodo_pagamento"] for r in resumo["por_metodo"]], [None, "CARTAO"]
+        )
+        r = self.client.get(reverse("sistema_interno:master_dashboard"))
+        self.assertEqual(r.context["faturamento_total"], Decimal("140.40"))
+        self.assertEqual(r.context["qtd_recebimentos_periodo"], 2)
+
+    def test_verificador_aponta_e_reconstrucao_corrige(self):
+        self._fatura(Decimal("44.90"), status="PAGO", data_pagamento=date(2025, 12, 31))
+        self._fatura(Decimal("10.00"), status="PAGO", data_pagamento=date(2026, 1, 1))
+        divergencias = verificar_receita()
+        self.assertEqual([(d["ano"], d["mes"]) for d in divergencias], [(2025, 12), (2026, 1)])
+
+        with self.assertRaises(CommandError):
+            call_command("reconstruir_receita_mensal", "--verificar", stdout=StringIO())
+        self.assertEqual(reconstruir_receita(2025, 12), 1)
+        self.assertEqual([(d["ano"], d["mes"]) for d in verificar_receita()], [(2026, 1)])
+
+        call_command("reconstruir_receita_mensal", stdout=StringIO())
+        out = StringIO()
+        call_command("reconstruir_receita_mensal", "--verificar", stdout=out)
+        self.assertIn("consistente", out.getvalue())
+        self.assertEqual(resumo_mes(2025, 12)["total"], Decimal("44.90"))
@@ -1,9 +1,12 @@
 """Testes de segurança complementares."""
 
+import shutil
+import tempfile
 from datetime import date
 
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.files.base import ContentFile
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 from core_gestao.models import Exame, Fatura, Paciente, Plano
@@ -92,6 +95,38 @@ class MediaProtegidaTests(TestCase):
         r = c.get(url)
         self.assertEqual(r.status_code, 404)
 
+    def _exame_com_arquivo(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajuste = override_settings(MEDIA_ROOT=media)
+        ajuste.enable()
+        self.addCleanup(ajuste.disable)
+        self.exame.arquivo.save("laudo-ção.pdf", ContentFile(b"%PDF-1.4 teste"))
+        c = Client(HTTP_HOST="ultramedsaudexingu.com.br")
+        c.login(username="55566677788", password="55566677788")
+        return c, reverse("sistema_interno:download_exame_arquivo", args=[self.exame.id])
+
+    @override_settings(MEDIA_X_ACCEL_REDIRECT=True)
+    def test_download_delegado_ao_nginx(self):
+        c, url = self._exame_com_arquivo()
+        r = c.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.content, b"")
+        # Caminho relativo ao MEDIA_ROOT, codificado para o nginx
+        self.assertTrue(r["X-Accel-Redirect"].startswith("/protegido/media/exames/"))
+        self.assertTrue(r["X-Accel-Redirect"].endswith("/laudo-%C3%A7%C3%A3o.pdf"))
+        self.assertEqual(r["Content-Type"], "application/pdf")
+        self.assertEqual(r["Content-Disposition"], "attachment; filename*=utf-8''laudo-%C3%A7%C3%A3o.pdf")
+        self.assertIn("private", r["Cache-Control"])
+
+    @override_settings(MEDIA_X_ACCEL_REDIRECT=False)
+    def test_download_direto_sem_nginx(self):
+        c, url = self._exame_com_arquivo()
+        r = c.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn("X-Accel-Redirect", r)
+        self.assertEqual(b"".join(r.streaming_content), b"%PDF-1.4 teste")
+
 
 class CadastroDuplicadoTests(TestCase):
     def setUp(self):
@@ -0,0 +1,142 @@
+"""TV da sala de espera: polling com ETag/304 e canal SSE (ASGI)."""
+
+import asyncio
+from datetime import date
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core_gestao import cache_utils, tv_eventos
+from core_gestao.models import ChamadaPainel, Paciente
+
+
+class TVEventosTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcao = User.objects.create_user(username="recepcao", password="senha-teste-123")
+        cls.master = User.objects.create_user(username="master", password="senha-teste-123")
+        cls.paciente = Paciente.objects.create(
+            nome_completo="Paciente SSE",
+            cpf="31313131313",
+            telefone="94000000031",
+            data_nascimento=date(1990, 1, 1),
+            sexo="F",
+            is_titular=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        cache_utils.zerar_estatisticas()
+        tv_eventos.canal_chamadas = tv_eventos.CanalChamadas()
+        self.url = reverse("sistema_interno:api_tv_eventos")
+
+    async def _proximos(self, response, n):
+        it = response.streaming_content.__aiter__()
+        chunks = []
+        for _ in range(n):
+            chunk = await asyncio.wait_for(it.__anext__(), 5)
+            chunks.append(chunk.decode() if isinstance(chunk, bytes) else chunk)
+        return chunks
+
+    def test_polling_responde_304_sem_consultar_chamada(self):
+        self.client.force_login(self.recepcao)
+        ChamadaPainel.registrar(self.paciente, "Consultório 1")
+        url = reverse("sistema_interno:api_tv_chamada")
+        r = self.client.get(url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r.json()["ativa"])
+        self.assertNotIn("restante", r.json())
+        self.assertEqual(r.json()["duracao"], tv_eventos.TV_CHAMADA_SEGUNDOS)
+        etag = r["ETag"]
+
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(3):
+                r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(r.status_code, 304)
+        self.assertFalse(any("chamadapainel" in q["sql"] for q in ctx.captured_queries))
+
+        ChamadaPainel.registrar(self.paciente, "Consultório 2")
+        r = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
+        self.assertEqual(r.json()["consultorio"], "Consultório 2")
+
+        self.client.force_login(self.master)
+        stats = self.client.get(reverse("sistema_interno:api_tv_diagnostico")).json()
+        self.assertEqual((stats["respostas_304"], stats["respostas_200"]), (3, 2))
+        self.assertEqual(stats["taxa_304"], 0.6)
+        # Somados no banco como os demais contadores: limpar o cache não os perde
+        cache.clear()
+        self.assertEqual(
+            cache_utils.contadores(tv_eventos.GRUPO_RESPOSTAS), {"respostas_304": 3, "respostas_200": 2}
+        )
+
+    def test_etag_muda_quando_chamada_expira(self):
+        chamada = ChamadaPainel.registrar(self.paciente, "Consultório 1")
+        versao = tv_eventos.versao_chamada(chamada)
+        self.assertTrue(tv_eventos.chamada_ativa(versao))
+        depois = int(versao) / 1000 + tv_eventos.TV_CHAMADA_SEGUNDOS + 1
+        self.assertFalse(tv_eventos.chamada_ativa(versao, agora=depois))
+        with mock.patch("core_gestao.tv_eventos.time.time", return_value=depois):
+            self.assertNotEqual(tv_eventos.etag_chamada(versao), f'"tv-{versao}-1"')
+
+    def test_wsgi_responde_503_para_fallback_em_polling(self):
+        self.client.force_login(self.recepcao)
+        r = self.client.get(self.url)
+        self.assertEqual(r.status_code, 503)
+
+    async def test_anonimo_bloqueado(self):
+        r = await self.async_client.get(self.url)
+        self.assertEqual(r.status_code, 403)
+
+    async def test_envia_chamada_atual_e_nova_chamada(self):
+        await sync_to_async(self.async_client.force_login)(self.recepcao)
+        await sync_to_async(ChamadaPainel.registrar)(self.paciente, "Consultório 1")
+        with mock.patch.object(tv_eventos, "TV_EVENTOS_INTERVALO", 0.05):
+            r = await self.async_client.get(self.url)
+            self.assertEqual(r.status_code, 200)
+            self.assertEqual(r["Content-Type"], "text/event-stream; charset=utf-8")
+            retry, evento = await self._proximos(r, 2)
+            self.assertTrue(retry.startswith("retry:"))
+            self.assertIn("event: chamada", evento)
+            self.assertIn("Paciente SSE", evento)
+            primeiro_id = evento.split("\n", 1)[0]
+
+            await asyncio.sleep(0.01)
+            await sync_to_async(ChamadaPainel.registrar)(self.paciente, "Consultório 2")
+            (novo,) = await self._proximos(r, 1)
+            self.assertIn("Consultório 2", novo)
+            self.assertNotEqual(novo.split("\n", 1)[0], primeiro_id)
+            await r.streaming_content.aclose()
+
+    async def test_last_event_id_atual_so_recebe_heartbeat(self):
+        await sync_to_async(self.async_client.force_login)(self.recepcao)
+        chamada = await sync_to_async(ChamadaPainel.registrar)(self.paciente, "Consultório 1")
+        versao = tv_eventos.versao_chamada(chamada)
+        with mock.patch.object(tv_eventos, "TV_EVENTOS_HEARTBEAT", 0.05):
+            r = await self.async_client.get(self.url, headers={"Last-Event-ID": versao})
+            _, ping = await self._proximos(r, 2)
+            self.assertEqual(ping, ": ping\n\n")
+            await r.streaming_content.aclose()
+
+    async def test_stream_encerra_apos_duracao_maxima(self):
+        await sync_to_async(self.async_client.force_login)(self.recepcao)
+        with mock.patch.object(tv_eventos, "TV_EVENTOS_DURACAO_MAX", 0.2), mock.patch.object(
+            tv_eventos, "TV_EVENTOS_HEARTBEAT", 0.05
+        ):
+            r = await self.async_client.get(self.url)
+            chunks = []
+
+            async def consumir():
+                async for chunk in r.streaming_content:
+                    chunks.append(chunk)
+
+            await asyncio.wait_for(consumir(), 5)
+        self.assertTrue(chunks[0].decode().startswith("retry:"))
+        self.assertEqual(tv_eventos.canal_chamadas._ouvintes, 0)
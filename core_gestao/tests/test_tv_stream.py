@@ -0,0 +1,156 @@
+"""Vídeo ao vivo da TV: refresher fora do request com YouTube simulado localmente."""
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from core_gestao import tv_stream
+
+_PADDING = " " * 300
+LIVE_HTML = (
+    '"videoId":"AAAAAAAAAAA","title":"x"' + _PADDING
+    + '"videoId":"BBBBBBBBBBB","isLiveNow":true' + _PADDING
+    + '"videoId":"CCCCCCCCCCC"'
+)
+RSS = (
+    '<feed xmlns="http://www.w3.org/2005/Atom" '
+    'xmlns:yt="http://www.youtube.com/xml/schemas/2015">'
+    "<entry><yt:videoId>DDDDDDDDDDD</yt:videoId></entry></feed>"
+)
+
+
+class _FakeYouTubeHandler(BaseHTTPRequestHandler):
+    # video_id -> (ao vivo?, atraso em segundos)
+    watch = {}
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path.endswith("/live"):
+            body = LIVE_HTML
+        elif url.path.startswith("/feeds/"):
+            body = RSS
+        elif url.path == "/watch":
+            vid = parse_qs(url.query).get("v", [""])[0]
+            ao_vivo, atraso = self.watch.get(vid, (False, 0))
+            time.sleep(atraso)
+            body = '"isLiveNow":true' if ao_vivo else '"isLiveNow":false'
+        else:
+            self.send_error(404)
+            return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class _YouTubeFixtureMixin:
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeYouTubeHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        _FakeYouTubeHandler.watch = {}
+
+
+class ResolverVideoTests(_YouTubeFixtureMixin, SimpleTestCase):
+    def test_prioriza_candidato_confirmado_ao_vivo(self):
+        _FakeYouTubeHandler.watch = {
+            "BBBBBBBBBBB": (False, 0),
+            "DDDDDDDDDDD": (True, 0),
+            "AAAAAAAAAAA": (True, 0),
+        }
+        with override_settings(TV_YOUTUBE_BASE_URL=self.base_url):
+            self.assertEqual(tv_stream.resolver_video_id(prazo=5), "DDDDDDDDDDD")
+
+    def test_checagens_em_paralelo_respeitam_prazo_total(self):
+        # Cada watch page demora 2s: sequencial levaria 8s+
+        _FakeYouTubeHandler.watch = {
+            vid: (vid == "CCCCCCCCCCC", 2)
+            for vid in ("BBBBBBBBBBB", "DDDDDDDDDDD", "AAAAAAAAAAA", "CCCCCCCCCCC")
+        }
+        inicio = time.monotonic()
+        with override_settings(TV_YOUTUBE_BASE_URL=self.base_url):
+            video_id = tv_stream.resolver_video_id(prazo=4)
+        self.assertLess(time.monotonic() - inicio, 3.5)
+        self.assertEqual(video_id, "CCCCCCCCCCC")
+
+    def test_prazo_esgotado_usa_primeiro_candidato(self):
+        _FakeYouTubeHandler.watch = {"BBBBBBBBBBB": (True, 3)}
+        inicio = time.monotonic()
+        with override_settings(TV_YOUTUBE_BASE_URL=self.base_url):
+            video_id = tv_stream.resolver_video_id(prazo=1)
+        self.assertLess(time.monotonic() - inicio, 2)
+        self.assertEqual(video_id, "BBBBBBBBBBB")
+
+    def test_falha_mantem_video_anterior(self):
+        cache.set(tv_stream.TV_STREAM_CACHE_KEY, {"video_id": "XXXXXXXXXXX", "atualizado_em": 1}, None)
+        with override_settings(TV_YOUTUBE_BASE_URL="http://127.0.0.1:9"):
+            self.assertIsNone(tv_stream.atualizar_video_id(prazo=1))
+        estado = tv_stream.estado_video()
+        self.assertEqual(estado["video_id"], "XXXXXXXXXXX")
+        self.assertTrue(estado["desatualizado"])
+
+    def test_comando_grava_cache(self):
+        _FakeYouTubeHandler.watch = {"BBBBBBBBBBB": (True, 0)}
+        out = StringIO()
+        with override_settings(TV_YOUTUBE_BASE_URL=self.base_url):
+            call_command("atualizar_tv_stream", "--prazo", "5", stdout=out)
+        self.assertIn("BBBBBBBBBBB", out.getvalue())
+        estado = tv_stream.estado_video()
+        self.assertEqual(estado["video_id"], "BBBBBBBBBBB")
+        self.assertFalse(estado["desatualizado"])
+
+
+class TVStreamViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recepcao = User.objects.create_user(username="recepcao", password="senha-teste-123")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.recepcao)
+
+    def test_views_so_leem_cache(self):
+        cache.set(
+            tv_stream.TV_STREAM_CACHE_KEY,
+            {"video_id": "EEEEEEEEEEE", "atualizado_em": time.time()},
+            None,
+        )
+        with mock.patch("core_gestao.tv_stream.urlopen") as urlopen:
+            r = self.client.get(reverse("sistema_interno:tv_espera"))
+            self.assertContains(r, "EEEEEEEEEEE")
+            api = self.client.get(reverse("sistema_interno:api_tv_stream"), {"refresh": "1"})
+        urlopen.assert_not_called()
+        self.assertEqual(api.json()["video_id"], "EEEEEEEEEEE")
+        self.assertTrue(tv_stream.atualizacao_solicitada())
+
+    def test_sem_cache_usa_fallback(self):
+        with mock.patch("core_gestao.tv_stream.urlopen") as urlopen:
+            api = self.client.get(reverse("sistema_interno:api_tv_stream"))
+        urlopen.assert_not_called()
+        self.assertEqual(api.json()["video_id"], tv_stream.JP_NEWS_FALLBACK_VIDEO)
+        self.assertTrue(api.json()["desatualizado"])
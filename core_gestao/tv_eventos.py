@@ -0,0 +1,194 @@
+"""Chamadas da TV da sala de espera: versão em cache, payload e canal SSE (ASGI)."""
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from .cache_utils import contadores, contar, enviar_estatisticas
+from .models import ChamadaPainel
+
+TV_CHAMADA_SEGUNDOS = 25
+# Intervalo em que o processo ASGI confere se houve nova chamada (uma leitura
+# de cache por processo, não por TV conectada).
+TV_EVENTOS_INTERVALO = 1.0
+TV_EVENTOS_HEARTBEAT = 15.0
+TV_EVENTOS_RETRY_MS = 3000
+# O ASGIHandler do Django 4.2 não percebe a TV desconectando durante o stream
+# (o uvicorn descarta os send() em silêncio): cada conexão se encerra sozinha
+# depois deste tempo e o EventSource reconecta com Last-Event-ID.
+TV_EVENTOS_DURACAO_MAX = 300.0
+
+TV_VERSAO_CACHE_KEY = "tv_chamada_versao"
+TV_PAYLOAD_CACHE_KEY = "tv_chamada_payload:{}"
+TV_PAYLOAD_CACHE_TTL = 300
+GRUPO_RESPOSTAS = "tv"  # 200/304 do polling em ContadorEstatistica (cache_utils)
+
+
+def versao_chamada(chamada):
+    """Versão da chamada: instante em ms (muda a cada ``registrar``)."""
+    if not chamada:
+        return "0"
+    return str(int(chamada.chamada_em.timestamp() * 1000))
+
+
+def chamada_ativa(versao, agora=None):
+    if not versao or versao == "0":
+        return False
+    agora = time.time() if agora is None else agora
+    return agora - int(versao) / 1000 <= TV_CHAMADA_SEGUNDOS
+
+
+def payload_chamada(chamada=None):
+    """
+    JSON da chamada sem contagem regressiva: a TV calcula o restante a partir
+    de ``chamada_em`` + ``duracao``, então a resposta só muda com a versão.
+    """
+    chamada = chamada or ChamadaPainel.objects.filter(pk=1).first()
+    if not chamada:
+        return {"ativa": False}
+    if not chamada_ativa(versao_chamada(chamada)):
+        return {"ativa": False, "id": chamada.pk, "expirada": True}
+    return {
+        "ativa": True,
+        "id": chamada.pk,
+        "paciente_nome": chamada.paciente_nome,
+        "consultorio": chamada.consultorio,
+        "mensagem": chamada.mensagem,
+        "chamada_em": chamada.chamada_em.isoformat(),
+        "duracao": TV_CHAMADA_SEGUNDOS,
+    }
+
+
+def publicar_chamada(chamada):
+    """Grava a versão no cache compartilhado (chamado por ``ChamadaPainel.registrar``)."""
+    versao = versao_chamada(chamada)
+    cache.set(TV_VERSAO_CACHE_KEY, versao, None)
+    return versao
+
+
+def versao_atual():
+    versao = cache.get(TV_VERSAO_CACHE_KEY)
+    if versao is None:
+        versao = publicar_chamada(ChamadaPainel.objects.filter(pk=1).first())
+    return versao
+
+
+def etag_chamada(versao):
+    return f'"tv-{versao}-{1 if chamada_ativa(versao) else 0}"'
+
+
+def payload_atual(versao):
+    """(versao, payload) do cache; no miss monta do banco e guarda pela versão lida."""
+    payload = cache.get(TV_PAYLOAD_CACHE_KEY.format(etag_chamada(versao)))
+    if payload is not None:
+        return versao, payload
+    chamada = ChamadaPainel.objects.filter(pk=1).first()
+    versao = versao_chamada(chamada)
+    payload = payload_chamada(chamada)
+    cache.set(TV_PAYLOAD_CACHE_KEY.format(etag_chamada(versao)), payload, TV_PAYLOAD_CACHE_TTL)
+    return versao, payload
+
+
+def ler_chamada():
+    return payload_atual(versao_atual())
+
+
+def contar_resposta(status):
+    contar(GRUPO_RESPOSTAS, f"respostas_{status}")
+
+
+def estatisticas_tv():
+    enviar_estatisticas()
+    totais = contadores(GRUPO_RESPOSTAS)
+    r304 = totais.get("respostas_304", 0)
+    r200 = totais.get("respostas_200", 0)
+    total = r304 + r200
+    return {
+        "versao": cache.get(TV_VERSAO_CACHE_KEY),
+        "respostas_304": r304,
+        "respostas_200": r200,
+        "taxa_304": round(r304 / total, 3) if total else 0.0,
+    }
+
+
+def formatar_evento(versao, payload, evento="chamada"):
+    dados = json.dumps(payload, ensure_ascii=False)
+    return f"id: {versao}\nevent: {evento}\ndata: {dados}\n\n"
+
+
+class CanalChamadas:
+    """
+    Um vigia por processo ASGI: lê a versão no cache a cada TV_EVENTOS_INTERVALO
+    e acorda as conexões SSE só quando a versão muda. Para sem ouvintes.
+    """
+
+    def __init__(self):
+        self.versao = None
+        self.payload = None
+        self._ouvintes = 0
+        self._mudou = None
+        self._tarefa = None
+
+    async def _vigiar(self):
+        try:
+            while self._ouvintes > 0:
+                versao = await sync_to_async(versao_atual)()
+                if versao != self.versao:
+                    self.versao, self.payload = await sync_to_async(payload_atual)(versao)
+                    self._mudou.set()
+                    self._mudou = asyncio.Event()
+                await asyncio.sleep(TV_EVENTOS_INTERVALO)
+        finally:
+            self._tarefa = None
+
+    async def assinar(self):
+        self._ouvintes += 1
+        if self._mudou is None:
+            self._mudou = asyncio.Event()
+        if self._tarefa is None:
+            self._tarefa = asyncio.ensure_future(self._vigiar())
+        if self.versao is None:
+            self.versao, self.payload = await sync_to_async(ler_chamada)()
+
+    def cancelar(self):
+        self._ouvintes = max(0, self._ouvintes - 1)
+
+    async def aguardar(self, desde, timeout):
+        """Retorna (versao, payload) quando difere de ``desde``; None no timeout."""
+        if self.versao is not None and self.versao != desde:
+            return self.versao, self.payload
+        mudou = self._mudou
+        try:
+            await asyncio.wait_for(mudou.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        return self.versao, self.payload
+
+
+canal_chamadas = CanalChamadas()
+
+
+async def stream_chamadas(ultimo_id=None):
+    """
+    Gerador SSE: evento a cada nova chamada, comentário de heartbeat no ocioso.
+    Termina após TV_EVENTOS_DURACAO_MAX para não acumular ouvintes de TVs que caíram.
+    """
+    loop = asyncio.get_running_loop()
+    fim = loop.time() + TV_EVENTOS_DURACAO_MAX
+    await canal_chamadas.assinar()
+    try:
+        yield f"retry: {TV_EVENTOS_RETRY_MS}\n\n"
+        while True:
+            restante = fim - loop.time()
+            if restante <= 0:
+                return
+            novo = await canal_chamadas.aguardar(ultimo_id, min(TV_EVENTOS_HEARTBEAT, restante))
+            if novo is None:
+                yield ": ping\n\n"
+                continue
+            ultimo_id, payload = novo
+            yield formatar_evento(ultimo_id, payload)
+    finally:
+        canal_chamadas.cancelar()
@@ -0,0 +1,179 @@
+"""
+Vídeo ao vivo da TV (Jovem Pan News): resolução fora do request.
+
+O comando ``atualizar_tv_stream`` resolve o videoId e grava no cache; as views
+só leem o cache (stale-while-revalidate: um id antigo continua valendo até o
+próximo refresh bem-sucedido).
+"""
+import logging
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.request import Request, urlopen
+from xml.etree import ElementTree as ET
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .perfil_requests import medir_http
+
+logger = logging.getLogger(__name__)
+
+JP_NEWS_CHANNEL_ID = "UCP391YRAjSOdM_bwievgaZA"
+# Fallback conhecido (atualizado automaticamente quando o YouTube responde)
+JP_NEWS_FALLBACK_VIDEO = "4dFcj4OUzxM"
+
+TV_STREAM_CACHE_KEY = "tv_jp_news_video_id"
+TV_STREAM_REFRESH_KEY = "tv_jp_news_refresh"
+# Idade a partir da qual o id é considerado velho (o refresher renova antes)
+TV_STREAM_FRESCO_SEGUNDOS = 180
+TV_STREAM_PRAZO_SEGUNDOS = 20
+TV_STREAM_MAX_CANDIDATOS = 6
+HTTP_TIMEOUT = 8
+
+_RE_VIDEO_ID = r'"videoId":"([A-Za-z0-9_-]{11})"'
+_RE_LIVE_ANTES = re.compile(_RE_VIDEO_ID + r'.{0,240}"isLiveNow"\s*:\s*true', re.DOTALL)
+_RE_LIVE_DEPOIS = re.compile(r'"isLiveNow"\s*:\s*true.{0,240}' + _RE_VIDEO_ID, re.DOTALL)
+
+
+def _youtube_base_url():
+    return (getattr(settings, "TV_YOUTUBE_BASE_URL", "") or "https://www.youtube.com").rstrip("/")
+
+
+def _http_get_text(url, timeout=HTTP_TIMEOUT):
+    req = Request(
+        url,
+        headers={
+            "User-Agent": (
+                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+                "AppleWebKit/537.36 (KHTML, like Gecko) "
+                "Chrome/120.0.0.0 Safari/537.36"
+            ),
+            "Accept-Language": "pt-BR,pt;q=0.9",
+        },
+    )
+    with medir_http("youtube"), urlopen(req, timeout=timeout) as resp:
+        return resp.read().decode("utf-8", "ignore")
+
+
+def _ler_pagina_live(timeout):
+    """(id marcado isLiveNow, demais ids da página /live)."""
+    html = _http_get_text(f"{_youtube_base_url()}/channel/{JP_NEWS_CHANNEL_ID}/live", timeout)
+    m = _RE_LIVE_ANTES.search(html) or _RE_LIVE_DEPOIS.search(html)
+    outros = list(dict.fromkeys(re.findall(_RE_VIDEO_ID, html)))
+    return (m.group(1) if m else None), outros
+
+
+def _rss_ultimo_video_id(timeout):
+    feed = _http_get_text(
+        f"{_youtube_base_url()}/feeds/videos.xml?channel_id={JP_NEWS_CHANNEL_ID}", timeout
+    )
+    root = ET.fromstring(feed)
+    ns = {"yt": "http://www.youtube.com/xml/schemas/2015"}
+    node = root.find(".//yt:videoId", ns)
+    if node is not None and node.text:
+        return node.text.strip()
+    return None
+
+
+def _video_parece_ao_vivo(video_id, timeout):
+    """Confere se o vídeo ainda está marcado como live no YouTube."""
+    try:
+        html = _http_get_text(f"{_youtube_base_url()}/watch?v={video_id}", timeout)
+        return '"isLiveNow":true' in html or '"isLive":true' in html
+    except Exception:
+        return False
+
+
+def resolver_video_id(prazo=TV_STREAM_PRAZO_SEGUNDOS):
+    """
+    Resolve o videoId ao vivo em no máximo ``prazo`` segundos.
+
+    /live e RSS são lidos em paralelo; os candidatos (marcado como live, RSS,
+    demais ids do /live) são conferidos em paralelo na watch page. Vence o
+    primeiro da ordem de prioridade confirmado ao vivo; sem confirmação, o
+    primeiro candidato. None se o YouTube não respondeu nada útil.
+    """
+    limite = time.monotonic() + prazo
+
+    def restante():
+        return max(0.1, limite - time.monotonic())
+
+    pool = ThreadPoolExecutor(max_workers=2 + TV_STREAM_MAX_CANDIDATOS)
+    try:
+        f_live = pool.submit(_ler_pagina_live, min(HTTP_TIMEOUT, restante()))
+        f_rss = pool.submit(_rss_ultimo_video_id, min(HTTP_TIMEOUT, restante()))
+        wait([f_live, f_rss], timeout=restante())
+
+        marcado, outros = None, []
+        if f_live.done():
+            try:
+                marcado, outros = f_live.result()
+            except Exception as exc:
+                logger.warning("TV JP: falha ao ler /live: %s", exc)
+        rss = None
+        if f_rss.done():
+            try:
+                rss = f_rss.result()
+            except Exception as exc:
+                logger.warning("TV JP: falha no RSS: %s", exc)
+
+        candidatos = list(dict.fromkeys(c for c in [marcado, rss, *outros] if c))
+        candidatos = candidatos[: TV_STREAM_MAX_CANDIDATOS]
+        if not candidatos:
+            return None
+
+        checagens = {
+            pool.submit(_video_parece_ao_vivo, c, min(HTTP_TIMEOUT, restante())): c
+            for c in candidatos
+        }
+        ao_vivo = set()
+        pendentes = set(checagens)
+        while pendentes and time.monotonic() < limite:
+            feitos, pendentes = wait(pendentes, timeout=restante(), return_when=FIRST_COMPLETED)
+            ao_vivo.update(checagens[f] for f in feitos if f.result())
+            # Já dá para decidir se o melhor candidato ainda pendente não supera o confirmado
+            melhor = next((c for c in candidatos if c in ao_vivo), None)
+            if melhor and all(
+                candidatos.index(checagens[f]) > candidatos.index(melhor) for f in pendentes
+            ):
+                return melhor
+        return next((c for c in candidatos if c in ao_vivo), candidatos[0])
+    finally:
+        # Não espera checagens atrasadas: cada uma encerra pelo próprio timeout de socket
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def atualizar_video_id(prazo=TV_STREAM_PRAZO_SEGUNDOS):
+    """Resolve e grava no cache; em falha mantém o id anterior (stale)."""
+    cache.delete(TV_STREAM_REFRESH_KEY)
+    video_id = resolver_video_id(prazo)
+    if not video_id:
+        return None
+    cache.set(TV_STREAM_CACHE_KEY, {"video_id": video_id, "atualizado_em": time.time()}, None)
+    return video_id
+
+
+def estado_video():
+    """Leitura das views: nunca acessa a rede."""
+    dados = cache.get(TV_STREAM_CACHE_KEY) or {}
+    atualizado_em = dados.get("atualizado_em")
+    return {
+        "video_id": dados.get("video_id") or JP_NEWS_FALLBACK_VIDEO,
+        "atualizado_em": atualizado_em,
+        "desatualizado": not atualizado_em
+        or time.time() - atualizado_em > TV_STREAM_FRESCO_SEGUNDOS,
+    }
+
+
+def video_id_atual():
+    return estado_video()["video_id"]
+
+
+def solicitar_atualizacao():
+    """Pede ao refresher um novo resolve na próxima volta (botão da TV)."""
+    cache.set(TV_STREAM_REFRESH_KEY, True, TV_STREAM_FRESCO_SEGUNDOS)
+
+
+def atualizacao_solicitada():
+    return bool(cache.get(TV_STREAM_REFRESH_KEY))
@@ -17,6 +17,9 @@ urlpatterns = [
     path('medico/painel/', views.painel_medico, name='painel_medico'),
     path('medico/chamar/<int:paciente_id>/', views.chamar_paciente_tv, name='chamar_paciente_tv'),
     path('master/dashboard/', views.master_dashboard, name='master_dashboard'),
+    path('master/exportar/pacientes/', views.exportar_pacientes, name='exportar_pacientes'),
+    path('master/exportar/faturas/', views.exportar_faturas, name='exportar_faturas'),
+    path('master/exportar/agenda/', views.exportar_agenda, name='exportar_agenda'),
     path('master/licenca/', views.licenca_rinan, name='licenca_rinan'),
     path('master/licenca/pagar/<int:fatura_id>/', views.licenca_pagar, name='licenca_pagar'),
     path('master/licenca/processar/', views.processar_pagamento_licenca, name='licenca_processar'),
@@ -66,8 +69,15 @@ urlpatterns = [
     path('api/v1/lead-capture/', views.api_lead_capture, name='lead_capture'),
     path('api/v1/buscar-paciente/', views.api_buscar_paciente, name='api_buscar_paciente'),
     path('api/v1/detalhes-paciente/<int:paciente_id>/', views.api_detalhes_paciente, name='api_detalhes_paciente'),
+    path('api/v1/descontos-lote/', views.api_descontos_lote, name='api_descontos_lote'),
+    path('api/v1/horarios-livres/', views.api_horarios_livres, name='api_horarios_livres'),
     path('api/v1/tv-chamada/', views.api_tv_chamada, name='api_tv_chamada'),
     path('api/v1/tv-stream/', views.api_tv_stream, name='api_tv_stream'),
+    path('api/v1/tv-eventos/', views.api_tv_eventos, name='api_tv_eventos'),
+    path('api/v1/tv-diagnostico/', views.api_tv_diagnostico, name='api_tv_diagnostico'),
+    path('api/v1/diagnostico/', views.api_diagnostico, name='api_diagnostico'),
+    path('api/v1/perfil/', views.api_perfil, name='api_perfil'),
+    path('metrics', views.metricas_prometheus, name='metricas'),
     path('arquivo/exame/<int:exame_id>/', views.download_exame_arquivo, name='download_exame_arquivo'),
 ]
 
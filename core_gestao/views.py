@@ -1,28 +1,28 @@
 from functools import wraps
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, HttpResponse, FileResponse, Http404
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
-from django.db.models import Sum, Q, Avg, Count
+from django.db import transaction
+from django.db.models import Q, Avg, Count
 from django.utils import timezone
 from datetime import timedelta, date
 import calendar as cal_module
 from django.contrib import messages
 from django.conf import settings
-from django.core.cache import cache
 from django.urls import reverse
+from django.utils.crypto import constant_time_compare
+from django.utils.http import content_disposition_header, parse_etags
 from urllib.parse import quote
-from urllib.request import Request, urlopen
-from xml.etree import ElementTree as ET
-import mercadopago
-from mercadopago.config import RequestOptions
 import json
 import logging
+import mimetypes
 import re
 import uuid
 
@@ -38,9 +38,49 @@ from .models import (
     Receita,
     ChamadaPainel,
 )
+from .agendamento import (
+    HorarioIndisponivel,
+    agendar,
+    anotar_periodos,
+    horarios_livres,
+    ler_data_hora,
+)
+from .busca_pacientes import buscar_pacientes, filtrar_pacientes
+from .cache_utils import estatisticas_cache
+from .exportacao import (
+    FORMATOS as FORMATOS_EXPORTACAO,
+    faturas_do_periodo,
+    linhas_agenda,
+    linhas_faturas,
+    linhas_pacientes,
+    resposta_exportacao,
+)
+from .conexoes_db import estatisticas_conexoes
+from .paginacao import (
+    com_dependentes,
+    contagem_estimada,
+    pagina_keyset,
+    paciente_para_json,
+)
+from .metricas import exposicao
+from .perfil_requests import estatisticas_perfil
+from .periodos import intervalo_mes
 from .procedimentos_catalogo import catalogo_por_grupos, procedimento_por_id
+from .mp_gateway import estatisticas_pool, mp_call, mp_request_options, mp_sdk
+from .mp_inbox import estatisticas_dedup, registrar_notificacao
 from .mp_webhook_utils import validar_assinatura_webhook_mp
-from .rate_limit import rate_limit_or_429
+from .tv_eventos import (
+    TV_CHAMADA_SEGUNDOS,
+    contar_resposta as contar_resposta_tv,
+    etag_chamada,
+    estatisticas_tv,
+    payload_atual,
+    stream_chamadas,
+    versao_atual,
+)
+from .tv_stream import estado_video, solicitar_atualizacao, video_id_atual
+from .rate_limit import TOKEN_BUCKET, rate_limit
+from .receita_mensal import marcar_fatura_paga, registrar_recebimento, resumo_mes
 from .licenca_rinan import (
     dia_vencimento_licenca,
     external_reference_licenca,
@@ -56,11 +96,14 @@ from .licenca_rinan import (
 )
 from .plano_utils import (
     avaliar_desconto_procedimento,
+    avaliar_descontos_em_lote,
     calcular_valor_com_desconto,
     gerar_acesso_checkout,
     gerar_carteirinha_token,
     gerar_checkout_token,
+    gerar_grant_login_pos_pagamento,
     ler_carteirinha_token,
+    ler_grant_login_pos_pagamento,
     max_dependentes_plano,
     normalizar_cpf,
     percentual_desconto,
@@ -302,60 +345,6 @@ def _mp_notification_url(request) -> str:
     return request.build_absolute_uri(reverse("sistema_interno:mp_webhook"))
 
 
-def _mp_timeout_seconds():
-    try:
-        return max(5, int(getattr(settings, "MERCADO_PAGO_TIMEOUT_SECONDS", 15)))
-    except (TypeError, ValueError):
-        return 15
-
-
-def _mp_max_attempts():
-    try:
-        return max(1, int(getattr(settings, "MERCADO_PAGO_MAX_ATTEMPTS", 2)))
-    except (TypeError, ValueError):
-        return 2
-
-
-def _mp_should_retry(resp):
-    if not isinstance(resp, dict):
-        return True
-    status = resp.get("status")
-    return status in (429, 500, 502, 503, 504)
-
-
-def _mp_call_with_timeout(callable_, *args):
-    timeout = _mp_timeout_seconds()
-    max_attempts = _mp_max_attempts()
-    last_response = None
-
-    for attempt in range(1, max_attempts + 1):
-        try:
-            with ThreadPoolExecutor(max_workers=1) as pool:
-                future = pool.submit(callable_, *args)
-                response = future.result(timeout=timeout)
-        except FuturesTimeoutError:
-            response = {
-                "status": 504,
-                "response": {
-                    "message": f"timeout_after_{timeout}s",
-                    "status_detail": "gateway_timeout",
-                },
-            }
-        except Exception as exc:
-            response = {"status": 500, "response": {"message": str(exc)}}
-
-        last_response = response
-        if not _mp_should_retry(response):
-            break
-        if attempt < max_attempts:
-            logger.warning(
-                "Retry de chamada Mercado Pago (tentativa %s/%s).",
-                attempt + 1,
-                max_attempts,
-            )
-    return last_response or {"status": 500, "response": {"message": "empty_response"}}
-
-
 def _email_paciente_por_cpf(cpf):
     return (
         User.objects.filter(username=cpf)
@@ -382,7 +371,7 @@ def _mp_payer_email_forbidden(resp):
 
 
 def _mp_email_coletor(sdk):
-    me = _mp_call_with_timeout(sdk.user().get)
+    me = mp_call(sdk.user().get)
     if me.get("status") != 200:
         return ""
     return (me.get("response") or {}).get("email", "").strip().lower()
@@ -418,7 +407,7 @@ def _ativar_vencimento_e_plano_pos_pagamento(paciente, fatura):
     if getattr(fatura, "plano_id", None):
         paciente.plano_id = fatura.plano_id
     paciente.save()
-    atualizacao = {"vencimento_plano": novo_vencimento}
+    atualizacao = {"vencimento_plano": novo_vencimento, "atualizado_em": timezone.now()}
     if fatura.plano_id:
         atualizacao["plano_id"] = fatura.plano_id
     Paciente.objects.filter(responsavel=paciente).update(**atualizacao)
@@ -437,24 +426,40 @@ def _confirmar_fatura_paga(fatura, payment_id, valor_pago=None):
             fatura.id,
         )
         return False
-    fatura.status = "PAGO"
-    fatura.data_pagamento = timezone.now().date()
-    fatura.mercadopago_id = str(payment_id)
-    fatura.save()
-    _ativar_vencimento_e_plano_pos_pagamento(fatura.paciente, fatura)
+    if marcar_fatura_paga(fatura, mercadopago_id=str(payment_id)):
+        _ativar_vencimento_e_plano_pos_pagamento(fatura.paciente, fatura)
     return True
 
 
-def _login_paciente_pos_pagamento(request, paciente):
-    cpf = paciente.cpf
+LOGIN_POS_PAGAMENTO_SESSION_KEY = "login_pos_pagamento"
+
+
+def _login_paciente_pos_pagamento(request, fatura, checkout_token):
+    """
+    Loga o paciente que ainda usa o CPF como senha. O hash roda uma vez por
+    checkout: o resultado vai para a sessão como grant assinado e os polls
+    seguintes só conferem a assinatura.
+    """
+    concedido = ler_grant_login_pos_pagamento(
+        request.session.get(LOGIN_POS_PAGAMENTO_SESSION_KEY), fatura.id, checkout_token
+    )
+    if concedido == 0:
+        return False
+    if concedido and request.user.is_authenticated and request.user.pk == concedido:
+        return True
+
+    cpf = fatura.paciente.cpf
     cpf_limpo = normalizar_cpf(cpf)
     user = User.objects.filter(username=cpf).first()
     if not user and cpf_limpo:
         user = User.objects.filter(username=cpf_limpo).first()
-    if user and user.check_password(cpf_limpo):
+    ok = bool(user and user.check_password(cpf_limpo))
+    if ok:
         login(request, user)
-        return True
-    return False
+    request.session[LOGIN_POS_PAGAMENTO_SESSION_KEY] = gerar_grant_login_pos_pagamento(
+        fatura.id, user.pk if ok else 0, checkout_token
+    )
+    return ok
 
 
 def _telefone_whatsapp(telefone: str) -> str:
@@ -491,6 +496,7 @@ def _pode_ver_comprovante(request, fatura) -> bool:
 # 2. SISTEMA DE ACESSO
 # =================================================================
 
+@rate_limit("login", limite=10, periodo=300, algoritmo=TOKEN_BUCKET)
 def login_view(request):
     if request.method == 'POST':
         u, p = request.POST.get('username'), request.POST.get('password')
@@ -659,18 +665,43 @@ def cliente_edit(request, paciente_id):
 @staff_member_required
 def cliente_list(request):
     q = request.GET.get('q', '')
-    pacientes = Paciente.objects.filter(responsavel__isnull=True).order_by('-data_cadastro')
-    
+    pacientes = Paciente.objects.filter(responsavel__isnull=True)
+
     if q:
-        pacientes = pacientes.filter(Q(nome_completo__icontains=q) | Q(cpf__icontains=q))
+        pacientes = filtrar_pacientes(pacientes, q)
+
+    pagina = pagina_keyset(
+        com_dependentes(pacientes),
+        request.GET.get('cursor'),
+        request.GET.get('tamanho'),
+    )
+    total_estimado = contagem_estimada(pacientes)
+    if request.GET.get('formato') == 'json':
+        # Rolagem infinita: o cliente repassa proximo_cursor até vir null
+        return JsonResponse({
+            'itens': [paciente_para_json(p) for p in pagina['itens']],
+            'proximo_cursor': pagina['proximo_cursor'],
+            'total_estimado': total_estimado,
+        })
 
     context = {
-        'pacientes': pacientes,
+        'pacientes': pagina['itens'],
+        'proxima_pagina_url': _url_com_cursor(request, pagina['proximo_cursor']),
+        'total_estimado': total_estimado,
         'planos': Plano.objects.all(),
         'query': q
     }
     return render(request, 'cliente_list.html', context)
 
+
+def _url_com_cursor(request, cursor):
+    """Mesma listagem (filtros preservados) a partir do cursor; None na última página."""
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f"{request.path}?{params.urlencode()}"
+
 @login_required
 @staff_member_required
 def cliente_create(request):
@@ -727,6 +758,22 @@ def cliente_create(request):
 # 4. FINANCEIRO E MERCADO PAGO (CHECKOUT TRANSPARENTE)
 # =================================================================
 
+# Validade da preferência MP reaproveitada; renova com folga antes de expirar
+MP_PREFERENCIA_VALIDADE = timedelta(hours=24)
+MP_PREFERENCIA_FOLGA = timedelta(minutes=30)
+
+
+def _preferencia_reutilizavel(fatura, valor) -> bool:
+    """Preferência gravada na fatura ainda vale e foi criada para este valor."""
+    if not (fatura.preferencia_id and fatura.preferencia_expira_em):
+        return False
+    if fatura.preferencia_expira_em <= timezone.now() + MP_PREFERENCIA_FOLGA:
+        return False
+    if fatura.preferencia_valor is None:
+        return False
+    return round(float(fatura.preferencia_valor), 2) == round(float(valor), 2)
+
+
 def checkout_pagamento(request, paciente_id, plano_id):
     token_acesso = request.GET.get("t", "")
     if not validar_acesso_checkout(token_acesso, paciente_id, plano_id):
@@ -761,10 +808,24 @@ def checkout_pagamento(request, paciente_id, plano_id):
         valor_a_cobrar = float(fatura.valor)
 
     checkout_token = gerar_checkout_token(fatura.id, paciente.id, plano.id)
-    webhook_url = request.build_absolute_uri(reverse("sistema_interno:mp_webhook"))
-    painel_url = request.build_absolute_uri(reverse("sistema_interno:painel_paciente"))
     email_paciente = _email_paciente_por_cpf(paciente.cpf)
 
+    contexto = {
+        'public_key': settings.MERCADO_PAGO_PUBLIC_KEY,
+        'paciente': paciente,
+        'plano': plano,
+        'fatura': fatura,
+        'checkout_token': checkout_token,
+        'mp_sandbox': _mp_credencial_teste(),
+        'mp_test_payer_email': _mp_email_comprador_sandbox(),
+        'payer_email': email_paciente if not _mp_credencial_teste() else "",
+    }
+    if _preferencia_reutilizavel(fatura, valor_a_cobrar):
+        return render(request, 'checkout.html', {**contexto, 'preference_id': fatura.preferencia_id})
+
+    webhook_url = request.build_absolute_uri(reverse("sistema_interno:mp_webhook"))
+    painel_url = request.build_absolute_uri(reverse("sistema_interno:painel_paciente"))
+    expira_em = timezone.now() + MP_PREFERENCIA_VALIDADE
     preference_data = {
         "items": [
             {
@@ -789,26 +850,24 @@ def checkout_pagamento(request, paciente_id, plano_id):
         "auto_return": "approved",
         "external_reference": str(fatura.id),
         "notification_url": webhook_url,
+        "expires": True,
+        "expiration_date_to": timezone.localtime(expira_em).isoformat(timespec="milliseconds"),
     }
     if email_paciente and not _mp_credencial_teste():
         preference_data["payer"]["email"] = email_paciente
 
-    sdk = mercadopago.SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-    pref_res = _mp_call_with_timeout(sdk.preference().create, preference_data)
+    sdk = mp_sdk()
+    pref_res = mp_call(sdk.preference().create, preference_data)
     
     if pref_res["status"] in [200, 201]:
         preference = pref_res["response"]
-        return render(request, 'checkout.html', {
-            'preference_id': preference['id'],
-            'public_key': settings.MERCADO_PAGO_PUBLIC_KEY,
-            'paciente': paciente,
-            'plano': plano,
-            'fatura': fatura,
-            'checkout_token': checkout_token,
-            'mp_sandbox': _mp_credencial_teste(),
-            'mp_test_payer_email': _mp_email_comprador_sandbox(),
-            'payer_email': email_paciente if not _mp_credencial_teste() else "",
-        })
+        fatura.preferencia_id = preference['id']
+        fatura.preferencia_valor = round(float(valor_a_cobrar), 2)
+        fatura.preferencia_expira_em = expira_em
+        fatura.save(
+            update_fields=["preferencia_id", "preferencia_valor", "preferencia_expira_em", "atualizado_em"]
+        )
+        return render(request, 'checkout.html', {**contexto, 'preference_id': preference['id']})
     return HttpResponse(f"Erro Mercado Pago: {pref_res['response'].get('message', 'Erro desconhecido')}")
 
 def processar_pagamento_brick(request):
@@ -851,7 +910,7 @@ def processar_pagamento_brick(request):
                     status=400,
                 )
 
-            sdk = mercadopago.SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
+            sdk = mp_sdk()
             paciente = fatura.paciente
             payer = _mp_payer_do_payload(data, paciente)
             if settings.DEBUG:
@@ -898,13 +957,13 @@ def processar_pagamento_brick(request):
                     status=400,
                 )
 
-            req_opts = RequestOptions(
+            req_opts = mp_request_options(
                 custom_headers={"x-idempotency-key": str(uuid.uuid4())}
             )
 
             if settings.DEBUG:
                 logger.debug("Enviando pagamento para Mercado Pago.")
-            payment_response = _mp_call_with_timeout(
+            payment_response = mp_call(
                 sdk.payment().create, payment_data, req_opts
             )
             if _mp_credencial_teste() and _mp_payer_email_forbidden(payment_response):
@@ -917,10 +976,10 @@ def processar_pagamento_brick(request):
                         "Fallback sandbox aplicado: retry com e-mail da conta coletora."
                     )
                     payment_data["payer"]["email"] = email_fallback
-                    req_opts = RequestOptions(
+                    req_opts = mp_request_options(
                         custom_headers={"x-idempotency-key": str(uuid.uuid4())}
                     )
-                    payment_response = _mp_call_with_timeout(
+                    payment_response = mp_call(
                         sdk.payment().create, payment_data, req_opts
                     )
             retries_interno = 0
@@ -930,10 +989,10 @@ def processar_pagamento_brick(request):
                     "Retry sandbox por erro interno do MP (tentativa %s).",
                     retries_interno,
                 )
-                req_opts = RequestOptions(
+                req_opts = mp_request_options(
                     custom_headers={"x-idempotency-key": str(uuid.uuid4())}
                 )
-                payment_response = _mp_call_with_timeout(
+                payment_response = mp_call(
                     sdk.payment().create, payment_data, req_opts
                 )
             payment = payment_response.get("response") or {}
@@ -956,7 +1015,7 @@ def processar_pagamento_brick(request):
                             },
                             status=200,
                         )
-                    _login_paciente_pos_pagamento(request, paciente)
+                    _login_paciente_pos_pagamento(request, fatura, checkout_token)
                     return JsonResponse(
                         {
                             "status": status_mp,
@@ -968,7 +1027,7 @@ def processar_pagamento_brick(request):
 
                 if status_mp == "pending":
                     fatura.mercadopago_id = str(payment.get("id"))
-                    fatura.save(update_fields=["mercadopago_id"])
+                    fatura.save(update_fields=["mercadopago_id", "atualizado_em"])
                     payload = {
                         "status": status_mp,
                         "id": payment.get("id"),
@@ -1050,7 +1109,7 @@ def consultar_status_pagamento(request):
         )
 
     if fatura.status == "PAGO":
-        _login_paciente_pos_pagamento(request, fatura.paciente)
+        _login_paciente_pos_pagamento(request, fatura, checkout_token)
         return JsonResponse(
             {
                 "status": "approved",
@@ -1064,8 +1123,8 @@ def consultar_status_pagamento(request):
     if not payment_id:
         return JsonResponse({"status": "pending", "id": None, "fatura_id": fatura.id})
 
-    sdk = mercadopago.SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-    payment_info = _mp_call_with_timeout(sdk.payment().get, payment_id)
+    sdk = mp_sdk()
+    payment_info = mp_call(sdk.payment().get, payment_id)
     if payment_info.get("status") != 200:
         return JsonResponse(
             {
@@ -1090,7 +1149,7 @@ def consultar_status_pagamento(request):
                     "detail": "Valor do pagamento não confere com a fatura.",
                 }
             )
-        _login_paciente_pos_pagamento(request, fatura.paciente)
+        _login_paciente_pos_pagamento(request, fatura, checkout_token)
         return JsonResponse(
             {
                 "status": "approved",
@@ -1112,40 +1171,35 @@ def consultar_status_pagamento(request):
     return JsonResponse({"status": status_mp, "id": payment_id})
 
 
+def _mp_payment_id_do_webhook(request):
+    payment_id = None
+    ctype = (request.content_type or "").lower()
+    if "application/json" in ctype and request.body:
+        try:
+            payload = json.loads(request.body)
+            inner = payload.get("data") or {}
+            payment_id = inner.get("id")
+        except (json.JSONDecodeError, AttributeError):
+            payment_id = None
+    if not payment_id:
+        payment_id = (
+            request.GET.get("id")
+            or request.GET.get("data.id")
+            or request.POST.get("data.id")
+        )
+    return payment_id
+
+
 @csrf_exempt
+@rate_limit("mp_webhook", limite=600, periodo=60, algoritmo=TOKEN_BUCKET)
 def mercadopago_webhook(request):
+    """Valida a assinatura e enfileira; a consulta ao MP fica no process_mp_inbox."""
     if request.method == "POST":
-        payment_id = None
-        ctype = (request.content_type or "").lower()
-        if "application/json" in ctype and request.body:
-            try:
-                payload = json.loads(request.body)
-                inner = payload.get("data") or {}
-                payment_id = inner.get("id")
-            except json.JSONDecodeError:
-                payment_id = None
-        if not payment_id:
-            payment_id = (
-                request.GET.get("id")
-                or request.GET.get("data.id")
-                or request.POST.get("data.id")
-            )
+        payment_id = _mp_payment_id_do_webhook(request)
         if payment_id and not validar_assinatura_webhook_mp(request, str(payment_id)):
             return JsonResponse({"status": "forbidden"}, status=403)
         if payment_id:
-            sdk = mercadopago.SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-            payment_info = _mp_call_with_timeout(sdk.payment().get, payment_id)
-            if payment_info["status"] == 200:
-                resposta = payment_info["response"]
-                fatura_id = resposta.get("external_reference")
-                if resposta.get("status") == "approved":
-                    fatura = Fatura.objects.filter(id=fatura_id).first()
-                    if fatura and fatura.status == "PENDENTE":
-                        _confirmar_fatura_paga(
-                            fatura,
-                            payment_id,
-                            resposta.get("transaction_amount"),
-                        )
+            registrar_notificacao("ULTRAMED", payment_id)
 
         return JsonResponse({'status': 'ok'}, status=200)
     return JsonResponse({'status': 'erro'}, status=400)
@@ -1167,10 +1221,12 @@ def mp_healthcheck(request):
     if not has_public_key or not has_access_token:
         return JsonResponse({"ok": False, "checks": checks}, status=500)
 
-    sdk = mercadopago.SDK(settings.MERCADO_PAGO_ACCESS_TOKEN)
-    me = _mp_call_with_timeout(sdk.user().get)
+    sdk = mp_sdk()
+    me = mp_call(sdk.user().get)
     checks["mp_user_status"] = me.get("status")
     checks["collector_id"] = (me.get("response") or {}).get("id")
+    checks["pool"] = estatisticas_pool()
+    checks["webhooks"] = estatisticas_dedup()
 
     ok = me.get("status") == 200
     return JsonResponse({"ok": ok, "checks": checks}, status=200 if ok else 502)
@@ -1208,15 +1264,17 @@ def fatura_store(request):
         valor = request.POST.get('valor').replace(',', '.')
         plano_id = request.POST.get('plano') or paciente.plano_id
 
-        fatura = Fatura.objects.create(
-            paciente=paciente,
-            plano_id=plano_id if plano_id else None,
-            valor=valor,
-            data_vencimento=timezone.now().date(),
-            metodo_pagamento=request.POST.get('metodo_pagamento'),
-            status=status,
-            data_pagamento=timezone.now().date() if status == 'PAGO' else None
-        )
+        with transaction.atomic():
+            fatura = Fatura.objects.create(
+                paciente=paciente,
+                plano_id=plano_id if plano_id else None,
+                valor=valor,
+                data_vencimento=timezone.now().date(),
+                metodo_pagamento=request.POST.get('metodo_pagamento'),
+                status=status,
+                data_pagamento=timezone.now().date() if status == 'PAGO' else None
+            )
+            registrar_recebimento(fatura)
 
         if status == 'PAGO':
             _ativar_vencimento_e_plano_pos_pagamento(paciente, fatura)
@@ -1235,7 +1293,7 @@ def _realizar_checkin_agenda(ag, hoje=None):
     ag.status = "CHEGOU"
     if ag.data != hoje:
         ag.data = hoje
-    ag.save(update_fields=["status", "data"])
+    ag.save(update_fields=["status", "data", "atualizado_em"])
     return ag
 
 
@@ -1324,12 +1382,12 @@ def agenda_view(request):
                 messages.error(request, "Selecione um procedimento válido da lista.")
                 return redirect(f"{reverse('sistema_interno:agenda_view')}?data={request.POST.get('data', hoje.isoformat())}")
 
-            tipo = proc["tipo"]
             exame_nome = proc["nome"]
             observacao_extra = (request.POST.get('observacao_procedimento') or "").strip()
             valor_cheio = request.POST.get('valor_cheio', '0').replace(',', '.')
             comprovante = request.POST.get('comprovante', 'N/A')
             data_ag_str = request.POST.get('data') or hoje.isoformat()
+            url_dia = f"{reverse('sistema_interno:agenda_view')}?data={data_ag_str}"
 
             info_desconto = avaliar_desconto_procedimento(
                 paciente, procedimento_id=procedimento_id
@@ -1344,32 +1402,38 @@ def agenda_view(request):
             )
             obs_extra = f" | Obs: {observacao_extra}" if observacao_extra else ""
 
-            Agenda.objects.create(
-                paciente=paciente,
-                data=data_ag_str,
-                hora=request.POST.get('hora'),
-                tipo=tipo,
-                status='AGENDADO',
-                observacoes=(
-                    f"Procedimento: {exame_nome} [{procedimento_id}] | Cobertura: {cobertura_txt} | "
-                    f"Ref: {comprovante} | V.Tabela: {valor_cheio} | V.Final: {valor_final}"
-                    f"{obs_extra}"
-                )
-            )
-
-            Fatura.objects.create(
-                paciente=paciente,
-                plano=paciente.plano,
-                valor=valor_final,
-                data_vencimento=timezone.now().date(),
-                metodo_pagamento='PIX/CARTAO',
-                status='PAGO',
-                data_pagamento=timezone.now().date()
-            )
+            try:
+                data_ag, hora_ag = ler_data_hora(data_ag_str, request.POST.get('hora'))
+                # Vaga na sala e cobrança na mesma transação: conflito não gera fatura
+                with transaction.atomic():
+                    agendar(
+                        paciente,
+                        data_ag,
+                        hora_ag,
+                        procedimento_id,
+                        observacoes=(
+                            f"Procedimento: {exame_nome} [{procedimento_id}] | Cobertura: {cobertura_txt} | "
+                            f"Ref: {comprovante} | V.Tabela: {valor_cheio} | V.Final: {valor_final}"
+                            f"{obs_extra}"
+                        ),
+                    )
+                    fatura = Fatura.objects.create(
+                        paciente=paciente,
+                        plano=paciente.plano,
+                        valor=valor_final,
+                        data_vencimento=timezone.now().date(),
+                        metodo_pagamento='PIX/CARTAO',
+                        status='PAGO',
+                        data_pagamento=timezone.now().date()
+                    )
+                    registrar_recebimento(fatura)
+            except HorarioIndisponivel as e:
+                if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+                    return JsonResponse({"success": False, "detail": str(e)}, status=409)
+                messages.error(request, str(e))
+                return redirect(url_dia)
             messages.success(request, "Agendamento realizado com sucesso!")
-            return redirect(
-                f"{reverse('sistema_interno:agenda_view')}?data={data_ag_str}"
-            )
+            return redirect(url_dia)
         except Exception as e:
             messages.error(request, f"Erro ao salvar: {e}")
 
@@ -1408,6 +1472,7 @@ def agenda_view(request):
         .select_related('paciente')
         .order_by('hora')
     )
+    anotar_periodos(agendamentos)
 
     return render(
         request,
@@ -1426,25 +1491,23 @@ def agenda_view(request):
         },
     )
 
-@login_required
-@master_member_required
-def master_dashboard(request):
-    hoje = timezone.now().date()
-    doenca_filtro = request.GET.get('doenca')
-    q_busca = request.GET.get('q', '')
-    mes_ref = request.GET.get('mes_referencia')
-    ano_ref = request.GET.get('ano_referencia', hoje.year)
-    
+
+def _pacientes_dashboard(request):
+    """Titulares com os filtros do dashboard master (?doenca=, ?q=)."""
     pacientes_lista = Paciente.objects.filter(is_titular=True)
-    
+    doenca_filtro = request.GET.get('doenca')
     if doenca_filtro:
         pacientes_lista = pacientes_lista.filter(doencas_cronicas__icontains=doenca_filtro)
-    
+    q_busca = request.GET.get('q', '')
     if q_busca:
-        pacientes_lista = pacientes_lista.filter(
-            Q(nome_completo__icontains=q_busca) | Q(cpf__icontains=q_busca)
-        )
-    
+        pacientes_lista = filtrar_pacientes(pacientes_lista, q_busca)
+    return pacientes_lista
+
+
+def _periodo_dashboard(request, hoje):
+    """(ano de referência, ano do período, mês do período) de ?ano_referencia=&mes_referencia=."""
+    mes_ref = request.GET.get('mes_referencia')
+    ano_ref = request.GET.get('ano_referencia', hoje.year)
     try:
         ano_ref = int(ano_ref)
     except (TypeError, ValueError):
@@ -1452,7 +1515,6 @@ def master_dashboard(request):
     if ano_ref < 2000 or ano_ref > hoje.year + 1:
         ano_ref = hoje.year
 
-    faturas_pago = Fatura.objects.filter(status='PAGO').select_related('paciente')
     if mes_ref:
         try:
             mes_int = int(mes_ref)
@@ -1460,25 +1522,27 @@ def master_dashboard(request):
             mes_int = hoje.month
         if mes_int < 1 or mes_int > 12:
             mes_int = hoje.month
-        faturas_pago = faturas_pago.filter(
-            data_pagamento__month=mes_int, data_pagamento__year=ano_ref
-        )
-        periodo_mes = mes_int
-        periodo_ano = ano_ref
-    else:
-        faturas_pago = faturas_pago.filter(
-            data_pagamento__month=hoje.month, data_pagamento__year=hoje.year
-        )
-        periodo_mes = hoje.month
-        periodo_ano = hoje.year
-
-    pago_total = faturas_pago.aggregate(Sum('valor'))['valor__sum'] or 0
-    qtd_recebimentos = faturas_pago.count()
-    recebimentos_por_metodo = list(
-        faturas_pago.values('metodo_pagamento')
-        .annotate(subtotal=Sum('valor'), quantidade=Count('id'))
-        .order_by('metodo_pagamento')
+        return ano_ref, ano_ref, mes_int
+    return ano_ref, hoje.year, hoje.month
+
+
+@login_required
+@master_member_required
+def master_dashboard(request):
+    hoje = timezone.now().date()
+    doenca_filtro = request.GET.get('doenca')
+    pacientes_lista = _pacientes_dashboard(request)
+    ano_ref, periodo_ano, periodo_mes = _periodo_dashboard(request, hoje)
+
+    faturas_pago = Fatura.objects.filter(status='PAGO').select_related('paciente')
+    # Faixa de datas (usa o índice status + data_pagamento; __month não usa)
+    inicio_mes, fim_mes = intervalo_mes(periodo_ano, periodo_mes)
+    faturas_pago = faturas_pago.filter(
+        data_pagamento__gte=inicio_mes, data_pagamento__lt=fim_mes
     )
+
+    # Totais do mês vêm do agregado ReceitaMensal (uma linha por método)
+    receita = resumo_mes(periodo_ano, periodo_mes)
     alertas = Paciente.objects.filter(vencimento_plano__range=[hoje, hoje + timedelta(days=30)], is_titular=True)
     leads = LeadSite.objects.filter(atendido=False).order_by('-data_solicitacao')
     total_pacientes = Paciente.objects.count()
@@ -1491,12 +1555,16 @@ def master_dashboard(request):
 
     licenca_aberta = fatura_aberta_atual(hoje)
 
+    pagina_pacientes = pagina_keyset(com_dependentes(pacientes_lista), request.GET.get('cursor'))
+
     return render(request, 'master_dashboard.html', {
-        'pacientes_lista': pacientes_lista,
+        'pacientes_lista': pagina_pacientes['itens'],
+        'total_pacientes_lista': contagem_estimada(pacientes_lista),
+        'pacientes_proxima_url': _url_com_cursor(request, pagina_pacientes['proximo_cursor']),
         'doenca_selecionada': doenca_filtro,
-        'faturamento_total': pago_total,
-        'qtd_recebimentos_periodo': qtd_recebimentos,
-        'recebimentos_por_metodo': recebimentos_por_metodo,
+        'faturamento_total': receita['total'],
+        'qtd_recebimentos_periodo': receita['quantidade'],
+        'recebimentos_por_metodo': receita['por_metodo'],
         'leads_recentes': leads,
         'pacientes_vencendo': alertas,
         'boletos_recentes': boletos_recentes,
@@ -1510,6 +1578,68 @@ def master_dashboard(request):
     })
 
 
+def _formato_exportacao(request):
+    formato = (request.GET.get("formato") or "csv").lower()
+    return formato if formato in FORMATOS_EXPORTACAO else None
+
+
+def _data_param(request, nome, padrao):
+    try:
+        return date.fromisoformat(request.GET.get(nome) or "")
+    except ValueError:
+        return padrao
+
+
+@login_required
+@master_member_required
+def exportar_pacientes(request):
+    """Titulares (filtros do dashboard: ?doenca=, ?q=) com seus dependentes."""
+    formato = _formato_exportacao(request)
+    if not formato:
+        return HttpResponse("Formato inválido (use csv ou xlsx).", status=400)
+    return resposta_exportacao(linhas_pacientes(_pacientes_dashboard(request)), formato, "pacientes")
+
+
+@login_required
+@master_member_required
+def exportar_faturas(request):
+    """
+    Faturas do mês do dashboard (?mes_referencia=&ano_referencia=), opcionalmente
+    por ?status=. Pagas entram pela data de pagamento; as demais, pelo vencimento.
+    """
+    formato = _formato_exportacao(request)
+    if not formato:
+        return HttpResponse("Formato inválido (use csv ou xlsx).", status=400)
+    hoje = timezone.now().date()
+    _, periodo_ano, periodo_mes = _periodo_dashboard(request, hoje)
+    inicio, fim = intervalo_mes(periodo_ano, periodo_mes)
+    status = (request.GET.get("status") or "").upper()
+    if status and status not in dict(Fatura.STATUS_CHOICES):
+        return HttpResponse("Status inválido.", status=400)
+    trechos = faturas_do_periodo(inicio, fim, status or None)
+    nome = f"faturas_{periodo_ano}_{periodo_mes:02d}"
+    return resposta_exportacao(linhas_faturas(trechos), formato, nome)
+
+
+@login_required
+@master_member_required
+def exportar_agenda(request):
+    """Agendamentos de ?data_inicio= a ?data_fim= (inclusive; padrão: hoje), opcionalmente por ?status=."""
+    formato = _formato_exportacao(request)
+    if not formato:
+        return HttpResponse("Formato inválido (use csv ou xlsx).", status=400)
+    hoje = timezone.now().date()
+    inicio = _data_param(request, "data_inicio", hoje)
+    fim = _data_param(request, "data_fim", inicio)
+    if fim < inicio:
+        inicio, fim = fim, inicio
+    agendamentos = Agenda.objects.filter(data__gte=inicio, data__lte=fim)
+    status = (request.GET.get("status") or "").upper()
+    if status:
+        agendamentos = agendamentos.filter(status=status)
+    return resposta_exportacao(linhas_agenda(agendamentos), formato, "agenda")
+
+
 @login_required
 @master_member_required
 def licenca_rinan(request):
@@ -1622,7 +1752,7 @@ def processar_pagamento_licenca(request):
         return JsonResponse({"status": "approved", "id": fatura.mercadopago_id or fatura.id, "fatura_id": fatura.id})
 
     token = (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip()
-    sdk = mercadopago.SDK(token)
+    sdk = mp_sdk(token)
     payer = _mp_payer_licenca(data, request.user)
     if not payer.get("email"):
         return JsonResponse(
@@ -1661,8 +1791,8 @@ def processar_pagamento_licenca(request):
             status=400,
         )
 
-    req_opts = RequestOptions(custom_headers={"x-idempotency-key": str(uuid.uuid4())})
-    payment_response = _mp_call_with_timeout(sdk.payment().create, payment_data, req_opts)
+    req_opts = mp_request_options(custom_headers={"x-idempotency-key": str(uuid.uuid4())})
+    payment_response = mp_call(sdk.payment().create, payment_data, req_opts)
     payment = payment_response.get("response") or {}
     if payment_response.get("status") not in (200, 201):
         detalhe = payment.get("status_detail") or payment.get("message") or "Dados inválidos"
@@ -1718,8 +1848,8 @@ def consultar_status_licenca(request):
         return JsonResponse({"status": "pending", "id": payment_id, "fatura_id": fatura.id})
 
     token = (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip()
-    sdk = mercadopago.SDK(token)
-    payment_info = _mp_call_with_timeout(sdk.payment().get, payment_id)
+    sdk = mp_sdk(token)
+    payment_info = mp_call(sdk.payment().get, payment_id)
     if payment_info.get("status") != 200:
         return JsonResponse({"status": "pending", "id": payment_id, "fatura_id": fatura.id})
 
@@ -1757,8 +1887,8 @@ def licenca_retorno(request):
 
     if fatura and fatura.status != "PAGO" and payment_id and rinan_mp_configurado():
         token = (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip()
-        sdk = mercadopago.SDK(token)
-        payment_info = _mp_call_with_timeout(sdk.payment().get, payment_id)
+        sdk = mp_sdk(token)
+        payment_info = mp_call(sdk.payment().get, payment_id)
         if payment_info.get("status") == 200:
             _confirmar_licenca_por_pagamento_mp(str(payment_id), payment_info.get("response") or {})
             fatura.refresh_from_db()
@@ -1800,27 +1930,13 @@ def licenca_baixar(request, fatura_id):
 
 
 @csrf_exempt
+@rate_limit("mp_webhook_rinan", limite=600, periodo=60, algoritmo=TOKEN_BUCKET)
 def mercadopago_webhook_rinan(request):
-    """Webhook Mercado Pago da conta Rinan — só licença do sistema."""
+    """Webhook Mercado Pago da conta Rinan — só licença do sistema (enfileira)."""
     if request.method != "POST":
         return JsonResponse({"status": "erro"}, status=400)
 
-    payment_id = None
-    ctype = (request.content_type or "").lower()
-    if "application/json" in ctype and request.body:
-        try:
-            payload = json.loads(request.body)
-            inner = payload.get("data") or {}
-            payment_id = inner.get("id")
-        except json.JSONDecodeError:
-            payment_id = None
-    if not payment_id:
-        payment_id = (
-            request.GET.get("id")
-            or request.GET.get("data.id")
-            or request.POST.get("data.id")
-        )
-
+    payment_id = _mp_payment_id_do_webhook(request)
     rinan_secret = (getattr(settings, "MERCADO_PAGO_RINAN_WEBHOOK_SECRET", "") or "").strip()
     if payment_id and not validar_assinatura_webhook_mp(
         request, str(payment_id), secret=rinan_secret
@@ -1828,13 +1944,7 @@ def mercadopago_webhook_rinan(request):
         return JsonResponse({"status": "forbidden"}, status=403)
 
     if payment_id and rinan_mp_configurado():
-        token = (getattr(settings, "MERCADO_PAGO_RINAN_ACCESS_TOKEN", "") or "").strip()
-        sdk = mercadopago.SDK(token)
-        payment_info = _mp_call_with_timeout(sdk.payment().get, payment_id)
-        if payment_info.get("status") == 200:
-            _confirmar_licenca_por_pagamento_mp(
-                str(payment_id), payment_info.get("response") or {}
-            )
+        registrar_notificacao("RINAN", payment_id)
 
     return JsonResponse({"status": "ok"}, status=200)
 
@@ -1888,11 +1998,6 @@ def painel_medico(request):
     return render(request, 'painel_medico.html', ctx)
 
 
-TV_CHAMADA_SEGUNDOS = 25
-JP_NEWS_CHANNEL_ID = "UCP391YRAjSOdM_bwievgaZA"
-# Fallback conhecido (atualizado automaticamente quando o YouTube responde)
-JP_NEWS_FALLBACK_VIDEO = "4dFcj4OUzxM"
-
 _TV_NOTICIAS = [
     {"src": "Ultramed", "title": "Traga documento com foto e a carteirinha digital no atendimento"},
     {"src": "Saúde", "title": "Hidrate-se e evite jejum prolongado sem orientação médica"},
@@ -1977,103 +2082,6 @@ def _tv_planos_para_tela():
     return planos
 
 
-def _http_get_text(url, timeout=8):
-    req = Request(
-        url,
-        headers={
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            ),
-            "Accept-Language": "pt-BR,pt;q=0.9",
-        },
-    )
-    with urlopen(req, timeout=timeout) as resp:
-        return resp.read().decode("utf-8", "ignore")
-
-
-def _jp_rss_latest_video_id():
-    feed = _http_get_text(
-        f"https://www.youtube.com/feeds/videos.xml?channel_id={JP_NEWS_CHANNEL_ID}"
-    )
-    root = ET.fromstring(feed)
-    ns = {"yt": "http://www.youtube.com/xml/schemas/2015"}
-    node = root.find(".//yt:videoId", ns)
-    if node is not None and node.text:
-        return node.text.strip()
-    return None
-
-
-def _jp_video_parece_ao_vivo(video_id):
-    """Confere se o vídeo ainda está marcado como live no YouTube."""
-    try:
-        html = _http_get_text(f"https://www.youtube.com/watch?v={video_id}")
-        return '"isLiveNow":true' in html or '"isLive":true' in html
-    except Exception:
-        return False
-
-
-def _resolver_jovem_pan_video_id():
-    """
-    O embed live_stream?channel= costuma falhar (player-unavailable).
-    Resolvemos um videoId concreto do canal Jovem Pan News.
-    """
-    cache_key = "tv_jp_news_video_id"
-    cached = cache.get(cache_key)
-    if cached:
-        return cached
-
-    video_id = None
-
-    # 1) Página /live — prioriza marcação isLiveNow
-    try:
-        html = _http_get_text(
-            f"https://www.youtube.com/channel/{JP_NEWS_CHANNEL_ID}/live"
-        )
-        m = re.search(
-            r'"videoId":"([A-Za-z0-9_-]{11})".{0,240}"isLiveNow"\s*:\s*true',
-            html,
-            re.DOTALL,
-        )
-        if not m:
-            m = re.search(
-                r'"isLiveNow"\s*:\s*true.{0,240}"videoId":"([A-Za-z0-9_-]{11})"',
-                html,
-                re.DOTALL,
-            )
-        if m:
-            video_id = m.group(1)
-    except Exception as exc:
-        logger.warning("TV JP: falha ao ler /live: %s", exc)
-
-    # 2) RSS do canal (programa mais recente — costuma ser o do dia)
-    if not video_id:
-        try:
-            video_id = _jp_rss_latest_video_id()
-        except Exception as exc:
-            logger.warning("TV JP: falha no RSS: %s", exc)
-
-    # 3) Confirma live no watch page dos candidatos do /live
-    if video_id and not _jp_video_parece_ao_vivo(video_id):
-        try:
-            html = _http_get_text(
-                f"https://www.youtube.com/channel/{JP_NEWS_CHANNEL_ID}/live"
-            )
-            for cand in list(
-                dict.fromkeys(re.findall(r'"videoId":"([A-Za-z0-9_-]{11})"', html))
-            )[:6]:
-                if _jp_video_parece_ao_vivo(cand):
-                    video_id = cand
-                    break
-        except Exception:
-            pass
-
-    video_id = video_id or JP_NEWS_FALLBACK_VIDEO
-    cache.set(cache_key, video_id, 180)
-    return video_id
-
-
 def _youtube_embed_url(video_id, mute=True):
     mute_flag = "1" if mute else "0"
     return (
@@ -2083,29 +2091,11 @@ def _youtube_embed_url(video_id, mute=True):
     )
 
 
-def _tv_payload_chamada():
-    chamada = ChamadaPainel.objects.filter(pk=1).first()
-    if not chamada:
-        return {"ativa": False}
-    idade = (timezone.now() - chamada.chamada_em).total_seconds()
-    if idade > TV_CHAMADA_SEGUNDOS:
-        return {"ativa": False, "id": chamada.pk, "expirada": True}
-    return {
-        "ativa": True,
-        "id": chamada.pk,
-        "paciente_nome": chamada.paciente_nome,
-        "consultorio": chamada.consultorio,
-        "mensagem": chamada.mensagem,
-        "chamada_em": chamada.chamada_em.isoformat(),
-        "restante": max(0, int(TV_CHAMADA_SEGUNDOS - idade)),
-    }
-
-
 @login_required
 @staff_member_required
 def tv_espera(request):
     """Tela fullscreen da TV na recepção (padrão Ultramed)."""
-    video_id = _resolver_jovem_pan_video_id()
+    video_id = video_id_atual()
     planos_tv = _tv_planos_para_tela()
     return render(
         request,
@@ -2116,6 +2106,7 @@ def tv_espera(request):
             "planos_tv": planos_tv,
             "poll_url": reverse("sistema_interno:api_tv_chamada"),
             "stream_url": reverse("sistema_interno:api_tv_stream"),
+            "eventos_url": reverse("sistema_interno:api_tv_eventos"),
             "segundos_chamada": TV_CHAMADA_SEGUNDOS,
             "youtube_video_id": video_id,
             "youtube_embed_url": _youtube_embed_url(video_id, mute=True),
@@ -2126,8 +2117,78 @@ def tv_espera(request):
 @login_required
 @staff_member_required
 def api_tv_chamada(request):
-    """Polling da TV: última chamada ativa."""
-    return JsonResponse(_tv_payload_chamada())
+    """
+    Polling da TV: última chamada ativa. ETag = versão no cache; If-None-Match
+    igual responde 304 sem consultar ChamadaPainel.
+    """
+    versao = versao_atual()
+    etag = etag_chamada(versao)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        contar_resposta_tv(304)
+        response = HttpResponse(status=304)
+    else:
+        versao, payload = payload_atual(versao)
+        etag = etag_chamada(versao)
+        contar_resposta_tv(200)
+        response = JsonResponse(payload)
+    response["ETag"] = etag
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@never_cache
+@login_required
+@master_member_required
+def api_diagnostico(request):
+    """Master: cache compartilhado e reaproveitamento de conexões do banco."""
+    return JsonResponse({"cache": estatisticas_cache(), "banco": estatisticas_conexoes()})
+
+
+@never_cache
+def metricas_prometheus(request):
+    """Métricas no formato do Prometheus: coletor com Bearer METRICAS_TOKEN ou master logado."""
+    token = settings.METRICAS_TOKEN
+    autorizado = bool(token) and constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    )
+    if not autorizado and not (request.user.is_authenticated and _is_master_user(request.user)):
+        return HttpResponse("Acesso negado.", status=403)
+    return HttpResponse(exposicao(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@never_cache
+@login_required
+@master_member_required
+def api_perfil(request):
+    """Master: consultas e latência por rota deste worker (PerfilRequestsMiddleware)."""
+    return JsonResponse(estatisticas_perfil())
+
+
+@login_required
+@master_member_required
+def api_tv_diagnostico(request):
+    """Master: proporção de polls da TV respondidos com 304."""
+    return JsonResponse(estatisticas_tv())
+
+
+async def api_tv_eventos(request):
+    """
+    Canal SSE da TV: empurra cada nova chamada (id = instante da chamada).
+    Só atende via ASGI; no WSGI responde 503 e a TV segue no polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse("Canal de eventos disponível apenas via ASGI.", status=503)
+    if not await sync_to_async(_is_staff_user)(request.user):
+        return HttpResponse(status=403)
+    ultimo_id = (
+        request.headers.get("Last-Event-ID") or request.GET.get("ultimo_id") or ""
+    ).strip() or None
+    response = StreamingHttpResponse(
+        stream_chamadas(ultimo_id), content_type="text/event-stream; charset=utf-8"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -2135,13 +2196,15 @@ def api_tv_chamada(request):
 def api_tv_stream(request):
     """ID atual do ao vivo Jovem Pan News (para a TV trocar de programa)."""
     if request.GET.get("refresh") == "1":
-        cache.delete("tv_jp_news_video_id")
-    video_id = _resolver_jovem_pan_video_id()
+        solicitar_atualizacao()
+    estado = estado_video()
+    video_id = estado["video_id"]
     return JsonResponse(
         {
             "video_id": video_id,
             "embed_url": _youtube_embed_url(video_id, mute=True),
             "watch_url": f"https://www.youtube.com/watch?v={video_id}",
+            "desatualizado": estado["desatualizado"],
         }
     )
 
@@ -2299,7 +2362,7 @@ def api_ultima_receita(request, paciente_id):
 @staff_member_required
 def api_buscar_paciente(request):
     q = request.GET.get('q', '')
-    pacientes = Paciente.objects.filter(Q(nome_completo__icontains=q) | Q(cpf__icontains=q))[:10]
+    pacientes = buscar_pacientes(q, limite=10)
     results = [{'id': p.id, 'text': f"{p.nome_completo} ({p.cpf})"} for p in pacientes]
     return JsonResponse({'results': results})
 
@@ -2317,11 +2380,15 @@ def api_detalhes_paciente(request, paciente_id):
     else:
         info = avaliar_desconto_procedimento(paciente, tipo_proc, tipo_ag)
 
+    return JsonResponse(_desconto_para_json(paciente, info))
+
+
+def _desconto_para_json(paciente, info):
     plano_status = "PARTICULAR / PLANO VENCIDO"
     if info["plano_ativo"] and paciente.plano:
         plano_status = paciente.plano.nome.upper()
 
-    return JsonResponse({
+    return {
         'id': paciente.id,
         'plano': plano_status,
         'percentual': info['percentual'],
@@ -2333,15 +2400,81 @@ def api_detalhes_paciente(request, paciente_id):
         'procedimento_id': info.get('procedimento_id', ''),
         'procedimento_nome': info.get('procedimento_nome', ''),
         'cpf': paciente.cpf,
+    }
+
+
+# Teto de pares (paciente, procedimento) por chamada do lote
+DESCONTOS_LOTE_MAX_PARES = 500
+
+
+def _ids_lista(request, nome):
+    """Aceita ``?nome=a&nome=b`` e ``?nome=a,b``."""
+    valores = []
+    for bruto in request.GET.getlist(nome):
+        valores.extend(v.strip() for v in bruto.split(",") if v.strip())
+    return list(dict.fromkeys(valores))
+
+
+@never_cache
+@login_required
+@staff_member_required
+def api_descontos_lote(request):
+    """
+    Cobertura e desconto de vários pares numa resposta: um paciente com todos
+    os procedimentos da agenda, ou vários pacientes com um procedimento.
+    """
+    try:
+        # "7" e "07" viram o mesmo id: deduplica depois de converter, mantendo a ordem
+        paciente_ids = list(dict.fromkeys(int(v) for v in _ids_lista(request, "paciente_id")))
+    except ValueError:
+        return JsonResponse({"detail": "paciente_id inválido."}, status=400)
+    procedimento_ids = _ids_lista(request, "procedimento_id")
+    if not paciente_ids or not procedimento_ids:
+        return JsonResponse(
+            {"detail": "Informe paciente_id e procedimento_id."}, status=400
+        )
+    if len(paciente_ids) * len(procedimento_ids) > DESCONTOS_LOTE_MAX_PARES:
+        return JsonResponse(
+            {"detail": f"Máximo de {DESCONTOS_LOTE_MAX_PARES} combinações por chamada."},
+            status=400,
+        )
+
+    pacientes = Paciente.objects.select_related("plano").in_bulk(paciente_ids)
+    ordenados = [pacientes[i] for i in paciente_ids if i in pacientes]
+    resultados = [
+        _desconto_para_json(pacientes[info["paciente_id"]], info)
+        for info in avaliar_descontos_em_lote(ordenados, procedimento_ids)
+    ]
+    return JsonResponse({
+        'resultados': resultados,
+        'nao_encontrados': [i for i in paciente_ids if i not in pacientes],
     })
 
+
+@never_cache
+@login_required
+@recepcao_ou_master_required
+def api_horarios_livres(request):
+    """
+    Horários em que o procedimento cabe na sala dele no dia:
+    ``?procedimento_id=usg_abdomen&data=AAAA-MM-DD`` (padrão: hoje).
+    """
+    procedimento_id = (request.GET.get("procedimento_id") or "").strip()
+    try:
+        data = date.fromisoformat(request.GET.get("data") or timezone.now().date().isoformat())
+    except ValueError:
+        return JsonResponse({"detail": "data inválida (use AAAA-MM-DD)."}, status=400)
+    try:
+        return JsonResponse(horarios_livres(procedimento_id, data))
+    except HorarioIndisponivel as e:
+        return JsonResponse({"detail": str(e)}, status=400)
+
+
+@rate_limit("lead_capture", limite=20, periodo=3600)
 def api_lead_capture(request):
     if request.method == 'POST':
         if request.POST.get('website'):
             return JsonResponse({'success': True})
-        limited = rate_limit_or_429(request, 'lead_capture', limit=20, period=3600)
-        if limited:
-            return limited
         nome = request.POST.get('nome')
         tel = request.POST.get('telefone')
         int_ = request.POST.get('interesse', 'Geral')
@@ -2366,7 +2499,9 @@ def prontuario_view(request, paciente_id):
         Prontuario.objects.create(paciente=p, medico=request.user, evolucao=evolucao, prescricao=prescricao)
         if prescricao and prescricao.strip():
             Receita.objects.create(paciente=p, medico=request.user, conteudo=prescricao)
-        Agenda.objects.filter(paciente=p, data=timezone.now().date(), status='CHEGOU').update(status='FINALIZADO')
+        Agenda.objects.filter(paciente=p, data=timezone.now().date(), status='CHEGOU').update(
+            status='FINALIZADO', atualizado_em=timezone.now()
+        )
         return redirect('sistema_interno:painel_medico')
         
     hist = Prontuario.objects.filter(paciente=p).order_by('-data_atendimento')
@@ -2379,10 +2514,7 @@ def prontuario_view(request, paciente_id):
 @master_member_required
 def fatura_baixar(request, fatura_id):
     f = get_object_or_404(Fatura, id=fatura_id)
-    if f.status != "PAGO":
-        f.status = "PAGO"
-        f.data_pagamento = timezone.now().date()
-        f.save()
+    if marcar_fatura_paga(f):
         _ativar_vencimento_e_plano_pos_pagamento(f.paciente, f)
     return redirect("sistema_interno:comprovante_fatura", fatura_id=f.id)
 
@@ -2632,11 +2764,23 @@ def download_exame_arquivo(request, exame_id):
         return HttpResponse("Acesso negado.", status=403)
     if not exame.arquivo:
         raise Http404("Arquivo não encontrado.")
-    return FileResponse(
-        exame.arquivo.open('rb'),
-        as_attachment=True,
-        filename=exame.arquivo.name.split('/')[-1],
-    )
+    return _resposta_arquivo_protegido(exame.arquivo)
+
+
+def _resposta_arquivo_protegido(arquivo):
+    """
+    Anexo de um FileField já autorizado. Com MEDIA_X_ACCEL_REDIRECT o nginx
+    entrega o arquivo (location interna) e o worker responde na hora; sem ele
+    (dev), o Django envia o arquivo.
+    """
+    nome = arquivo.name.split('/')[-1]
+    if not settings.MEDIA_X_ACCEL_REDIRECT:
+        return FileResponse(arquivo.open('rb'), as_attachment=True, filename=nome)
+    response = HttpResponse(content_type=mimetypes.guess_type(nome)[0] or "application/octet-stream")
+    response["X-Accel-Redirect"] = settings.MEDIA_X_ACCEL_PREFIXO + quote(arquivo.name)
+    response["Content-Disposition"] = content_disposition_header(True, nome)
+    response["Cache-Control"] = "private, no-store"
+    return response
 
 
 @login_required
@@ -2644,6 +2788,7 @@ def download_exame_arquivo(request, exame_id):
 def plan_create(request):
     return redirect("sistema_interno:master_dashboard")
 
+@rate_limit("cadastro_plano", limite=10, periodo=3600)
 def cadastro_plano_completo(request, plano_nome):
     if request.method == 'POST':
         nome = request.POST.get('titular_nome') or request.POST.get('nome')
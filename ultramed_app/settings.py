@@ -42,6 +42,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Opt-in (PERFIL_REQUESTS); desligado, sai da pilha na carga
+    "core_gestao.perfil_requests.PerfilRequestsMiddleware",
+    "core_gestao.metricas.MetricasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,6 +82,13 @@ DATABASES = {
         "PASSWORD": os.getenv("SQL_PASSWORD", ""),
         "HOST": os.getenv("SQL_HOST", "db"),
         "PORT": os.getenv("SQL_PORT", "3306"),
+        # Conexão persistente por worker (segundos; 0 = abre/fecha a cada request).
+        # No ASGI as consultas rodam na thread única do sync_to_async, que
+        # reaproveita a mesma conexão entre requests.
+        "CONN_MAX_AGE": int(os.getenv("DB_CONN_MAX_AGE", "300")),
+        # Confere a conexão reaproveitada antes do primeiro uso em cada request
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True").strip().lower()
+        in ("1", "true", "yes", "on"),
     }
 }
 
@@ -91,6 +101,54 @@ if "test" in sys.argv:
         "NAME": str(BASE_DIR / "test_db.sqlite3"),
     }
 
+# Cache compartilhado entre os workers (gunicorn, ASGI e comandos): versão da
+# chamada da TV, vídeo ao vivo, contagens. CACHE_BACKEND escolhe o armazenamento:
+#   arquivo   (padrão) diretório montado por todos os containers
+#   banco     tabela no MariaDB (criada por ``manage.py createcachetable``)
+#   memcached / redis   quando houver o serviço e o cliente instalado
+# Testes: memória local.
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "arquivo").strip().lower()
+_CACHE_LOCATION = os.getenv("CACHE_LOCATION", "").strip()
+_CACHE_BACKENDS = {
+    "arquivo": (
+        "django.core.cache.backends.filebased.FileBasedCache",
+        os.getenv("DJANGO_CACHE_DIR", str(BASE_DIR / "cache_content")),
+        None,
+    ),
+    "banco": ("django.core.cache.backends.db.DatabaseCache", "ultramed_cache", None),
+    "memcached": (
+        "django.core.cache.backends.memcached.PyMemcacheCache",
+        "memcached:11211",
+        "pymemcache",
+    ),
+    "redis": ("django.core.cache.backends.redis.RedisCache", "redis://redis:6379/1", "redis"),
+}
+if CACHE_BACKEND not in _CACHE_BACKENDS:
+    raise ImproperlyConfigured(
+        f"CACHE_BACKEND inválido: {CACHE_BACKEND!r} (use {', '.join(_CACHE_BACKENDS)})."
+    )
+_cache_engine, _cache_padrao, _cache_cliente = _CACHE_BACKENDS[CACHE_BACKEND]
+if _cache_cliente:
+    import importlib.util
+
+    if importlib.util.find_spec(_cache_cliente) is None:
+        raise ImproperlyConfigured(
+            f"CACHE_BACKEND={CACHE_BACKEND} exige o pacote {_cache_cliente} instalado."
+        )
+CACHES = {
+    "default": {
+        "BACKEND": _cache_engine,
+        "LOCATION": _CACHE_LOCATION or _cache_padrao,
+        "KEY_PREFIX": "ultramed",
+    }
+}
+if CACHE_BACKEND in ("arquivo", "banco"):
+    # Acima de MAX_ENTRIES (padrão do Django: 300) o cull apaga 1/3 das chaves a
+    # cada gravação, inclusive as sem expiração (versões de namespace, contadores).
+    CACHES["default"]["OPTIONS"] = {"MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "200000"))}
+if "test" in sys.argv:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 LANGUAGE_CODE = "pt-br"
 TIME_ZONE = "America/Belem"
 USE_I18N = True
@@ -101,6 +159,13 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static_content")
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media_content")
+# Downloads protegidos (exames): o Django autoriza e o nginx entrega o arquivo
+# pela location interna abaixo (X-Accel-Redirect). Em dev, sem nginx, o
+# próprio Django envia o arquivo (FileResponse).
+MEDIA_X_ACCEL_REDIRECT = os.getenv(
+    "MEDIA_X_ACCEL_REDIRECT", "False" if DEBUG else "True"
+).strip().lower() in ("1", "true", "yes", "on")
+MEDIA_X_ACCEL_PREFIXO = "/protegido/media/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
@@ -169,6 +234,14 @@ MERCADO_PAGO_TEST_PAYER_EMAIL = os.getenv("MERCADO_PAGO_TEST_PAYER_EMAIL", "").s
 MERCADO_PAGO_TIMEOUT_SECONDS = int(os.getenv("MERCADO_PAGO_TIMEOUT_SECONDS", "15"))
 MERCADO_PAGO_MAX_ATTEMPTS = int(os.getenv("MERCADO_PAGO_MAX_ATTEMPTS", "2"))
 MERCADO_PAGO_WEBHOOK_SECRET = os.getenv("MERCADO_PAGO_WEBHOOK_SECRET", "").strip()
+# Dias que um payment_id em status final fica no índice de deduplicação de webhooks
+MERCADO_PAGO_DEDUP_TTL_DIAS = int(os.getenv("MERCADO_PAGO_DEDUP_TTL_DIAS", "30"))
+# Vazio = API oficial. Aponte para um stand-in local em testes/carga (http://127.0.0.1:8765).
+MERCADO_PAGO_API_BASE_URL = os.getenv("MERCADO_PAGO_API_BASE_URL", "").strip()
+
+# TV da recepção: base do YouTube consultada pelo comando atualizar_tv_stream
+# (vazio = oficial; aponte para um servidor local em testes).
+TV_YOUTUBE_BASE_URL = os.getenv("TV_YOUTUBE_BASE_URL", "").strip()
 
 # Mercado Pago da Rinan Code — licença mensal do sistema (não misturar com Ultramed)
 MERCADO_PAGO_RINAN_PUBLIC_KEY = os.getenv("MERCADO_PAGO_RINAN_PUBLIC_KEY", "").strip()
@@ -181,6 +254,29 @@ MERCADO_PAGO_RINAN_WEBHOOK_SECRET = os.getenv(
 LICENCA_RINAN_VALOR = os.getenv("LICENCA_RINAN_VALOR", "399.00").strip()
 LICENCA_RINAN_DIA_VENCIMENTO = int(os.getenv("LICENCA_RINAN_DIA_VENCIMENTO", "10"))
 
+# Perfil por request (core_gestao/perfil_requests.py): consultas, banco, templates
+# e HTTP externo por rota em /sistema/api/v1/perfil/; lentos vão para o log.
+PERFIL_REQUESTS = os.getenv("PERFIL_REQUESTS", "False").strip().lower() in ("1", "true", "yes", "on")
+PERFIL_LENTO_MS = int(os.getenv("PERFIL_LENTO_MS", "1000"))
+PERFIL_JANELA = int(os.getenv("PERFIL_JANELA", "500"))
+
+# /sistema/metrics (Prometheus): coleta com "Authorization: Bearer <token>";
+# sem token configurado, só o master logado vê.
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "").strip()
+
+# Backup (manage.py backup / restaurar_backup): incrementais sobre um completo
+# por semana; mantém as 4 cadeias mais recentes.
+BACKUP_DIR = os.getenv("BACKUP_DIR", "").strip() or str(BASE_DIR / "backups")
+BACKUP_COMPLETO_DIAS = int(os.getenv("BACKUP_COMPLETO_DIAS", "7"))
+BACKUP_MANTER_COMPLETOS = int(os.getenv("BACKUP_MANTER_COMPLETOS", "4"))
+
+# Agenda (core_gestao/agendamento.py): expediente, grade de horários e
+# capacidade por sala ("consultorio=3,ultrassom=2"; as demais seguem o catálogo).
+AGENDA_ABERTURA = os.getenv("AGENDA_ABERTURA", "07:00").strip()
+AGENDA_FECHAMENTO = os.getenv("AGENDA_FECHAMENTO", "18:00").strip()
+AGENDA_PASSO_MIN = int(os.getenv("AGENDA_PASSO_MIN", "10"))
+AGENDA_CAPACIDADES = os.getenv("AGENDA_CAPACIDADES", "").strip()
+
 if not DEBUG:
     if not MERCADO_PAGO_PUBLIC_KEY:
         raise ImproperlyConfigured(